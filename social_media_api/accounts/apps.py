@@ -1,6 +1,29 @@
+import os
+import sys
+
 from django.apps import AppConfig
 
 
+def serves_requests() -> bool:
+    """Whether this process is a web server rather than a management command.
+
+    ``manage.py`` only serves under ``runserver``, and then only in the
+    autoreloader's child (or with ``--noreload``). Anything else, such as
+    gunicorn, is taken to be a WSGI server.
+    """
+    if os.path.basename(sys.argv[0]) not in ('manage.py', 'django-admin'):
+        return True
+    return (
+        sys.argv[1:2] == ['runserver']
+        and (os.environ.get('RUN_MAIN') == 'true' or '--noreload' in sys.argv)
+    )
+
+
 class AccountsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'accounts'
+
+    def ready(self):
+        from . import autocomplete, signals  # noqa: F401
+        if serves_requests():
+            autocomplete.warm()
@@ -0,0 +1,227 @@
+"""Token authentication with cached token -> user snapshots.
+
+``CachedTokenAuthentication`` caches only when ``settings.AUTH_TOKEN_CACHE_ALIAS``
+names a cache shared by every process (and ``settings.AUTH_TOKEN_CACHE_TTL``
+is above ``0``). Snapshots are kept in that cache and in a process-local LRU
+of ``settings.AUTH_TOKEN_CACHE_MAX_ENTRIES`` entries, together with a
+generation value per token that every hit is checked against, so an
+invalidation in one process is seen by all of them right away.
+
+A snapshot holds plain values, not pickled models: the token's key and
+creation time and the user's ``SNAPSHOT_FIELDS``. Other user fields,
+including the password hash, are deferred and loaded from the database if
+a view reads them.
+
+Snapshots are dropped as soon as the token is deleted or the user is saved
+(password change, deactivation, profile edit); see ``accounts.signals``.
+A snapshot loaded concurrently with an invalidation is never trusted,
+because the generation is read before the database.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import router, transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+TOKEN_KEY_PREFIX = 'auth:token:'
+GENERATION_KEY_PREFIX = 'auth:token-gen:'
+# What request handling reads from ``request.user`` without another query.
+SNAPSHOT_FIELDS = ('id', 'username', 'is_active', 'is_staff', 'is_superuser')
+
+
+def ttl() -> int:
+    return getattr(settings, 'AUTH_TOKEN_CACHE_TTL', 60)
+
+
+def max_entries() -> int:
+    return getattr(settings, 'AUTH_TOKEN_CACHE_MAX_ENTRIES', 10000)
+
+
+def shared_cache():
+    alias = getattr(settings, 'AUTH_TOKEN_CACHE_ALIAS', '')
+    return caches[alias] if alias else None
+
+
+def enabled() -> bool:
+    return ttl() > 0 and shared_cache() is not None
+
+
+def _loaded(model, field_names, values):
+    # ``from_db`` takes the loaded values in field order and defers the rest.
+    order = [f.attname for f in model._meta.concrete_fields]
+    by_name = dict(zip(field_names, values))
+    names = [name for name in order if name in by_name]
+    return model.from_db(router.db_for_read(model), names, [by_name[name] for name in names])
+
+
+def snapshot(user, token) -> tuple:
+    return tuple(getattr(user, name) for name in SNAPSHOT_FIELDS), token.created
+
+
+def restore(key, snapshot):
+    """``(user, token)`` instances rebuilt from a ``snapshot()``."""
+    values, created = snapshot
+    user = _loaded(get_user_model(), SNAPSHOT_FIELDS, values)
+    token = _loaded(Token, ('key', 'user_id', 'created'), (key, user.pk, created))
+    token.user = user
+    return user, token
+
+
+class TokenSnapshotCache:
+    """Process-local LRU of ``key -> (user_id, snapshot, generation, expires_at)``."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._keys_by_user = {}
+        # Bumped by every local invalidation; a load that straddles a bump is not stored.
+        self.epoch = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[3] <= time.monotonic():
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, user_id, snapshot, generation, epoch) -> None:
+        with self._lock:
+            if epoch != self.epoch:
+                return
+            self._drop(key)
+            self._entries[key] = (user_id, snapshot, generation, time.monotonic() + ttl())
+            self._keys_by_user.setdefault(user_id, set()).add(key)
+            while len(self._entries) > max_entries():
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, key) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            keys = self._keys_by_user.get(entry[0])
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_user[entry[0]]
+
+    def drop_key(self, key) -> None:
+        with self._lock:
+            self.epoch += 1
+            self._drop(key)
+
+    def drop_users(self, user_ids) -> None:
+        with self._lock:
+            self.epoch += 1
+            for user_id in user_ids:
+                for key in list(self._keys_by_user.get(user_id, ())):
+                    self._drop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.epoch += 1
+            self._entries.clear()
+            self._keys_by_user.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+token_snapshots = TokenSnapshotCache()
+
+
+def _snapshot_key(key) -> str:
+    return f'{TOKEN_KEY_PREFIX}{key}'
+
+
+def _generation_key(key) -> str:
+    return f'{GENERATION_KEY_PREFIX}{key}'
+
+
+def _bump(shared, keys) -> None:
+    shared.set_many({_generation_key(key): uuid.uuid4().hex for key in keys}, None)
+    shared.delete_many([_snapshot_key(key) for key in keys])
+
+
+def _after_commit_too(drop) -> None:
+    drop()
+    # Again after commit: a request may have loaded the old row meanwhile.
+    transaction.on_commit(drop)
+
+
+def invalidate_token(key) -> None:
+    def drop():
+        token_snapshots.drop_key(key)
+        shared = shared_cache()
+        if shared is not None:
+            _bump(shared, [key])
+
+    _after_commit_too(drop)
+
+
+def invalidate_users(user_ids) -> None:
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+
+    def drop():
+        token_snapshots.drop_users(user_ids)
+        shared = shared_cache()
+        if shared is not None:
+            _bump(shared, list(Token.objects.filter(user_id__in=user_ids).values_list('key', flat=True)))
+
+    _after_commit_too(drop)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """``TokenAuthentication`` that skips the ``Token``/``User`` query on cache hits."""
+
+    def authenticate_credentials(self, key):
+        if not enabled():
+            return super().authenticate_credentials(key)
+        shared = shared_cache()
+
+        entry = token_snapshots.get(key)
+        if entry is not None:
+            _, cached, generation, _ = entry
+            if shared.get(_generation_key(key)) == generation:
+                return restore(key, cached)
+            token_snapshots.drop_key(key)
+
+        epoch = token_snapshots.epoch
+        found = shared.get_many([_snapshot_key(key), _generation_key(key)])
+        generation = found.get(_generation_key(key))
+        stored = found.get(_snapshot_key(key))
+        if stored is not None and stored[1] == generation:
+            cached = stored[0]
+            user, token = restore(key, cached)
+            token_snapshots.put(key, user.pk, cached, generation, epoch)
+            return user, token
+
+        # ``generation`` was read before the database, so a concurrent
+        # invalidation leaves this snapshot behind a newer generation.
+        user, token = self.load(key)
+        cached = snapshot(user, token)
+        token_snapshots.put(key, user.pk, cached, generation, epoch)
+        shared.set(_snapshot_key(key), (cached, generation), ttl())
+        return user, token
+
+    def load(self, key):
+        model = self.get_model()
+        try:
+            token = model.objects.select_related('user').get(key=key)
+        except model.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        return token.user, token
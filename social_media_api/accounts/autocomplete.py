@@ -0,0 +1,329 @@
+"""In-memory username prefix index for autocomplete.
+
+Lowercased usernames are kept in a sorted list, so the users matching a
+prefix are one contiguous slice found by two binary searches. Small slices
+(up to ``SCAN_LIMIT`` users) are ranked by follower count on the spot.
+Bigger ones, which is every short prefix, use a precomputed list of their
+best ``2 * MAX_RESULTS`` users. Those lists are built bottom-up when the
+index is built and patched in place on every change. A list is refilled from
+its slice only after enough removals leave it shorter than a request needs.
+
+The index is built when a server process starts (see ``AccountsConfig``)
+and rebuilt every ``settings.ACCOUNTS_AUTOCOMPLETE_TTL`` seconds (``0``
+disables it in favour of an ``istartswith`` query). Builds run in a
+background thread, never on a request: until the first one finishes
+searches use the ``istartswith`` query, and later ones keep serving the old
+index. A build started before ``gunicorn --preload`` forks is started again
+in each worker, since threads do not survive the fork. Every process keeps its
+own copy. Changes committed by this process apply right away through
+``accounts.signals``; see ``record_users``.
+"""
+import heapq
+import logging
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+from itertools import chain
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+SCAN_LIMIT = 512
+MAX_RESULTS = 20
+KEEP = 2 * MAX_RESULTS
+
+
+def ttl() -> int:
+    return getattr(settings, 'ACCOUNTS_AUTOCOMPLETE_TTL', 600)
+
+
+def enabled() -> bool:
+    return ttl() > 0
+
+
+def _upper_bound(prefix) -> str:
+    """The smallest string greater than every string starting with ``prefix``."""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+class UsernameIndex:
+    """Sorted ``(lowercased username, id, followers)`` rows plus per-prefix top lists."""
+
+    def __init__(self, rows=()):
+        rows = sorted((self._key(username), user_id, username, followers) for user_id, username, followers in rows)
+        self.keys = [key for key, _, _, _ in rows]
+        self.ids = [user_id for _, user_id, _, _ in rows]
+        self.users = {user_id: (username, followers) for _, user_id, username, followers in rows}
+        self.top = {}  # prefix -> sorted [(-followers, id)], the best len() users of that prefix
+        if self.keys:
+            self._build_top('', 0, len(self.keys))
+
+    def __len__(self):
+        return len(self.keys)
+
+    @staticmethod
+    def _key(username) -> str:
+        key = username.lower()
+        # Most usernames are lowercase already; share the string rather than keep two.
+        return username if key == username else key
+
+    def _rank(self, i):
+        user_id = self.ids[i]
+        return -self.users[user_id][1], user_id
+
+    def _scan(self, lo, hi, n):
+        return heapq.nsmallest(n, (self._rank(i) for i in range(lo, hi)))
+
+    def _build_top(self, prefix, lo, hi):
+        if hi - lo <= SCAN_LIMIT:
+            return self._scan(lo, hi, KEEP)
+        depth, keys = len(prefix), self.keys
+        parts, i = [], lo
+        while i < hi and len(keys[i]) == depth:
+            parts.append([self._rank(i)])
+            i += 1
+        while i < hi:
+            child = prefix + keys[i][depth]
+            j = bisect_left(keys, _upper_bound(child), i, hi)
+            parts.append(self._build_top(child, i, j))
+            i = j
+        # The best of a prefix are among the best of its one-longer prefixes.
+        best = heapq.nsmallest(KEEP, chain.from_iterable(parts))
+        self.top[prefix] = best
+        return best
+
+    def _range(self, key):
+        lo = bisect_left(self.keys, key)
+        hi = bisect_left(self.keys, _upper_bound(key), lo) if key else len(self.keys)
+        return lo, hi
+
+    def search(self, prefix, limit):
+        """``[(id, username, followers)]`` of the top ``limit`` users whose username starts with ``prefix``."""
+        key = prefix.lower()
+        lo, hi = self._range(key)
+        if hi - lo <= SCAN_LIMIT:
+            best = self._scan(lo, hi, limit)
+        else:
+            best = self.top.get(key)
+            if best is None or len(best) < limit:
+                best = self.top[key] = self._scan(lo, hi, KEEP)
+            best = best[:limit]
+        return [(user_id, *self.users[user_id]) for _, user_id in best]
+
+    def remove(self, user_id) -> None:
+        entry = self.users.pop(user_id, None)
+        if entry is None:
+            return
+        username, followers = entry
+        key = self._key(username)
+        i = bisect_left(self.keys, key)
+        while self.ids[i] != user_id:
+            i += 1
+        del self.keys[i], self.ids[i]
+        rank = (-followers, user_id)
+        for end in range(len(key) + 1):
+            best = self.top.get(key[:end])
+            if best is not None:
+                at = bisect_left(best, rank)
+                if at < len(best) and best[at] == rank:
+                    del best[at]
+
+    def upsert(self, user_id, username, followers) -> None:
+        self.remove(user_id)
+        key = self._key(username)
+        i = bisect_right(self.keys, key)
+        self.keys.insert(i, key)
+        self.ids.insert(i, user_id)
+        self.users[user_id] = (username, followers)
+        rank = (-followers, user_id)
+        for end in range(len(key) + 1):
+            best = self.top.get(key[:end])
+            # Only a user who beats the last kept one is known to belong in the list.
+            if best is not None and best and rank < best[-1]:
+                insort(best, rank)
+                if len(best) > KEEP:
+                    best.pop()
+
+    @property
+    def nbytes(self) -> int:
+        """Rough footprint: containers, key strings, distinct usernames and the top lists."""
+        size = sys.getsizeof(self.keys) + sys.getsizeof(self.ids) + sys.getsizeof(self.users)
+        size += sum(sys.getsizeof(key) for key in self.keys)
+        for username, followers in self.users.values():
+            size += sys.getsizeof((username, followers)) + (sys.getsizeof(username) if self._key(username) != username else 0)
+        return size + sum(sys.getsizeof(best) + 64 * len(best) for best in self.top.values())
+
+
+class Autocomplete:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        self._index = None
+        self._built_at = 0.0
+        self._journal = None  # changes seen while a rebuild reads the table
+        self._warm = False
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def search(self, prefix, limit):
+        """``UsernameIndex.search``, or ``None`` until the first build has finished."""
+        index = self._current()
+        if index is None:
+            return None
+        with self._lock:
+            return index.search(prefix, limit)
+
+    @property
+    def tracking(self) -> bool:
+        """Whether changes matter here: an index exists or a build is reading the table."""
+        with self._lock:
+            return self._index is not None or self._journal is not None
+
+    def apply(self, upserts=(), removals=()) -> None:
+        """Apply ``(id, username, followers)`` upserts and removed ids."""
+        with self._lock:
+            if self._journal is not None:
+                self._journal.append((list(upserts), list(removals)))
+            if self._index is not None:
+                self._apply(self._index, upserts, removals)
+
+    @staticmethod
+    def _apply(index, upserts, removals):
+        for user_id in removals:
+            index.remove(user_id)
+        for row in upserts:
+            index.upsert(*row)
+
+    def warm(self) -> None:
+        """Start the first build in the background, before any request needs it."""
+        self._warm = True
+        self._start_rebuild()
+
+    def _after_fork(self) -> None:
+        # The parent's build thread is gone, but its locks would stay held here.
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        self._journal = None
+        if self._warm and self._index is None:
+            self._start_rebuild()
+
+    def _current(self):
+        """The index, or ``None`` before the first build; missing or stale ones start a rebuild."""
+        index = self._index
+        if index is None or time.monotonic() - self._built_at >= ttl():
+            self._start_rebuild()
+        return index
+
+    def _start_rebuild(self) -> None:
+        # One rebuild at a time, off the request thread.
+        if not self._rebuild_lock.acquire(blocking=False):
+            return
+        try:
+            threading.Thread(target=self._rebuild_in_background, name='autocomplete', daemon=True).start()
+        except BaseException:
+            self._rebuild_lock.release()
+            raise
+
+    def _rebuild_in_background(self) -> None:
+        try:
+            close_old_connections()
+            self.rebuild()
+        except Exception:
+            logger.exception("Building the autocomplete index failed")
+        finally:
+            close_old_connections()
+            self._rebuild_lock.release()
+
+    def rebuild(self) -> None:
+        with self._lock:
+            self._journal = []
+        started = time.monotonic()
+        try:
+            rows = (
+                get_user_model().objects.filter(is_active=True)
+                .values_list('pk', 'username', 'followers_count')
+                .iterator(chunk_size=getattr(settings, 'ACCOUNTS_AUTOCOMPLETE_CHUNK_SIZE', 10000))
+            )
+            index = UsernameIndex(rows)
+        except BaseException:
+            with self._lock:
+                self._journal = None
+            raise
+        with self._lock:
+            # Replaying is idempotent, so changes the read already saw are harmless.
+            for upserts, removals in self._journal:
+                self._apply(index, upserts, removals)
+            self._journal = None
+            self._index, self._built_at = index, started
+
+    def clear(self) -> None:
+        with self._lock:
+            self._index = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            index = self._index
+            return {
+                'users': len(index) if index is not None else 0,
+                'prefixes': len(index.top) if index is not None else 0,
+                'bytes': index.nbytes if index is not None else 0,
+                'rebuilding': self._rebuild_lock.locked(),
+            }
+
+
+autocomplete = Autocomplete()
+
+
+def warm() -> None:
+    if enabled():
+        autocomplete.warm()
+
+
+def search(prefix, limit):
+    if enabled():
+        found = autocomplete.search(prefix, limit)
+        if found is not None:
+            return found
+    rows = (
+        get_user_model().objects.filter(is_active=True, username__istartswith=prefix)
+        .order_by('-followers_count', 'pk')
+        .values_list('pk', 'username', 'followers_count')
+    )
+    return list(rows[:limit])
+
+
+def record_users(users) -> None:
+    """Update the index from saved ``User`` instances once the current transaction commits."""
+    upserts = [(u.pk, u.username, u.followers_count) for u in users if u.is_active]
+    removals = [u.pk for u in users if not u.is_active]
+    if enabled():
+        transaction.on_commit(lambda: autocomplete.apply(upserts, removals))
+
+
+def forget_users(user_ids) -> None:
+    user_ids = list(user_ids)
+    if user_ids and enabled():
+        transaction.on_commit(lambda: autocomplete.apply(removals=user_ids))
+
+
+def refresh_counts(user_ids) -> None:
+    """Re-read follower counts of ``user_ids`` after commit; ``counters`` updates them without ``post_save``."""
+    user_ids = list(user_ids)
+    if not user_ids or not enabled():
+        return
+
+    def refresh():
+        # With no index yet, a later build reads the committed counts itself.
+        if not autocomplete.tracking:
+            return
+        rows = list(
+            get_user_model().objects.filter(pk__in=user_ids, is_active=True)
+            .values_list('pk', 'username', 'followers_count')
+        )
+        autocomplete.apply(rows)
+
+    transaction.on_commit(refresh)
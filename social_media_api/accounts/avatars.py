@@ -0,0 +1,197 @@
+"""Profile picture cleaning and background variant rendering.
+
+``ProfileUpdateSerializer`` only checks an upload's header and parks the raw
+file in ``pending_storage()`` (``settings.ACCOUNTS_AVATAR_PENDING_ROOT``,
+outside ``MEDIA_ROOT`` so it is never served), recording its name in
+``User.profile_picture_pending``. After the transaction commits, a worker
+pool (``settings.ACCOUNTS_AVATAR_WORKERS`` threads; ``0`` processes inline)
+re-encodes it without its EXIF/ICC metadata and renders square JPEG and WebP
+variants for each of ``settings.ACCOUNTS_AVATAR_SIZES``. Only then are
+``profile_picture`` and ``profile_picture_variants`` set and the previous
+picture's files deleted; until then the previous picture stays in place. A
+job that fails or is lost with its process leaves the previous picture.
+
+A job only publishes its results if the user's pending upload is still the
+one it processed, so a newer upload always wins.
+"""
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+from .authentication import invalidate_users
+
+logger = logging.getLogger(__name__)
+
+JPEG_QUALITY = 85
+WEBP_QUALITY = 80
+
+
+def workers() -> int:
+    return getattr(settings, 'ACCOUNTS_AVATAR_WORKERS', 2)
+
+
+def sizes():
+    return getattr(settings, 'ACCOUNTS_AVATAR_SIZES', (64, 256))
+
+
+def pending_storage() -> FileSystemStorage:
+    return FileSystemStorage(
+        location=getattr(settings, 'ACCOUNTS_AVATAR_PENDING_ROOT', os.path.join(settings.BASE_DIR, 'pending_uploads'))
+    )
+
+
+_executor = None
+_executor_workers = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor, _executor_workers
+    with _executor_lock:
+        if _executor_workers != workers():
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            _executor_workers = workers()
+            _executor = ThreadPoolExecutor(_executor_workers, thread_name_prefix='avatars') if _executor_workers else None
+        return _executor
+
+
+def check(upload) -> None:
+    """Reject ``upload`` unless Pillow recognises it, reading only its header.
+
+    Raises ``OSError`` (or ``Image.DecompressionBombError``) like ``Image.open``.
+    """
+    upload.seek(0)
+    with Image.open(upload):
+        pass
+    upload.seek(0)
+
+
+def schedule(user, stale_names=()) -> None:
+    """After commit, delete ``stale_names`` and process ``user.profile_picture_pending``."""
+    job = (user.pk, user.profile_picture_pending) if user.profile_picture_pending else None
+    storage = user._meta.get_field('profile_picture').storage
+    stale_names = list(stale_names)
+
+    def submit():
+        for stale in stale_names:
+            storage.delete(stale)
+        if job is None:
+            return
+        executor = _get_executor()
+        if executor is None:
+            run(*job, in_worker=False)
+        else:
+            executor.submit(run, *job)
+
+    transaction.on_commit(submit)
+
+
+def run(user_id, name, in_worker=True) -> None:
+    try:
+        if in_worker:
+            close_old_connections()
+        process(user_id, name)
+    except Exception:
+        logger.exception("Processing profile picture %s of user %s failed", name, user_id)
+    finally:
+        if in_worker:
+            close_old_connections()
+
+
+def _encode(image, fmt, **options) -> ContentFile:
+    buffer = io.BytesIO()
+    image.save(buffer, fmt, **options)
+    return ContentFile(buffer.getvalue())
+
+
+def _flatten(image):
+    """RGB copy of ``image`` with any transparency composited onto white."""
+    if image.mode == 'RGB':
+        return image
+    rgba = image.convert('RGBA')
+    background = Image.new('RGB', rgba.size, 'white')
+    background.paste(rgba, mask=rgba.getchannel('A'))
+    return background
+
+
+def _clean(image):
+    """``image`` turned upright and converted to RGB, or RGBA if it has transparency."""
+    image = ImageOps.exif_transpose(image)
+    has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+    return image.convert('RGBA' if has_alpha else 'RGB')
+
+
+def strip(image, stem) -> ContentFile:
+    """A re-encoding of the cleaned ``image`` without metadata, named ``<stem>.jpg`` (``.png`` with alpha).
+
+    Pillow only writes metadata it is handed explicitly, so re-encoding
+    without ``exif=``/``icc_profile=`` drops it.
+    """
+    if image.mode == 'RGBA':
+        content = _encode(image, 'PNG', optimize=True)
+        content.name = f'{stem}.png'
+    else:
+        content = _encode(image, 'JPEG', quality=JPEG_QUALITY, optimize=True)
+        content.name = f'{stem}.jpg'
+    return content
+
+
+def render(image):
+    """Yield ``(suffix, ContentFile)`` for every square variant of the cleaned ``image``."""
+    for size in sizes():
+        thumb = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+        yield f'{size}.jpg', _encode(_flatten(thumb), 'JPEG', quality=JPEG_QUALITY, optimize=True)
+        yield f'{size}.webp', _encode(thumb, 'WEBP', quality=WEBP_QUALITY, method=4)
+
+
+def process(user_id, name) -> None:
+    User = get_user_model()
+    field = User._meta.get_field('profile_picture')
+    storage = field.storage
+    pending = pending_storage()
+    try:
+        with pending.open(name) as source, Image.open(source) as image:
+            image = _clean(image)
+        stem = os.path.splitext(os.path.basename(name))[0]
+        cleaned = strip(image, stem)
+        rendered = list(render(image))
+
+        picture = storage.save(field.generate_filename(None, cleaned.name), cleaned)
+        variants = {
+            suffix: storage.save(f'profiles/{user_id}/{stem}_{suffix}', content)
+            for suffix, content in rendered
+        }
+        with transaction.atomic():
+            previous = (
+                User.objects.select_for_update()
+                .filter(pk=user_id, profile_picture_pending=name)
+                .values_list('profile_picture', 'profile_picture_variants')
+                .first()
+            )
+            if previous is not None:
+                User.objects.filter(pk=user_id).update(
+                    profile_picture=picture, profile_picture_variants=variants, profile_picture_pending='',
+                )
+        if previous is None:
+            # Replaced (or the user deleted) while we worked.
+            stale = [picture, *variants.values()]
+        else:
+            old_picture, old_variants = previous
+            stale = [*([old_picture] if old_picture else []), *old_variants.values()]
+            invalidate_users([user_id])
+        for stale_name in stale:
+            storage.delete(stale_name)
+    finally:
+        pending.delete(name)
+        # A failed job gives up on this upload; the previous picture stays.
+        User.objects.filter(pk=user_id, profile_picture_pending=name).update(profile_picture_pending='')
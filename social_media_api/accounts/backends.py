@@ -0,0 +1,35 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+from . import hashing
+
+UserModel = get_user_model()
+
+
+class PooledModelBackend(ModelBackend):
+    """``ModelBackend`` whose password checks run on the bounded hashing pool.
+
+    Used by the API login only, not listed in ``AUTHENTICATION_BACKENDS``:
+    it may raise ``hashing.HashingBusy`` when the pool is full, which only a
+    DRF view turns into a 503.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # Hash once anyway so unknown usernames take as long as wrong passwords.
+            hashing.make_password(password)
+            return None
+        is_correct, must_update = hashing.verify_password(password, user.password)
+        if not is_correct:
+            return None
+        if must_update:
+            # Rehash with the current hasher/iterations, as check_password's setter would.
+            user.password = hashing.make_password(password)
+            user.save(update_fields=['password'])
+        return user if self.user_can_authenticate(user) else None
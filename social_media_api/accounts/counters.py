@@ -0,0 +1,91 @@
+"""Denormalized ``User.followers_count`` / ``User.following_count`` bookkeeping.
+
+Follower counts are re-read into the autocomplete index after every write.
+Cached authentication snapshots hold no counters, so they are left alone.
+"""
+from django.contrib.auth import get_user_model
+from django.db.models import Case, Count, F, IntegerField, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce
+
+from . import autocomplete
+
+User = get_user_model()
+Follow = User.followers.through  # from_user is followed by to_user
+
+
+def lock_users(user_ids) -> None:
+    """``SELECT ... FOR UPDATE`` the rows of ``user_ids``, in pk order.
+
+    Every transaction that locks or updates several user rows takes them
+    through here first, so two of them never wait on each other in opposite
+    orders (A follows B while B follows A).
+    """
+    list(User.objects.select_for_update().filter(pk__in=set(user_ids)).order_by('pk').values_list('pk', flat=True))
+
+
+def adjust_many(field, deltas) -> None:
+    """Apply ``{user_id: delta}`` to ``field`` for many users in one ``UPDATE``."""
+    deltas = {user_id: delta for user_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    shift = Case(
+        *[When(pk=user_id, then=Value(delta)) for user_id, delta in deltas.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+    User.objects.filter(pk__in=deltas).update(**{field: F(field) + shift})
+    if field == 'followers_count':
+        autocomplete.refresh_counts(deltas)
+
+
+def follows_gained(followee_ids, follower_ids) -> None:
+    """Count new follow rows given as parallel lists of followee and follower ids."""
+    _shift(followee_ids, follower_ids, 1)
+
+
+def follows_lost(followee_ids, follower_ids) -> None:
+    _shift(followee_ids, follower_ids, -1)
+
+
+def _shift(followee_ids, follower_ids, sign):
+    followers, following = {}, {}
+    for followee_id, follower_id in zip(followee_ids, follower_ids):
+        followers[followee_id] = followers.get(followee_id, 0) + sign
+        following[follower_id] = following.get(follower_id, 0) + sign
+    lock_users(followers.keys() | following.keys())
+    adjust_many('followers_count', followers)
+    adjust_many('following_count', following)
+
+
+def _actual(column, other):
+    rows = Follow.objects.filter(**{column: OuterRef('pk')}).order_by().values(column).annotate(n=Count(other))
+    return Coalesce(Subquery(rows.values('n')), 0)
+
+
+def actual_followers_count():
+    return _actual('from_user', 'to_user')
+
+
+def actual_following_count():
+    return _actual('to_user', 'from_user')
+
+
+def reconcile(user_ids) -> int:
+    """Repair drifted counters for ``user_ids``; returns how many users changed.
+
+    As in ``posts.counters.reconcile``, the real counts are recomputed inside
+    the ``UPDATE`` so follows landing in between are not lost.
+    """
+    drifted = list(
+        User.objects.filter(pk__in=user_ids)
+        .annotate(actual_followers=actual_followers_count(), actual_following=actual_following_count())
+        .exclude(followers_count=F('actual_followers'), following_count=F('actual_following'))
+        .values_list('pk', flat=True)
+    )
+    if drifted:
+        User.objects.filter(pk__in=drifted).update(
+            followers_count=actual_followers_count(),
+            following_count=actual_following_count(),
+        )
+        autocomplete.refresh_counts(drifted)
+    return len(drifted)
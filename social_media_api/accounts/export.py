@@ -0,0 +1,88 @@
+"""Streaming export of a user's own content as NDJSON, optionally zipped.
+
+Rows come from server-side ``.iterator(chunk_size=...)`` cursors and are
+encoded one line at a time, so memory use does not depend on how many posts
+or comments the user has.
+"""
+import json
+import zipfile
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from posts.models import Comment, Post
+
+PROFILE_FIELDS = ('id', 'username', 'email', 'first_name', 'last_name', 'bio', 'date_joined')
+POST_FIELDS = ('id', 'title', 'content', 'created_at', 'updated_at', 'like_count', 'comment_count')
+COMMENT_FIELDS = ('id', 'post_id', 'content', 'created_at', 'updated_at')
+
+
+def chunk_size() -> int:
+    return getattr(settings, 'ACCOUNTS_EXPORT_CHUNK_SIZE', 2000)
+
+
+def export_records(user):
+    """Yield the profile, then every post, then every comment of ``user`` as dicts."""
+    profile = {field: getattr(user, field) for field in PROFILE_FIELDS}
+    yield {'type': 'profile', **profile}
+    posts = Post.objects.filter(author=user).order_by('created_at', 'id').values(*POST_FIELDS)
+    for row in posts.iterator(chunk_size=chunk_size()):
+        yield {'type': 'post', **row}
+    comments = Comment.objects.filter(author=user).order_by('created_at', 'id').values(*COMMENT_FIELDS)
+    for row in comments.iterator(chunk_size=chunk_size()):
+        yield {'type': 'comment', **row}
+
+
+def ndjson_lines(records):
+    encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    for record in records:
+        yield (encoder.encode(record) + '\n').encode()
+
+
+def buffered(chunks, size=64 * 1024):
+    """Regroup many small byte strings into writes of roughly ``size`` bytes."""
+    parts, pending = [], 0
+    for chunk in chunks:
+        parts.append(chunk)
+        pending += len(chunk)
+        if pending >= size:
+            yield b''.join(parts)
+            parts, pending = [], 0
+    if parts:
+        yield b''.join(parts)
+
+
+class _Sink:
+    """Write-only file object whose contents are drained by the zip generator."""
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self.parts)
+        self.parts.clear()
+        return data
+
+
+def zip_stream(name, chunks):
+    """Deflate ``chunks`` into a single-member zip archive, yielding bytes as they are produced.
+
+    The sink is not seekable, so ``zipfile`` writes sizes and CRCs in data
+    descriptors after the member instead of seeking back to the header.
+    """
+    sink = _Sink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        with archive.open(name, 'w', force_zip64=True) as member:
+            for chunk in chunks:
+                member.write(chunk)
+                data = sink.drain()
+                if data:
+                    yield data
+    yield sink.drain()
@@ -0,0 +1,146 @@
+"""Bounded worker pool for password hashing and verification.
+
+PBKDF2 holds a CPU for tens of milliseconds and ``hashlib`` releases the GIL
+while it runs, so login and register hand the hashing to a small thread
+pool (``settings.ACCOUNTS_HASHING_WORKERS`` threads; ``0`` hashes inline).
+At most ``settings.ACCOUNTS_HASHING_MAX_PENDING`` hashes may be running or
+queued; past that, callers get ``HashingBusy`` (503 with ``Retry-After``)
+straight away instead of tying up the web worker. Only pure hashing runs in
+the pool; database access stays on the request thread.
+
+Both limits are per process. They protect a process that serves several
+requests at once (gunicorn ``gthread`` workers, see ``Procfile``) from
+having every thread stuck in PBKDF2; a sync worker handles one request at a
+time and never reaches them.
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+
+LATENCY_SAMPLES = 1000
+
+
+class HashingBusy(exceptions.APIException):
+    """Raised when the hashing pool is full; DRF turns ``wait`` into ``Retry-After``."""
+    status_code = 503
+    default_detail = _('Too many sign-ins in progress. Try again shortly.')
+    default_code = 'hashing_busy'
+
+    def __init__(self, wait, detail=None, code=None):
+        super().__init__(detail, code)
+        self.wait = wait
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return round(ordered[index], 2)
+
+
+class HashingPool:
+    def __init__(self, workers, max_pending, retry_after):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.retry_after = retry_after
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix='password-hashing') if workers else None
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        self._completed = 0
+        self._rejected = 0
+        self._hash_ms = deque(maxlen=LATENCY_SAMPLES)
+        self._wait_ms = deque(maxlen=LATENCY_SAMPLES)
+
+    def run(self, fn, *args):
+        """Run ``fn(*args)`` on the pool and wait for it, or raise ``HashingBusy`` if full."""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise HashingBusy(self.retry_after)
+        queued_at = time.perf_counter()
+        with self._lock:
+            self._pending += 1
+        try:
+            if self._executor is None:
+                return self._timed(queued_at, fn, *args)
+            return self._executor.submit(self._timed, queued_at, fn, *args).result()
+        finally:
+            with self._lock:
+                self._pending -= 1
+            self._slots.release()
+
+    def _timed(self, queued_at, fn, *args):
+        started = time.perf_counter()
+        with self._lock:
+            self._running += 1
+            self._wait_ms.append((started - queued_at) * 1000)
+        try:
+            return fn(*args)
+        finally:
+            finished = time.perf_counter()
+            with self._lock:
+                self._running -= 1
+                self._completed += 1
+                self._hash_ms.append((finished - started) * 1000)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'max_pending': self.max_pending,
+                'pending': self._pending,
+                'running': self._running,
+                'queue_depth': self._pending - self._running,
+                'completed': self._completed,
+                'rejected': self._rejected,
+                'hash_ms_p50': _percentile(self._hash_ms, 50),
+                'hash_ms_p99': _percentile(self._hash_ms, 99),
+                'wait_ms_p50': _percentile(self._wait_ms, 50),
+                'wait_ms_p99': _percentile(self._wait_ms, 99),
+            }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> HashingPool:
+    """The process-wide pool, rebuilt if its settings have changed."""
+    global _pool
+    # The defaults live in settings.py only, so they cannot drift from the docs.
+    config = (
+        settings.ACCOUNTS_HASHING_WORKERS,
+        settings.ACCOUNTS_HASHING_MAX_PENDING,
+        settings.ACCOUNTS_HASHING_RETRY_AFTER,
+    )
+    pool = _pool
+    if pool is not None and (pool.workers, pool.max_pending, pool.retry_after) == config:
+        return pool
+    with _pool_lock:
+        if _pool is None or (_pool.workers, _pool.max_pending, _pool.retry_after) != config:
+            if _pool is not None:
+                _pool.shutdown()
+            _pool = HashingPool(*config)
+        return _pool
+
+
+def make_password(password) -> str:
+    return get_pool().run(hashers.make_password, password)
+
+
+def verify_password(password, encoded):
+    """``(is_correct, must_update)`` for ``password`` against the stored ``encoded`` hash."""
+    return get_pool().run(hashers.verify_password, password, encoded)
@@ -0,0 +1,63 @@
+import random
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from accounts import autocomplete
+from social_media_api.bench import scratch_database, summarize, timed
+
+SYLLABLES = ['al', 'an', 'be', 'co', 'da', 'el', 'fi', 'jo', 'ka', 'li', 'ma', 'ne', 'ol', 'pa', 'ri', 'sa', 'te', 'vi', 'x', 'zo']
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark username prefix autocomplete from the in-memory index against an "
+        "istartswith query, on synthetic users. Runs against a throwaway test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1_000_000)
+        parser.add_argument('--queries', type=int, default=5000)
+        parser.add_argument('--sql-queries', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        with scratch_database():
+            User = get_user_model()
+            names = set()
+            while len(names) < options['users']:
+                name = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+                names.add(name + str(rng.randrange(10000)) if rng.random() < 0.7 else name)
+            names = list(names)
+            User.objects.bulk_create(
+                [User(username=name, password='!', followers_count=int(rng.paretovariate(1.2))) for name in names],
+                batch_size=5000,
+            )
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{len(names)} users"))
+
+            index = autocomplete.autocomplete
+            build = []
+            with override_settings(ACCOUNTS_AUTOCOMPLETE_TTL=3600):
+                with timed(build):
+                    index.rebuild()
+                stats = index.stats()
+                self.stdout.write(
+                    f"  build              {build[0]:8.0f} ms  {stats['prefixes']} precomputed prefixes, "
+                    f"about {stats['bytes'] / 2**20:.0f} MiB"
+                )
+                for length in (1, 2, 3, 5):
+                    self.bench(f'index, {length} chars', rng, names, length, options['queries'])
+            with override_settings(ACCOUNTS_AUTOCOMPLETE_TTL=0):
+                for length in (1, 3):
+                    self.bench(f'SQL, {length} chars', rng, names, length, options['sql_queries'])
+            index.clear()
+
+    def bench(self, label, rng, names, length, queries):
+        samples = []
+        for _ in range(queries):
+            prefix = rng.choice(names)[:length]
+            with timed(samples):
+                autocomplete.search(prefix, 10)
+        self.stdout.write(f"  {label:<17} {summarize(samples)}")
@@ -0,0 +1,68 @@
+import random
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from accounts import follow_graph
+from social_media_api.bench import scratch_database, summarize, timed
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark who-to-follow suggestions from the in-memory CSR follow graph against "
+        "the SQL aggregate, on a synthetic skewed follow graph. Runs against a throwaway "
+        "test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100_000)
+        parser.add_argument('--edges', type=int, default=1_000_000)
+        parser.add_argument('--queries', type=int, default=1000)
+        parser.add_argument('--sql-queries', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        with scratch_database():
+            User = get_user_model()
+            Follow = User.followers.through
+            users = options['users']
+            User.objects.bulk_create(
+                [User(username=f'user{i}', password='!') for i in range(users)], batch_size=5000
+            )
+            ids = list(User.objects.order_by('pk').values_list('pk', flat=True))
+
+            # Followers are uniform; followees are skewed towards a few popular accounts.
+            pairs = set()
+            while len(pairs) < options['edges']:
+                follower = ids[rng.randrange(users)]
+                followee = ids[int(users * rng.random() ** 3)]
+                if follower != followee:
+                    pairs.add((followee, follower))
+            rows = [Follow(from_user_id=followee, to_user_id=follower) for followee, follower in pairs]
+            Follow.objects.bulk_create(rows, batch_size=5000)
+            del rows, pairs
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{users} users, {options['edges']} follows"))
+
+            graph = follow_graph.follow_graph
+            build = []
+            with override_settings(ACCOUNTS_FOLLOW_GRAPH_TTL=3600):
+                with timed(build):
+                    graph.rebuild()
+                stats = graph.stats()
+                self.stdout.write(
+                    f"  rebuild            {build[0]:8.0f} ms  {stats['bytes'] / 2**20:.1f} MiB of arrays"
+                )
+                self.bench('CSR graph', rng, ids, options['queries'])
+            with override_settings(ACCOUNTS_FOLLOW_GRAPH_TTL=0):
+                self.bench('SQL aggregate', rng, ids, options['sql_queries'])
+            graph.clear()
+
+    def bench(self, label, rng, ids, queries):
+        samples = []
+        for _ in range(queries):
+            user_id = ids[rng.randrange(len(ids))]
+            with timed(samples):
+                follow_graph.suggest(user_id, 20)
+        self.stdout.write(f"  suggest  {label:<13} {summarize(samples)}")
@@ -0,0 +1,152 @@
+import json
+import resource
+import subprocess
+import sys
+import threading
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from rest_framework.authtoken.models import Token
+from rest_framework.views import APIView
+
+from accounts.views import ProfileView
+from social_media_api.bench import scratch_database, summarize, timed
+
+BOUNDARY = 'bench-boundary'
+MODES = {
+    'default': "Django's default upload handlers",
+    'streaming': 'ProfilePictureUploadHandler',
+}
+
+
+class MultipartBody:
+    """File-like multipart body of ``size`` bytes, generated as it is read."""
+
+    def __init__(self, size):
+        self.head = (
+            f'--{BOUNDARY}\r\n'
+            'Content-Disposition: form-data; name="profile_picture"; filename="big.jpg"\r\n'
+            'Content-Type: image/jpeg\r\n\r\n'
+        ).encode() + b'\xff\xd8\xff\xe0'
+        self.tail = f'\r\n--{BOUNDARY}--\r\n'.encode()
+        self.length = len(self.head) + size + len(self.tail)
+        self.padding = size
+        self.position = 0
+
+    def read(self, size=-1):
+        if size < 0:
+            size = self.length - self.position
+        out = []
+        remaining = size
+        while remaining and self.position < self.length:
+            if self.position < len(self.head):
+                chunk = self.head[self.position:self.position + remaining]
+            elif self.position < len(self.head) + self.padding:
+                chunk = bytes(min(remaining, len(self.head) + self.padding - self.position))
+            else:
+                offset = self.position - len(self.head) - self.padding
+                chunk = self.tail[offset:offset + remaining]
+            out.append(chunk)
+            self.position += len(chunk)
+            remaining -= len(chunk)
+        return b''.join(out)
+
+    def readline(self, size=-1):
+        line = b''
+        while not line.endswith(b'\n') and len(line) != size:
+            char = self.read(1)
+            if not char:
+                break
+            line += char
+        return line
+
+
+def peak_rss_mib() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure peak RSS and latency of concurrent large PATCH /api/accounts/profile/ "
+        "uploads with Django's default upload handlers and with the streaming, size-capped "
+        "ProfilePictureUploadHandler. Each mode runs in a fresh process against a throwaway "
+        "test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size-mb', type=int, default=20)
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--mode', choices=MODES, help="Run one mode in this process and print JSON.")
+
+    def handle(self, *args, **options):
+        if options['mode']:
+            self.stdout.write(json.dumps(self.measure(options['mode'], options['size_mb'], options['concurrency'])))
+            return
+        self.stdout.write(
+            self.style.MIGRATE_HEADING(f"{options['concurrency']} concurrent uploads of {options['size_mb']} MB")
+        )
+        for mode, label in MODES.items():
+            output = subprocess.run(
+                [sys.executable, sys.argv[0], 'bench_uploads', '--mode', mode,
+                 '--size-mb', str(options['size_mb']), '--concurrency', str(options['concurrency'])],
+                check=True, capture_output=True, text=True,
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            self.stdout.write(
+                f"  {label:<32}  peak RSS {result['peak_rss_mib']:7.1f} MiB "
+                f"(+{result['peak_rss_mib'] - result['baseline_rss_mib']:6.1f})  "
+                f"statuses {result['statuses']}  {summarize(result['samples'])}"
+            )
+
+    def measure(self, mode, size_mb, concurrency):
+        with scratch_database():
+            user = get_user_model().objects.create(username='uploader', password='!')
+            token = Token.objects.create(user=user)
+            handler = WSGIHandler()
+            samples, statuses, lock = [], {}, threading.Lock()
+
+            def upload():
+                body = MultipartBody(size_mb * 1024 * 1024)
+                environ = {
+                    'REQUEST_METHOD': 'PATCH',
+                    'PATH_INFO': '/api/accounts/profile/',
+                    'SERVER_NAME': 'testserver',
+                    'SERVER_PORT': '80',
+                    'wsgi.url_scheme': 'http',
+                    'wsgi.input': body,
+                    'CONTENT_TYPE': f'multipart/form-data; boundary={BOUNDARY}',
+                    'CONTENT_LENGTH': str(body.length),
+                    'HTTP_AUTHORIZATION': f'Token {token.key}',
+                }
+                status = []
+                with timed(samples):
+                    response = handler(environ, lambda s, headers, exc_info=None: status.append(s))
+                    b''.join(response)
+                    response.close()
+                with lock:
+                    code = status[0].split()[0]
+                    statuses[code] = statuses.get(code, 0) + 1
+
+            patches = []
+            if mode == 'default':
+                patches.append(mock.patch.object(ProfileView, 'initialize_request', APIView.initialize_request))
+            for patch in patches:
+                patch.start()
+            try:
+                baseline = peak_rss_mib()
+                threads = [threading.Thread(target=upload) for _ in range(concurrency)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+            finally:
+                for patch in patches:
+                    patch.stop()
+            return {
+                'baseline_rss_mib': baseline,
+                'peak_rss_mib': peak_rss_mib(),
+                'statuses': statuses,
+                'samples': samples,
+            }
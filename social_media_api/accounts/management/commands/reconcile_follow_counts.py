@@ -0,0 +1,29 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from accounts.counters import reconcile
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute User.followers_count and User.following_count in primary-key batches. "
+        "Each batch is its own short statement, so the table is never locked as a whole."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        batch_size = options['batch_size']
+        last_pk, checked, repaired = 0, 0, 0
+        while True:
+            ids = list(
+                User.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            last_pk = ids[-1]
+            checked += len(ids)
+            repaired += reconcile(ids)
+        self.stdout.write(self.style.SUCCESS(f"Checked {checked} user(s), repaired {repaired}."))
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.3 on 2026-10-18 05:35
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_existing(apps, schema_editor):
+    User = apps.get_model('accounts', 'User')
+    Follow = User._meta.get_field('followers').remote_field.through
+
+    def total(column, other):
+        rows = Follow.objects.filter(**{column: OuterRef('pk')}).order_by().values(column).annotate(n=Count(other))
+        return Coalesce(Subquery(rows.values('n')), 0)
+
+    User.objects.update(
+        followers_count=total('from_user', 'to_user'),
+        following_count=total('to_user', 'from_user'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_existing, migrations.RunPython.noop),
+    ]
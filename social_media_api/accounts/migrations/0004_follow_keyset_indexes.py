@@ -0,0 +1,23 @@
+from django.db import migrations
+
+# The auto-created through table has no model to declare indexes on, so they
+# are added in SQL. They back the keyset walks of /followers/ and /following/:
+# WHERE from_user_id = %s AND id < %s ORDER BY id DESC (and likewise for to_user_id).
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_profile_picture_variants'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX follow_followee_recent_idx ON accounts_user_followers (from_user_id, id)',
+            'DROP INDEX follow_followee_recent_idx',
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX follow_follower_recent_idx ON accounts_user_followers (to_user_id, id)',
+            'DROP INDEX follow_follower_recent_idx',
+        ),
+    ]
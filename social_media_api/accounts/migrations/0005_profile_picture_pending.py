@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 07:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_follow_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='profile_picture_pending',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+    ]
@@ -4,8 +4,15 @@ from django.contrib.auth.models import AbstractUser
 class User(AbstractUser):
     bio = models.TextField(blank=True)
     profile_picture = models.ImageField(upload_to='profiles/', blank=True, null=True)
+    # {'64.jpg': storage name, '64.webp': ...}, filled in by accounts.avatars once processed
+    profile_picture_variants = models.JSONField(default=dict, blank=True, editable=False)
+    # Storage name of an upload waiting in accounts.avatars.pending_storage() to be stripped and published
+    profile_picture_pending = models.CharField(max_length=255, blank=True, editable=False)
     # users who follow this user; symmetrical=False allows directional follow
     followers = models.ManyToManyField('self', symmetrical=False, related_name='following', blank=True)
+    # Denormalized len(followers) / len(following), kept by accounts.signals; see reconcile_follow_counts
+    followers_count = models.PositiveIntegerField(default=0, editable=False)
+    following_count = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self) -> str:
         return self.username
@@ -1,27 +1,110 @@
-from django.contrib.auth import authenticate, get_user_model
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from PIL import Image
 from rest_framework import serializers
 from rest_framework.authtoken.models import Token
+from social_media_api.fieldsets import SparseFieldsetMixin
+from . import avatars, hashing
+from .backends import PooledModelBackend
 
 User = get_user_model()
 
 
-class UserSerializer(serializers.ModelSerializer):
-    followers_count = serializers.SerializerMethodField()
-    following_count = serializers.SerializerMethodField()
+class UserSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    profile_picture_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = User
         fields = [
             'id', 'username', 'email', 'first_name', 'last_name',
-            'bio', 'profile_picture', 'followers_count', 'following_count'
+            'bio', 'profile_picture', 'profile_picture_variants', 'followers_count', 'following_count'
         ]
         read_only_fields = ['id', 'followers_count', 'following_count', 'profile_picture']
 
-    def get_followers_count(self, obj):
-        return obj.followers.count()
+    def get_profile_picture_variants(self, obj):
+        # {'64.jpg': url, '64.webp': url, ...}; empty while the upload is still being processed
+        storage = obj.profile_picture.storage
+        request = self.context.get('request')
+        urls = {}
+        for variant, name in obj.profile_picture_variants.items():
+            url = storage.url(name)
+            urls[variant] = request.build_absolute_uri(url) if request is not None else url
+        return urls
 
-    def get_following_count(self, obj):
-        return obj.following.count()
+
+def followed_user_ids(request, user_ids) -> set:
+    """Which of ``user_ids`` the requesting user follows, in at most one query."""
+    user = getattr(request, 'user', None)
+    if not user_ids or user is None or not user.is_authenticated:
+        return set()
+    Follow = User.followers.through
+    # from_user is the followed user, to_user the follower.
+    return set(
+        Follow.objects.filter(to_user_id=user.pk, from_user_id__in=user_ids).values_list('from_user_id', flat=True)
+    )
+
+
+class FollowEntryListSerializer(serializers.ListSerializer):
+    """Resolves ``followed_by_me`` for a whole page with a single query."""
+
+    def to_representation(self, data):
+        users = list(data)
+        self.context['followed_user_ids'] = followed_user_ids(self.context.get('request'), [u.pk for u in users])
+        return super().to_representation(users)
+
+
+class FollowEntrySerializer(serializers.ModelSerializer):
+    """A row of a followers/following list."""
+    followed_by_me = serializers.SerializerMethodField()
+
+    class Meta:
+        model = User
+        fields = ['id', 'username', 'first_name', 'last_name', 'profile_picture', 'followers_count', 'followed_by_me']
+        read_only_fields = fields
+        list_serializer_class = FollowEntryListSerializer
+
+    def get_followed_by_me(self, obj):
+        followed = self.context.get('followed_user_ids')
+        if followed is None:
+            followed = followed_user_ids(self.context.get('request'), [obj.pk])
+        return obj.pk in followed
+
+
+class SuggestionSerializer(serializers.ModelSerializer):
+    """A suggested user; ``mutual_count`` is how many of the requester's followees follow them."""
+    mutual_count = serializers.SerializerMethodField()
+
+    class Meta:
+        model = User
+        fields = ['id', 'username', 'first_name', 'last_name', 'profile_picture', 'followers_count', 'mutual_count']
+        read_only_fields = fields
+
+    def get_mutual_count(self, obj):
+        return self.context['mutual_counts'][obj.pk]
+
+
+class FollowTargetField(serializers.Field):
+    """A user id (JSON number) or username (JSON string)."""
+    default_error_messages = {'invalid': 'Expected a user id or a username.'}
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool) or not isinstance(data, (int, str)) or data == '':
+            self.fail('invalid')
+        return data
+
+    def to_representation(self, value):
+        return value
+
+
+class BulkFollowSerializer(serializers.Serializer):
+    action = serializers.ChoiceField(choices=['follow', 'unfollow'])
+    targets = serializers.ListField(child=FollowTargetField(), allow_empty=False)
+
+    def validate_targets(self, targets):
+        limit = getattr(settings, 'ACCOUNTS_BULK_FOLLOW_MAX', 100)
+        if len(targets) > limit:
+            raise serializers.ValidationError(f'At most {limit} targets per request.')
+        return list(dict.fromkeys(targets))
 
 
 class RegisterSerializer(serializers.ModelSerializer):
@@ -32,11 +115,14 @@ class RegisterSerializer(serializers.ModelSerializer):
         fields = ['username', 'email', 'password']
 
     def create(self, validated_data):
-        user = get_user_model().objects.create_user(
-            username=validated_data['username'],
-            email=validated_data.get('email'),
-            password=validated_data['password'],
+        # create_user() minus the hashing, which runs on the bounded pool.
+        UserModel = get_user_model()
+        user = UserModel(
+            username=UserModel.normalize_username(validated_data['username']),
+            email=UserModel.objects.normalize_email(validated_data.get('email')),
+            password=hashing.make_password(validated_data['password']),
         )
+        user.save()
         # Create token on registration
         Token.objects.create(user=user)
         return user
@@ -47,7 +133,10 @@ class LoginSerializer(serializers.Serializer):
     password = serializers.CharField(write_only=True)
 
     def validate(self, attrs):
-        user = authenticate(username=attrs.get('username'), password=attrs.get('password'))
+        # Only this API login hashes on the bounded pool, so only it can answer 503.
+        user = PooledModelBackend().authenticate(
+            self.context.get('request'), username=attrs.get('username'), password=attrs.get('password')
+        )
         if not user:
             raise serializers.ValidationError('Invalid username or password')
         attrs['user'] = user
@@ -58,3 +147,43 @@ class ProfileUpdateSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['first_name', 'last_name', 'bio', 'profile_picture']
+
+    def validate_profile_picture(self, value):
+        if not value:
+            return value
+        # Header only: decoding and stripping metadata happen in the background.
+        try:
+            avatars.check(value)
+        except (OSError, Image.DecompressionBombError):
+            raise serializers.ValidationError('Upload a valid image.')
+        return value
+
+    def update(self, instance, validated_data):
+        # Save only the edited columns: follow counts are written by accounts.counters
+        # alone, and a full save would put back the ones loaded with ``instance``.
+        update_fields = list(validated_data)
+        stale_names = None
+        if 'profile_picture' in validated_data:
+            upload = validated_data.pop('profile_picture')
+            update_fields.remove('profile_picture')
+            stale_names = []
+            if upload:
+                # Published only once stripped and rendered; see accounts.avatars.
+                instance.profile_picture_pending = avatars.pending_storage().save(
+                    f'{instance.pk}/{upload.name}', upload
+                )
+            else:
+                stale_names = list(instance.profile_picture_variants.values())
+                if instance.profile_picture:
+                    stale_names.append(instance.profile_picture.name)
+                instance.profile_picture = None
+                instance.profile_picture_variants = {}
+                instance.profile_picture_pending = ''
+                update_fields += ['profile_picture', 'profile_picture_variants']
+            update_fields.append('profile_picture_pending')
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(update_fields=update_fields)
+        if stale_names is not None:
+            avatars.schedule(instance, stale_names)
+        return instance
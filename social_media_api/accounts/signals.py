@@ -0,0 +1,81 @@
+from django.contrib.auth import get_user_model
+from django.db.models import Q
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from . import autocomplete, counters, follow_graph
+from .authentication import invalidate_token, invalidate_users
+
+User = get_user_model()
+Follow = User.followers.through
+
+
+def _rows(instance, reverse, pk_set=None):
+    """Follow rows touched by an m2m change, as ``(followee_ids, follower_ids)``.
+
+    reverse=True: instance.following changed, pk_set are followees.
+    reverse=False: instance.followers changed, pk_set are followers.
+    """
+    own, other = ('to_user_id', 'from_user_id') if reverse else ('from_user_id', 'to_user_id')
+    rows = Follow.objects.filter(**{own: instance.pk})
+    if pk_set is not None:
+        rows = rows.filter(**{f'{other}__in': pk_set})
+    # Lock the rows so concurrent removals cannot both count the same follow.
+    pairs = list(rows.select_for_update().values_list('from_user_id', 'to_user_id'))
+    return [followee for followee, _ in pairs], [follower for _, follower in pairs]
+
+
+@receiver(m2m_changed, sender=Follow)
+def count_follows(sender, instance, action, reverse, pk_set, **kwargs):
+    # add() only reports rows it inserted; remove()/clear() are counted before
+    # the delete, inside the same transaction, from the rows that really exist.
+    if action == 'post_add' and pk_set:
+        others = list(pk_set)
+        rows = (others, [instance.pk] * len(others)) if reverse else ([instance.pk] * len(others), others)
+        counters.follows_gained(*rows)
+        follow_graph.record(*rows, followed=True)
+    elif action == 'pre_remove' and pk_set:
+        rows = _rows(instance, reverse, pk_set)
+        counters.follows_lost(*rows)
+        follow_graph.record(*rows, followed=False)
+    elif action == 'pre_clear':
+        rows = _rows(instance, reverse)
+        counters.follows_lost(*rows)
+        follow_graph.record(*rows, followed=False)
+
+
+@receiver(pre_delete, sender=User)
+def uncount_deleted_user(sender, instance, **kwargs):
+    # The cascade deletes follow rows without m2m_changed.
+    pairs = list(
+        Follow.objects.filter(Q(from_user_id=instance.pk) | Q(to_user_id=instance.pk))
+        .values_list('from_user_id', 'to_user_id')
+    )
+    rows = [followee for followee, _ in pairs], [follower for _, follower in pairs]
+    counters.follows_lost(*rows)
+    follow_graph.record(*rows, followed=False)
+
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(sender, instance, **kwargs):
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=User)
+def forget_saved_user(sender, instance, created, raw=False, **kwargs):
+    # Any save may change the password, is_active or profile fields in the snapshot.
+    if not created and not raw:
+        invalidate_users([instance.pk])
+
+
+@receiver(post_save, sender=User)
+def index_saved_user(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and not {'username', 'is_active'} & set(update_fields)):
+        return
+    autocomplete.record_users([instance])
+
+
+@receiver(post_delete, sender=User)
+def unindex_deleted_user(sender, instance, **kwargs):
+    autocomplete.forget_users([instance.pk])
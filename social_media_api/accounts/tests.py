@@ -1,8 +1,37 @@
+import hashlib
+import io
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from unittest import mock
+from io import StringIO
+
+from django.apps import apps
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.core.cache import caches
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework.test import APITestCase, APIClient
 from rest_framework.authtoken.models import Token
 from notifications.models import Notification
+from PIL import Image
+from accounts import autocomplete, avatars, hashing
+from accounts.follow_graph import CSRGraph, FollowGraph, follow_graph
+from accounts.authentication import CachedTokenAuthentication, token_snapshots
+from accounts.serializers import ProfileUpdateSerializer
+from posts.models import Comment, Post
 
 
 class FollowUnfollowTests(APITestCase):
@@ -37,3 +66,719 @@ class FollowUnfollowTests(APITestCase):
         self.assertEqual(resp.status_code, 200)
         notif = Notification.objects.filter(recipient=self.user2, actor=self.user1, verb__icontains='following').first()
         self.assertIsNotNone(notif)
+
+
+class FollowListTests(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.me = User.objects.create_user(username="me", password="pass12345")
+        self.star = User.objects.create_user(username="star", password="pass12345")
+        self.fans = [User.objects.create_user(username=f"fan{i}", password="pass12345") for i in range(5)]
+        for fan in self.fans:
+            fan.following.add(self.star)
+        self.me.following.add(self.star, self.fans[1], self.fans[3])
+        token, _ = Token.objects.get_or_create(user=self.me)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+
+    def test_followers_newest_first_with_followed_by_me(self):
+        url = reverse('user-followers', args=[self.star.id])
+        resp = self.client.get(url, {"page_size": 3})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual([u['username'] for u in resp.data['results']], ["me", "fan4", "fan3"])
+        self.assertEqual([u['followed_by_me'] for u in resp.data['results']], [False, False, True])
+        self.assertEqual(resp.data['results'][1]['followers_count'], 0)
+
+        resp = self.client.get(resp.data['next'])
+        self.assertEqual([u['username'] for u in resp.data['results']], ["fan2", "fan1", "fan0"])
+        self.assertEqual([u['followed_by_me'] for u in resp.data['results']], [False, True, False])
+        self.assertIsNone(resp.data['next'])
+
+    def test_following(self):
+        resp = self.client.get(reverse('user-following', args=[self.me.id]))
+        self.assertEqual([u['username'] for u in resp.data['results']], ["fan3", "fan1", "star"])
+        self.assertTrue(all(u['followed_by_me'] for u in resp.data['results']))
+
+    def test_one_query_per_page_for_followed_by_me(self):
+        url = reverse('user-followers', args=[self.star.id])
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(url)
+        queries = [q for q in ctx.captured_queries if 'authtoken_token' not in q['sql']]
+        # user exists, page of follows with users, followed_by_me
+        self.assertEqual(len(queries), 3)
+
+    def test_unknown_user(self):
+        self.assertEqual(self.client.get(reverse('user-followers', args=[9999])).status_code, 404)
+
+
+class BulkFollowTests(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.me = User.objects.create_user(username="me", password="pass12345")
+        self.others = [User.objects.create_user(username=f"user{i}", password="pass12345") for i in range(6)]
+        self.me.following.add(self.others[0])
+        token, _ = Token.objects.get_or_create(user=self.me)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+
+    def bulk(self, action, targets):
+        return self.client.post(reverse('bulk-follow'), {"action": action, "targets": targets}, format="json")
+
+    def test_follow_by_id_and_username(self):
+        o = self.others
+        resp = self.bulk("follow", [o[0].id, o[1].id, "user2", "nobody", 9999, "me", o[1].id])
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual([(r['target'], r['status']) for r in resp.data['results']], [
+            (o[0].id, "already_following"), (o[1].id, "followed"), ("user2", "followed"),
+            ("nobody", "not_found"), (9999, "not_found"), ("me", "self"),
+        ])
+        self.assertEqual(resp.data['results'][2]['id'], o[2].id)
+        self.assertEqual(set(self.me.following.all()), {o[0], o[1], o[2]})
+        self.me.refresh_from_db()
+        self.assertEqual(self.me.following_count, 3)
+        notified = Notification.objects.filter(actor=self.me, verb='started following you')
+        self.assertEqual(set(notified.values_list('recipient_id', flat=True)), {o[1].id, o[2].id})
+
+    def test_query_count_does_not_grow_with_targets(self):
+        self.bulk("follow", ["user1"])  # warm the token cache
+        with CaptureQueriesContext(connection) as two:
+            self.bulk("follow", ["user2", "user3"])
+        with CaptureQueriesContext(connection) as three:
+            self.bulk("follow", [self.others[4].id, self.others[5].id, "user0"])
+        self.assertEqual(len(two.captured_queries), len(three.captured_queries))
+
+    def test_follow_committed_just_before_is_not_reported_again(self):
+        atomic = transaction.atomic
+        pending = [self.others[1]]
+
+        def concurrent_follow_then_atomic(*args, **kwargs):
+            # Another request commits the same follow after our targets resolve.
+            while pending:
+                self.me.following.add(pending.pop())
+            return atomic(*args, **kwargs)
+
+        with mock.patch.object(transaction, 'atomic', concurrent_follow_then_atomic):
+            resp = self.bulk("follow", ["user1"])
+        self.assertEqual(resp.data['results'][0]['status'], "already_following")
+        self.assertFalse(Notification.objects.filter(actor=self.me, recipient=self.others[1]).exists())
+        self.me.refresh_from_db()
+        self.assertEqual(self.me.following_count, 2)
+
+    def test_unfollow(self):
+        resp = self.bulk("unfollow", [self.others[0].id, "user1"])
+        self.assertEqual([r['status'] for r in resp.data['results']], ["unfollowed", "not_following"])
+        self.assertFalse(self.me.following.exists())
+
+    def test_validation(self):
+        self.assertEqual(self.bulk("block", ["user1"]).status_code, 400)
+        self.assertEqual(self.bulk("follow", []).status_code, 400)
+        self.assertEqual(self.bulk("follow", [True]).status_code, 400)
+        with override_settings(ACCOUNTS_BULK_FOLLOW_MAX=2):
+            self.assertEqual(self.bulk("follow", ["a", "b", "c"]).status_code, 400)
+
+
+class AutocompleteTests(APITestCase):
+    def setUp(self):
+        autocomplete.autocomplete.clear()
+        self.addCleanup(autocomplete.autocomplete.clear)
+        # A background thread could not see this test's uncommitted rows; build inline instead.
+        inline_builds = mock.patch.object(autocomplete.autocomplete, '_start_rebuild', autocomplete.autocomplete.rebuild)
+        inline_builds.start()
+        self.addCleanup(inline_builds.stop)
+        User = get_user_model()
+        self.me = User.objects.create_user(username="me", password="pass12345")
+        self.alice = User.objects.create_user(username="Alice", password="pass12345")
+        self.alan = User.objects.create_user(username="alan", password="pass12345")
+        self.bob = User.objects.create_user(username="bob", password="pass12345")
+        self.bob.following.add(self.alan)
+        token, _ = Token.objects.get_or_create(user=self.me)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+
+    def complete(self, q, **params):
+        resp = self.client.get(reverse('user-autocomplete'), {"q": q, **params})
+        self.assertEqual(resp.status_code, 200)
+        return [u['username'] for u in resp.data['results']]
+
+    def test_prefix_is_case_insensitive_and_ranked_by_followers(self):
+        self.assertEqual(self.complete("AL"), ["alan", "Alice"])
+        self.assertEqual(self.complete("ali"), ["Alice"])
+        self.assertEqual(self.complete("al", limit=1), ["alan"])
+        self.assertEqual(self.complete("zz"), [])
+        self.assertEqual(self.complete(""), [])
+        with override_settings(ACCOUNTS_AUTOCOMPLETE_TTL=0):
+            self.assertEqual(self.complete("AL"), ["alan", "Alice"])
+
+    def test_index_follows_saves_deletes_and_follows(self):
+        self.complete("al")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.me.following.add(self.alice)
+            self.bob.following.add(self.alice)
+        self.assertEqual(self.complete("al"), ["Alice", "alan"])
+        with self.captureOnCommitCallbacks(execute=True):
+            get_user_model().objects.create_user(username="albert", password="pass12345")
+            self.bob.username = "alfred"
+            self.bob.save()
+        self.assertEqual(self.complete("al"), ["Alice", "alan", "alfred", "albert"])
+        self.assertEqual(self.complete("b"), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.alan.is_active = False
+            self.alan.save()
+            get_user_model().objects.get(username="albert").delete()
+        self.assertEqual(self.complete("al"), ["Alice", "alfred"])
+
+    def test_builds_run_off_the_request_thread(self):
+        index = autocomplete.autocomplete
+        started, release = threading.Event(), threading.Event()
+
+        def slow_rebuild():
+            started.set()
+            release.wait(5)
+
+        background = autocomplete.Autocomplete._start_rebuild.__get__(index)
+        with mock.patch.object(index, '_start_rebuild', background), mock.patch.object(index, 'rebuild', slow_rebuild):
+            # Answered by istartswith while the first build is still running.
+            self.assertEqual(self.complete("AL"), ["alan", "Alice"])
+            self.assertTrue(started.wait(5))
+            self.assertTrue(index.stats()['rebuilding'])
+            release.set()
+            for _ in range(100):
+                if not index.stats()['rebuilding']:
+                    break
+                time.sleep(0.01)
+
+    def test_servers_build_at_startup_but_commands_do_not(self):
+        config = apps.get_app_config('accounts')
+        with mock.patch.object(autocomplete, 'warm') as warm:
+            for argv in (['manage.py', 'migrate'], ['manage.py', 'test'], ['manage.py', 'runserver']):
+                with mock.patch.object(sys, 'argv', argv):
+                    config.ready()
+            warm.assert_not_called()
+            for argv in (['gunicorn', 'social_media_api.wsgi'], ['manage.py', 'runserver', '--noreload']):
+                with mock.patch.object(sys, 'argv', argv):
+                    config.ready()
+        self.assertEqual(warm.call_count, 2)
+
+    def test_forked_worker_restarts_the_startup_build(self):
+        index = autocomplete.autocomplete
+        with mock.patch.object(index, '_warm', True):
+            # As if the parent's build thread held the lock when the worker forked.
+            index._rebuild_lock.acquire()
+            index._after_fork()
+        self.assertFalse(index.stats()['rebuilding'])
+        self.assertEqual(index.stats()['users'], 4)
+
+    def test_follow_counts_are_not_read_before_a_build(self):
+        with CaptureQueriesContext(connection) as ctx, self.captureOnCommitCallbacks(execute=True):
+            self.me.following.add(self.alice)
+        self.assertFalse([q for q in ctx.captured_queries if '"followers_count" FROM' in q['sql']])
+
+    def test_top_lists_match_a_full_scan(self):
+        rng = random.Random(7)
+        rows = {i: (f"{rng.choice('abc')}{rng.choice('ab')}{i}", rng.randrange(50)) for i in range(1, 400)}
+        with mock.patch.object(autocomplete, 'SCAN_LIMIT', 8):
+            index = autocomplete.UsernameIndex((i, name, n) for i, (name, n) in rows.items())
+            self.assertIn("ab", index.top)
+            for step in range(600):
+                user_id = rng.randrange(1, 450)
+                if rng.random() < 0.2:
+                    index.remove(user_id)
+                    rows.pop(user_id, None)
+                else:
+                    name = rows.get(user_id, (f"{rng.choice('abc')}{user_id}",))[0]
+                    rows[user_id] = (name, rng.randrange(50))
+                    index.upsert(user_id, *rows[user_id])
+                prefix = rng.choice(["", "a", "ab", "b", "c", "ca", "a1", "b2"])
+                expected = sorted(
+                    (-n, i) for i, (name, n) in rows.items() if name.lower().startswith(prefix)
+                )[:10]
+                self.assertEqual([(-n, i) for i, _, n in index.search(prefix, 10)], expected)
+
+
+class SuggestionTests(APITestCase):
+    def setUp(self):
+        follow_graph.clear()
+        self.addCleanup(follow_graph.clear)
+        # A background thread could not see this test's uncommitted rows; build inline instead.
+        inline_builds = mock.patch.object(follow_graph, '_start_rebuild', follow_graph.rebuild)
+        inline_builds.start()
+        self.addCleanup(inline_builds.stop)
+        User = get_user_model()
+        self.me = User.objects.create_user(username="me", password="pass12345")
+        self.a, self.b, self.c, self.x, self.y = (
+            User.objects.create_user(username=name, password="pass12345") for name in ("a", "b", "c", "x", "y")
+        )
+        self.me.following.add(self.a, self.b)
+        self.a.following.add(self.x, self.y, self.b, self.me)
+        self.b.following.add(self.x, self.c)
+        token, _ = Token.objects.get_or_create(user=self.me)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+
+    def suggested(self, **params):
+        resp = self.client.get(reverse('follow-suggestions'), params)
+        self.assertEqual(resp.status_code, 200)
+        return [(u['username'], u['mutual_count']) for u in resp.data['results']]
+
+    def test_ranks_friends_of_friends_by_mutual_follows(self):
+        expected = [("x", 2), ("c", 1), ("y", 1)]
+        self.assertEqual(self.suggested(), expected)
+        self.assertEqual(self.suggested(limit=1), [("x", 2)])
+        with override_settings(ACCOUNTS_FOLLOW_GRAPH_TTL=0):
+            self.assertEqual(self.suggested(), expected)
+
+    def test_follows_update_the_graph_incrementally(self):
+        self.suggested()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.me.following.add(self.x)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.b.following.remove(self.c)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.suggested(), [("y", 1)])
+        self.assertFalse(any("accounts_user_followers\" ORDER BY" in q['sql'] for q in ctx.captured_queries))
+        self.assertEqual(follow_graph.stats()['pending_changes'], 2)
+
+        follow_graph.rebuild()
+        self.assertEqual(follow_graph.stats()['pending_changes'], 0)
+        self.assertEqual(self.suggested(), [("y", 1)])
+
+    def test_builds_run_off_the_request_thread(self):
+        started, release, calls = threading.Event(), threading.Event(), []
+
+        def slow_rebuild():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+
+        background = FollowGraph._start_rebuild.__get__(follow_graph)
+        with mock.patch.object(follow_graph, '_start_rebuild', background), \
+                mock.patch.object(follow_graph, 'rebuild', slow_rebuild):
+            # Answered by the SQL fallback while the first build is still running.
+            self.assertEqual(self.suggested(), [("x", 2), ("c", 1), ("y", 1)])
+            self.assertTrue(started.wait(5))
+            self.assertEqual(self.suggested(limit=1), [("x", 2)])
+            self.assertTrue(follow_graph.stats()['rebuilding'])
+            release.set()
+            for _ in range(100):
+                if not follow_graph.stats()['rebuilding']:
+                    break
+                time.sleep(0.01)
+        self.assertEqual(len(calls), 1)
+
+    def test_follows_from_other_processes_are_filtered(self):
+        self.suggested()
+        # Written without signals, as another process's follow would look to this graph.
+        get_user_model().followers.through.objects.create(from_user=self.x, to_user=self.me)
+        self.assertEqual(self.suggested(), [("c", 1), ("y", 1)])
+
+
+    def test_graph_holds_64_bit_ids(self):
+        graph = CSRGraph([(1, 2 ** 40), (2 ** 33, 1), (2 ** 33, 2 ** 34)])
+        self.assertEqual(list(graph.following(2 ** 33)), [1, 2 ** 34])
+        self.assertEqual(list(graph.following(1)), [2 ** 40])
+
+
+class ProfileFieldsTests(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username="alice", password="pass12345")
+        token, _ = Token.objects.get_or_create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+
+    def test_counts_are_skipped_unless_requested(self):
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.get(reverse('profile'), {'fields': 'id,username'})
+        self.assertEqual(resp.data, {'id': self.user.pk, 'username': 'alice'})
+        self.assertFalse([q for q in queries.captured_queries if 'accounts_user_followers' in q['sql']])
+        resp = self.client.get(reverse('profile'))
+        self.assertEqual(resp.data['followers_count'], 0)
+
+
+class FollowCountTests(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.alice, self.bob, self.carla = (
+            User.objects.create_user(username=name, password="pass12345") for name in ("alice", "bob", "carla")
+        )
+        token, _ = Token.objects.get_or_create(user=self.alice)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+
+    def counts(self, user):
+        user.refresh_from_db()
+        return user.followers_count, user.following_count
+
+    def test_follow_and_unfollow_views_keep_counts(self):
+        for _ in range(2):
+            self.client.post(reverse('follow-user', args=[self.bob.id]))
+        self.assertEqual(self.counts(self.alice), (0, 1))
+        self.assertEqual(self.counts(self.bob), (1, 0))
+        for _ in range(2):
+            self.client.post(reverse('unfollow-user', args=[self.bob.id]))
+        self.assertEqual(self.counts(self.alice), (0, 0))
+        self.assertEqual(self.counts(self.bob), (0, 0))
+
+    def test_direct_m2m_edits_are_counted(self):
+        self.bob.followers.add(self.alice, self.carla)
+        self.assertEqual(self.counts(self.bob), (2, 0))
+        self.bob.followers.remove(self.carla, self.carla)
+        self.alice.following.add(self.carla)
+        self.assertEqual(self.counts(self.alice), (0, 2))
+        self.alice.following.clear()
+        self.assertEqual(
+            [self.counts(user) for user in (self.alice, self.bob, self.carla)], [(0, 0), (0, 0), (0, 0)]
+        )
+
+    def test_deleting_a_user_uncounts_their_follows(self):
+        self.alice.following.add(self.bob)
+        self.carla.followers.add(self.alice)
+        self.alice.delete()
+        self.assertEqual(self.counts(self.bob), (0, 0))
+        self.assertEqual(self.counts(self.carla), (0, 0))
+
+    def test_profile_reads_stored_counts(self):
+        self.alice.followers.add(self.bob)
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.get(reverse('profile'))
+        self.assertEqual((resp.data['followers_count'], resp.data['following_count']), (1, 0))
+        self.assertFalse([q for q in queries.captured_queries if 'accounts_user_followers' in q['sql']])
+
+    def test_profile_edit_keeps_counts_changed_since_load(self):
+        stale = get_user_model().objects.get(pk=self.alice.pk)
+        self.bob.following.add(self.alice)
+        serializer = ProfileUpdateSerializer(stale, data={'bio': 'Hi'}, partial=True)
+        self.assertTrue(serializer.is_valid())
+        serializer.save()
+        self.assertEqual(self.counts(self.alice), (1, 0))
+        self.assertEqual(self.alice.bio, 'Hi')
+
+    def test_reconcile_repairs_drift(self):
+        self.alice.following.add(self.bob)
+        get_user_model().objects.filter(pk=self.bob.pk).update(followers_count=7)
+        out = StringIO()
+        call_command('reconcile_follow_counts', stdout=out)
+        self.assertIn("repaired 1", out.getvalue())
+        self.assertEqual(self.counts(self.bob), (1, 0))
+
+
+@override_settings(
+    CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'auth': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'auth-tests'},
+    },
+    AUTH_TOKEN_CACHE_ALIAS='auth',
+)
+class CachedTokenAuthenticationTests(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username="alice", password="pass12345")
+        self.token, _ = Token.objects.get_or_create(user=self.user)
+        token_snapshots.clear()
+        caches['auth'].clear()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+
+    def auth_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.get(reverse('profile'))
+        return resp, [q for q in queries.captured_queries if 'authtoken_token' in q['sql']]
+
+    def test_second_request_skips_token_query(self):
+        resp, queries = self.auth_queries()
+        self.assertEqual((resp.status_code, len(queries)), (200, 1))
+        resp, queries = self.auth_queries()
+        self.assertEqual((resp.status_code, len(queries)), (200, 0))
+        self.assertEqual(resp.data['username'], 'alice')
+
+    def test_token_deletion_takes_effect_immediately(self):
+        self.auth_queries()
+        self.token.delete()
+        self.assertEqual(self.auth_queries()[0].status_code, 401)
+
+    def test_password_change_and_deactivation_drop_the_snapshot(self):
+        self.auth_queries()
+        self.user.set_password("new-pass-123")
+        self.user.save()
+        self.assertEqual(len(self.auth_queries()[1]), 1)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.auth_queries()[0].status_code, 401)
+
+    def test_profile_edits_and_follows_are_visible(self):
+        self.client.patch(reverse('profile'), {'bio': 'Hello'})
+        bob = get_user_model().objects.create_user(username="bob", password="pass12345")
+        self.auth_queries()
+        bob.following.add(self.user)
+        resp, _ = self.auth_queries()
+        self.assertEqual((resp.data['bio'], resp.data['followers_count']), ('Hello', 1))
+
+    def test_follows_keep_the_snapshot(self):
+        self.auth_queries()
+        get_user_model().objects.create_user(username="bob", password="pass12345").following.add(self.user)
+        self.assertEqual(len(self.auth_queries()[1]), 0)
+
+    def test_export_loads_the_user_row_once(self):
+        self.auth_queries()
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.get(reverse('export'), HTTP_ACCEPT='application/x-ndjson')
+            body = b''.join(resp.streaming_content)
+        user_queries = [q for q in queries.captured_queries if 'FROM "accounts_user"' in q['sql']]
+        self.assertEqual(len(user_queries), 1)
+        self.assertIn(b'"username":"alice"', body)
+
+    def test_shared_tier_serves_other_processes_and_sees_invalidations(self):
+        self.auth_queries()
+        token_snapshots.clear()  # as if the next request hit another process
+        self.assertEqual(len(self.auth_queries()[1]), 0)
+        # Another process deactivates the user: only the shared generation changes here.
+        caches['auth'].set(f"auth:token-gen:{self.token.key}", "bumped", None)
+        self.assertEqual(len(self.auth_queries()[1]), 1)
+
+    def test_snapshots_hold_no_password_hash(self):
+        self.auth_queries()
+        stored = caches['auth'].get(f"auth:token:{self.token.key}")
+        self.assertNotIn(self.user.password, repr(stored))
+        token_snapshots.clear()
+        user, _ = CachedTokenAuthentication().authenticate_credentials(self.token.key)
+        self.assertEqual((user.pk, user.username), (self.user.pk, 'alice'))
+        self.assertIn('password', user.get_deferred_fields())
+
+    @override_settings(AUTH_TOKEN_CACHE_ALIAS='')
+    def test_without_a_shared_cache_every_request_checks_the_token(self):
+        self.auth_queries()
+        self.assertEqual(len(self.auth_queries()[1]), 1)
+
+
+class HashingPoolTests(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username="alice", password="pass12345")
+
+    def login(self, password="pass12345"):
+        return self.client.post(reverse('login'), {"username": "alice", "password": password})
+
+    def test_login_and_register_hash_on_the_pool(self):
+        before = hashing.get_pool().stats()['completed']
+        self.assertEqual(self.login().status_code, 200)
+        self.assertEqual(self.login("wrong").status_code, 400)
+        resp = self.client.post(reverse('register'), {"username": "bob", "email": "Bob@EXAMPLE.com", "password": "pass12345"})
+        self.assertEqual(resp.status_code, 201)
+        bob = get_user_model().objects.get(username="bob")
+        self.assertEqual(bob.email, "Bob@example.com")
+        self.assertTrue(bob.check_password("pass12345"))
+        self.assertEqual(hashing.get_pool().stats()['completed'], before + 3)
+
+    def test_outdated_hash_is_upgraded(self):
+        self.user.password = PBKDF2PasswordHasher().encode("pass12345", "somesalt", iterations=1000)
+        self.user.save(update_fields=['password'])
+        self.assertEqual(self.login().status_code, 200)
+        self.user.refresh_from_db()
+        self.assertNotIn("$1000$", self.user.password)
+        self.assertTrue(self.user.check_password("pass12345"))
+
+    @override_settings(ACCOUNTS_HASHING_MAX_PENDING=0, ACCOUNTS_HASHING_RETRY_AFTER=3)
+    def test_full_pool_fails_fast_with_retry_after(self):
+        resp = self.login()
+        self.assertEqual(resp.status_code, 503)
+        self.assertEqual(resp['Retry-After'], '3')
+        self.assertEqual(hashing.get_pool().stats()['rejected'], 1)
+
+    @override_settings(ACCOUNTS_HASHING_MAX_PENDING=0)
+    def test_admin_login_does_not_use_the_pool(self):
+        self.user.is_staff = True
+        self.user.save()
+        resp = self.client.post(reverse('admin:login'), {"username": "alice", "password": "pass12345"})
+        self.assertEqual(resp.status_code, 302)
+        self.assertEqual(hashing.get_pool().stats()['rejected'], 0)
+
+    @override_settings(ACCOUNTS_HASHING_WORKERS=1, ACCOUNTS_HASHING_MAX_PENDING=1)
+    def test_busy_while_worker_is_occupied(self):
+        pool = hashing.get_pool()
+        started, release = threading.Event(), threading.Event()
+        blocker = threading.Thread(target=pool.run, args=(lambda: (started.set(), release.wait(5)),))
+        blocker.start()
+        started.wait(5)
+        try:
+            self.assertEqual(pool.stats()['running'], 1)
+            with self.assertRaises(hashing.HashingBusy):
+                pool.run(len, "x")
+        finally:
+            release.set()
+            blocker.join()
+        self.assertEqual(pool.run(len, "x"), 1)
+
+    def test_stats_are_admin_only(self):
+        token, _ = Token.objects.get_or_create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+        self.assertEqual(self.client.get(reverse('hashing-stats')).status_code, 403)
+        self.user.is_staff = True
+        self.user.save()
+        resp = self.client.get(reverse('hashing-stats'))
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn('queue_depth', resp.data)
+        self.assertIn('hash_ms_p99', resp.data)
+
+
+class ProfilePictureTests(APITestCase):
+    def setUp(self):
+        media_root, pending_root = tempfile.mkdtemp(), tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.addCleanup(shutil.rmtree, pending_root, ignore_errors=True)
+        settings_override = override_settings(
+            MEDIA_ROOT=media_root, ACCOUNTS_AVATAR_PENDING_ROOT=pending_root,
+            ACCOUNTS_AVATAR_WORKERS=0, ACCOUNTS_AVATAR_SIZES=(64, 256),
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = get_user_model().objects.create_user(username="alice", password="pass12345")
+        token, _ = Token.objects.get_or_create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+
+    def jpeg(self, color="red"):
+        exif = Image.Exif()
+        exif[0x010F] = "SpyCam"  # Make
+        exif[0x0112] = 6  # Orientation: rotate 90 degrees clockwise
+        buffer = io.BytesIO()
+        Image.new("RGB", (400, 300), color).save(buffer, "JPEG", exif=exif)
+        return buffer.getvalue()
+
+    def patch_picture(self, content, name="me.jpg", content_type="image/jpeg"):
+        picture = SimpleUploadedFile(name, content, content_type=content_type)
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.patch(reverse('profile'), {"profile_picture": picture}, format="multipart")
+
+    def upload(self, color="red"):
+        resp = self.patch_picture(self.jpeg(color))
+        self.assertEqual(resp.status_code, 200)
+        return resp
+
+    def test_upload_is_named_after_its_hash(self):
+        content = self.jpeg()
+        self.patch_picture(content, name="../../etc/passwd.jpg")
+        picture = self.client.get(reverse('profile')).data['profile_picture']
+        self.assertTrue(picture.endswith(f"/profiles/{hashlib.sha256(content).hexdigest()}.jpg"))
+
+    def test_rejects_other_content_types(self):
+        resp = self.patch_picture(b"%PDF-1.7 ...", name="cv.pdf", content_type="application/pdf")
+        self.assertEqual(resp.status_code, 415)
+        # Declared as a JPEG, but the leading bytes say otherwise.
+        resp = self.patch_picture(b"<html>" * 100, content_type="image/jpeg")
+        self.assertEqual(resp.status_code, 415)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.profile_picture)
+
+    def test_oversized_upload_is_cut_off(self):
+        content = self.jpeg()
+        with override_settings(ACCOUNTS_UPLOAD_MAX_BYTES=len(content) - 1):
+            resp = self.patch_picture(content)
+        self.assertEqual(resp.status_code, 413)
+        with override_settings(ACCOUNTS_UPLOAD_MAX_BYTES=100, DATA_UPLOAD_MAX_MEMORY_SIZE=1000):
+            resp = self.patch_picture(content)
+        self.assertEqual(resp.status_code, 413)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.profile_picture)
+
+    def test_upload_is_published_only_once_stripped(self):
+        # The request neither decodes the image nor stores it where it is served.
+        with mock.patch.object(avatars, 'run'), mock.patch.object(avatars, '_clean', side_effect=AssertionError):
+            resp = self.upload()
+        self.assertIsNone(resp.data['profile_picture'])
+        self.assertFalse(default_storage.exists("profiles"))
+        self.user.refresh_from_db()
+        pending = self.user.profile_picture_pending
+        self.assertTrue(avatars.pending_storage().exists(pending))
+
+        avatars.process(self.user.pk, pending)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.profile_picture_pending, '')
+        self.assertFalse(avatars.pending_storage().exists(pending))
+        with Image.open(self.user.profile_picture.path) as full:
+            self.assertEqual(full.size, (300, 400))
+            self.assertEqual(len(full.getexif()), 0)
+        self.assertEqual(default_storage.listdir("profiles")[1], [os.path.basename(self.user.profile_picture.name)])
+
+    def test_variants_are_rendered_after_commit(self):
+        resp = self.upload()
+        # The response is rendered before the picture is processed.
+        self.assertEqual((resp.data['profile_picture'], resp.data['profile_picture_variants']), (None, {}))
+        data = self.client.get(reverse('profile')).data
+        self.assertTrue(data['profile_picture'].startswith('http://testserver/media/profiles/'))
+        self.assertEqual(set(data['profile_picture_variants']), {'64.jpg', '64.webp', '256.jpg', '256.webp'})
+        self.assertTrue(data['profile_picture_variants']['64.webp'].startswith('http://testserver/media/profiles/'))
+
+        self.user.refresh_from_db()
+        for variant, name in self.user.profile_picture_variants.items():
+            with default_storage.open(name) as f, Image.open(f) as image:
+                size = int(variant.split('.')[0])
+                self.assertEqual(image.size, (size, size))
+                self.assertEqual(image.format, 'WEBP' if variant.endswith('.webp') else 'JPEG')
+                self.assertEqual(len(image.getexif()), 0)
+
+    def test_undecodable_image_is_rejected(self):
+        resp = self.patch_picture(b"\xff\xd8\xff" + b"\0" * 100)
+        self.assertEqual(resp.status_code, 400)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.profile_picture)
+
+    def test_new_upload_replaces_old_files(self):
+        self.upload()
+        self.user.refresh_from_db()
+        old = [self.user.profile_picture.name, *self.user.profile_picture_variants.values()]
+        self.upload("blue")
+        for name in old:
+            self.assertFalse(default_storage.exists(name))
+
+    def test_stale_job_does_not_publish(self):
+        with mock.patch.object(avatars, 'schedule'):
+            self.upload()
+        self.user.refresh_from_db()
+        first = self.user.profile_picture_pending
+        with mock.patch.object(avatars, 'schedule'):
+            self.upload("blue")
+        avatars.process(self.user.pk, first)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.profile_picture)
+        self.assertEqual(self.user.profile_picture_variants, {})
+        self.assertEqual(sorted(default_storage.listdir(f"profiles/{self.user.pk}")[1]), [])
+        self.assertFalse(avatars.pending_storage().exists(first))
+
+        avatars.process(self.user.pk, self.user.profile_picture_pending)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.profile_picture)
+        self.assertEqual(len(self.user.profile_picture_variants), 4)
+
+
+class ExportTests(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username="alice", password="pass12345")
+        other = User.objects.create_user(username="bob", password="pass12345")
+        self.posts = [Post.objects.create(author=self.user, title=f"Post {i}", content="...") for i in range(3)]
+        Post.objects.create(author=other, title="Not mine", content="...")
+        Comment.objects.create(post=self.posts[0], author=self.user, content="Mine")
+        Comment.objects.create(post=self.posts[0], author=other, content="Not mine")
+        token, _ = Token.objects.get_or_create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+
+    def assert_records(self, body):
+        records = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual([r['type'] for r in records], ['profile', 'post', 'post', 'post', 'comment'])
+        self.assertEqual(records[0]['username'], 'alice')
+        self.assertEqual([r['title'] for r in records[1:4]], ["Post 0", "Post 1", "Post 2"])
+        self.assertEqual(records[4]['content'], 'Mine')
+
+    def test_streams_ndjson_of_own_content(self):
+        resp = self.client.get(reverse('export'), HTTP_ACCEPT='application/x-ndjson')
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.streaming)
+        self.assertEqual(resp['Content-Type'], 'application/x-ndjson')
+        self.assert_records(b''.join(resp.streaming_content))
+
+    def test_zip_archive(self):
+        resp = self.client.get(reverse('export'), {'archive': 'zip'})
+        self.assertEqual(resp['Content-Type'], 'application/zip')
+        with zipfile.ZipFile(io.BytesIO(b''.join(resp.streaming_content))) as archive:
+            self.assertEqual(archive.namelist(), ['alice-export.ndjson'])
+            self.assert_records(archive.read('alice-export.ndjson'))
+
+    def test_requires_authentication(self):
+        self.client.credentials()
+        self.assertEqual(self.client.get(reverse('export')).status_code, 401)
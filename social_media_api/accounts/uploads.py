@@ -0,0 +1,81 @@
+"""Streaming, size-capped upload handling for profile pictures.
+
+``ProfilePictureUploadHandler`` replaces Django's default upload handlers on
+``ProfileView``. It refuses a request whose ``Content-Length`` already rules
+it out, checks the declared content type and the file's leading bytes as
+soon as they arrive (415), stops reading once a file passes
+``settings.ACCOUNTS_UPLOAD_MAX_BYTES`` (413), and otherwise writes every
+chunk straight to a temporary file while hashing it. The stored file is
+named after its SHA-256, so client-supplied names never reach storage.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+
+# Leading bytes of each accepted format and the extension it is stored under.
+SIGNATURES = {
+    'image/jpeg': ((b'\xff\xd8\xff',), '.jpg'),
+    'image/png': ((b'\x89PNG\r\n\x1a\n',), '.png'),
+    'image/gif': ((b'GIF87a', b'GIF89a'), '.gif'),
+    'image/webp': ((b'RIFF',), '.webp'),
+}
+SNIFF_BYTES = 12
+
+
+def max_bytes() -> int:
+    return getattr(settings, 'ACCOUNTS_UPLOAD_MAX_BYTES', 5 * 1024 * 1024)
+
+
+class UploadTooLarge(exceptions.APIException):
+    status_code = 413
+    default_detail = _('Uploaded file is too large.')
+    default_code = 'upload_too_large'
+
+
+def _matches(content_type, head) -> bool:
+    if content_type == 'image/webp':
+        return head[:4] == b'RIFF' and head[8:12] == b'WEBP'
+    return head.startswith(SIGNATURES[content_type][0])
+
+
+class ProfilePictureUploadHandler(TemporaryFileUploadHandler):
+    """Temp-file upload handler that enforces type and size limits while the bytes arrive."""
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        # Room for the non-file fields on top of the file itself.
+        allowance = settings.DATA_UPLOAD_MAX_MEMORY_SIZE
+        if allowance is not None and content_length > max_bytes() + allowance:
+            raise UploadTooLarge()
+
+    def new_file(self, field_name, file_name, content_type, *args, **kwargs):
+        if content_type not in SIGNATURES:
+            raise exceptions.UnsupportedMediaType(content_type)
+        super().new_file(field_name, file_name, content_type, *args, **kwargs)
+        self.size = 0
+        self.head = b''
+        self.digest = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.size += len(raw_data)
+        if self.size > max_bytes():
+            self.file.close()
+            raise UploadTooLarge()
+        if len(self.head) < SNIFF_BYTES:
+            self.head += raw_data[:SNIFF_BYTES - len(self.head)]
+            if len(self.head) >= SNIFF_BYTES and not _matches(self.content_type, self.head):
+                self.file.close()
+                raise exceptions.UnsupportedMediaType(self.content_type)
+        self.digest.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        if not _matches(self.content_type, self.head):
+            self.file.close()
+            raise exceptions.UnsupportedMediaType(self.content_type)
+        file = super().file_complete(file_size)
+        file.sha256 = self.digest.hexdigest()
+        file.name = file.sha256 + SIGNATURES[self.content_type][1]
+        return file
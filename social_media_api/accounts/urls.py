@@ -1,6 +1,9 @@
 from django.urls import path
 from rest_framework.authtoken.views import obtain_auth_token
-from .views import RegisterView, LoginView, ProfileView, FollowUserView, UnfollowUserView
+from .views import (
+    RegisterView, LoginView, ProfileView, FollowUserView, UnfollowUserView, ExportView, HashingStatsView, FollowListView,
+    SuggestionsView, BulkFollowView, AutocompleteView,
+)
 
 urlpatterns = [
     path('register/', RegisterView.as_view(), name='register'),
@@ -8,4 +11,11 @@ urlpatterns = [
     path('profile/', ProfileView.as_view(), name='profile'),
     path('follow/<int:user_id>/', FollowUserView.as_view(), name='follow-user'),
     path('unfollow/<int:user_id>/', UnfollowUserView.as_view(), name='unfollow-user'),
+    path('<int:user_id>/followers/', FollowListView.as_view(side='followers'), name='user-followers'),
+    path('<int:user_id>/following/', FollowListView.as_view(side='following'), name='user-following'),
+    path('follows/bulk/', BulkFollowView.as_view(), name='bulk-follow'),
+    path('autocomplete/', AutocompleteView.as_view(), name='user-autocomplete'),
+    path('suggestions/', SuggestionsView.as_view(), name='follow-suggestions'),
+    path('export/', ExportView.as_view(), name='export'),
+    path('hashing-stats/', HashingStatsView.as_view(), name='hashing-stats'),
 ]
@@ -1,13 +1,28 @@
+from django.conf import settings
 from django.shortcuts import render
+from django.http import StreamingHttpResponse
 from rest_framework.views import APIView
 from rest_framework import generics
 from rest_framework.response import Response
 from rest_framework import status, permissions
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.authtoken.models import Token
+from rest_framework.negotiation import BaseContentNegotiation
 from django.contrib.auth import get_user_model
-from .serializers import RegisterSerializer, LoginSerializer, UserSerializer, ProfileUpdateSerializer
-from notifications.utils import create_notification
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Q
+from .serializers import (
+    RegisterSerializer, LoginSerializer, UserSerializer, ProfileUpdateSerializer, FollowEntrySerializer,
+    SuggestionSerializer, BulkFollowSerializer, followed_user_ids,
+)
+from notifications.models import Notification
+from notifications.utils import create_notification, create_notifications
+from posts.pagination import KeysetPagination
+from .export import PROFILE_FIELDS, buffered, export_records, ndjson_lines, zip_stream
+from .hashing import get_pool as get_hashing_pool
+from .uploads import ProfilePictureUploadHandler
+from . import autocomplete, counters, follow_graph
 
 # Alias to satisfy explicit reference pattern
 CustomUser = get_user_model()
@@ -48,21 +63,29 @@ class ProfileView(APIView):
     permission_classes = [permissions.IsAuthenticated]
     parser_classes = [MultiPartParser, FormParser]
 
+    def initialize_request(self, request, *args, **kwargs):
+        # Stream profile_picture to a temp file, refusing oversized or non-image uploads early.
+        request.upload_handlers = [ProfilePictureUploadHandler(request)]
+        return super().initialize_request(request, *args, **kwargs)
+
+    def get_user(self):
+        # request.user may be a token snapshot with most fields deferred; read the row once.
+        return get_user_model().objects.get(pk=self.request.user.pk)
+
     def get(self, request):
-        return Response(UserSerializer(request.user, context={'request': request}).data)
+        return Response(UserSerializer(self.get_user(), context={'request': request}).data)
 
     def put(self, request):
-        serializer = ProfileUpdateSerializer(request.user, data=request.data)
-        if serializer.is_valid():
-            serializer.save()
-            return Response(UserSerializer(request.user, context={'request': request}).data)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        return self.update(request, partial=False)
 
     def patch(self, request):
-        serializer = ProfileUpdateSerializer(request.user, data=request.data, partial=True)
+        return self.update(request, partial=True)
+
+    def update(self, request, partial):
+        serializer = ProfileUpdateSerializer(self.get_user(), data=request.data, partial=partial)
         if serializer.is_valid():
-            serializer.save()
-            return Response(UserSerializer(request.user, context={'request': request}).data)
+            user = serializer.save()
+            return Response(UserSerializer(user, context={'request': request}).data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 # Create your views here.
@@ -83,7 +106,7 @@ class FollowUserView(APIView):
         # request.user.following is reverse of 'followers'
         request.user.following.add(target)
         # notify target user
-        create_notification(recipient=target, actor=request.user, verb='started following you', target=request.user)
+        create_notification(recipient=target, actor=request.user, verb='started following you', target=target)
         return Response({"detail": f"Now following {target.username}."}, status=status.HTTP_200_OK)
 
 
@@ -101,3 +124,199 @@ class UnfollowUserView(APIView):
 
         request.user.following.remove(target)
         return Response({"detail": f"Unfollowed {target.username}."}, status=status.HTTP_200_OK)
+
+
+class BulkFollowView(APIView):
+    """Follow or unfollow up to ``ACCOUNTS_BULK_FOLLOW_MAX`` users in one request.
+
+    Body: ``{"action": "follow" | "unfollow", "targets": [<id or username>, ...]}``.
+    Responds with one ``{"target", "id", "status"}`` per distinct target, in
+    input order. Status is ``followed``, ``already_following``, ``unfollowed``,
+    ``not_following``, ``self`` or ``not_found``.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        serializer = BulkFollowSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        action, targets = serializer.validated_data['action'], serializer.validated_data['targets']
+
+        ids = [t for t in targets if isinstance(t, int)]
+        names = [t for t in targets if isinstance(t, str)]
+        found = CustomUser.objects.filter(Q(pk__in=ids) | Q(username__in=names)).only('id', 'username')
+        by_id = {user.pk: user for user in found}
+        by_name = {user.username: user for user in by_id.values()}
+        resolved = {t: (by_id if isinstance(t, int) else by_name).get(t) for t in targets}
+
+        me = request.user
+        users = {user.pk: user for user in resolved.values() if user is not None and user.pk != me.pk}
+        done, unchanged = ('followed', 'already_following') if action == 'follow' else ('unfollowed', 'not_following')
+
+        with transaction.atomic():
+            # Lock our row and the targets' up front, in the pk order every user
+            # lock is taken in, so concurrent bulk requests decide one after the
+            # other, each from the follows the previous one committed.
+            counters.lock_users([me.pk, *users])
+            followed = followed_user_ids(request, list(users))
+            if action == 'follow':
+                changed = [user for user_id, user in users.items() if user_id not in followed]
+            else:
+                changed = [user for user_id, user in users.items() if user_id in followed]
+            if action == 'follow' and changed:
+                # One INSERT; m2m_changed keeps counts, timelines and the follow graph current.
+                me.following.add(*changed)
+                ct = ContentType.objects.get_for_model(me)
+                create_notifications(
+                    Notification(
+                        recipient=user,
+                        actor=me,
+                        verb='started following you',
+                        target_content_type=ct,
+                        target_object_id=user.pk,
+                    )
+                    for user in changed
+                )
+            elif changed:
+                me.following.remove(*changed)
+
+        changed_ids = {user.pk for user in changed}
+        results = []
+        for target, user in resolved.items():
+            if user is None:
+                outcome = 'not_found'
+            elif user.pk == me.pk:
+                outcome = 'self'
+            else:
+                outcome = done if user.pk in changed_ids else unchanged
+            results.append({'target': target, 'id': user.pk if user else None, 'status': outcome})
+        return Response({'results': results})
+
+
+class FollowPagination(KeysetPagination):
+    """Newest follows first, walking the through table's primary key."""
+    ordering = ('-id',)
+    signing_salt = 'accounts.follows.cursor'
+
+
+class FollowListView(generics.GenericAPIView):
+    """Users following ``user_id`` (``side='followers'``) or followed by them (``side='following'``).
+
+    Pages walk ``accounts_user_followers`` by id, backed by the
+    ``(from_user_id, id)`` and ``(to_user_id, id)`` indexes.
+    """
+    serializer_class = FollowEntrySerializer
+    pagination_class = FollowPagination
+    side = 'followers'
+
+    def get_relations(self):
+        """``(anchor, listed)`` columns of the through table; from_user is followed by to_user."""
+        return ('from_user', 'to_user') if self.side == 'followers' else ('to_user', 'from_user')
+
+    def get_queryset(self):
+        anchor, listed = self.get_relations()
+        columns = [f'{listed}__{name}' for name in FollowEntrySerializer.Meta.fields if name != 'followed_by_me']
+        return (
+            CustomUser.followers.through.objects
+            .filter(**{f'{anchor}_id': self.kwargs['user_id']})
+            .select_related(listed)
+            .only('id', *columns)
+        )
+
+    def get(self, request, user_id: int):
+        if not CustomUser.objects.filter(pk=user_id).exists():
+            return Response({"detail": "User not found."}, status=status.HTTP_404_NOT_FOUND)
+        page = self.paginate_queryset(self.get_queryset())
+        _, listed = self.get_relations()
+        users = [getattr(row, listed) for row in page]
+        return self.get_paginated_response(self.get_serializer(users, many=True).data)
+
+
+class SuggestionsView(APIView):
+    """Who to follow: friends of friends, ranked by how many of your followees follow them.
+
+    Answered from the in-memory ``accounts.follow_graph``; ``?limit=`` (default
+    10, at most ``ACCOUNTS_SUGGESTIONS_MAX``) caps the result.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        cap = getattr(settings, 'ACCOUNTS_SUGGESTIONS_MAX', 50)
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), cap)
+        except ValueError:
+            limit = 10
+        # Over-fetch a little: the graph may lag follows made in other processes.
+        ranked = follow_graph.suggest(request.user.pk, limit * 2)
+        candidates = [user_id for user_id, _ in ranked]
+        followed = followed_user_ids(request, candidates)
+        users = CustomUser.objects.filter(pk__in=candidates, is_active=True).in_bulk()
+        ranked = [(user_id, mutual) for user_id, mutual in ranked if user_id in users and user_id not in followed]
+        ranked = ranked[:limit]
+        serializer = SuggestionSerializer(
+            [users[user_id] for user_id, _ in ranked],
+            many=True,
+            context={'request': request, 'mutual_counts': dict(ranked)},
+        )
+        return Response({'results': serializer.data})
+
+
+class AutocompleteView(APIView):
+    """Usernames starting with ``?q=``, most followed first, from ``accounts.autocomplete``.
+
+    ``?limit=`` defaults to 10 and is capped at ``autocomplete.MAX_RESULTS``.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        prefix = request.query_params.get('q', '').strip()
+        if not prefix:
+            return Response({'results': []})
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), autocomplete.MAX_RESULTS)
+        except ValueError:
+            limit = 10
+        results = [
+            {'id': user_id, 'username': username, 'followers_count': followers}
+            for user_id, username, followers in autocomplete.search(prefix, limit)
+        ]
+        return Response({'results': results})
+
+
+class IgnoreClientContentNegotiation(BaseContentNegotiation):
+    """Always pick the first renderer; the export body is not produced by a renderer."""
+
+    def select_parser(self, request, parsers):
+        return parsers[0]
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+class ExportView(APIView):
+    """Stream the requesting user's profile, posts and comments as NDJSON.
+
+    ``?archive=zip`` wraps the same lines in a zip archive.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    content_negotiation_class = IgnoreClientContentNegotiation
+
+    def get(self, request):
+        # request.user may be a token snapshot with the profile fields deferred.
+        user = get_user_model().objects.only(*PROFILE_FIELDS).get(pk=request.user.pk)
+        lines = ndjson_lines(export_records(user))
+        name = f"{user.username}-export"
+        if request.query_params.get('archive') == 'zip':
+            response = StreamingHttpResponse(zip_stream(f"{name}.ndjson", lines), content_type='application/zip')
+            response['Content-Disposition'] = f'attachment; filename="{name}.zip"'
+        else:
+            response = StreamingHttpResponse(buffered(lines), content_type='application/x-ndjson')
+            response['Content-Disposition'] = f'attachment; filename="{name}.ndjson"'
+        return response
+
+
+class HashingStatsView(APIView):
+    """Queue depth, rejections and latency of this process's password hashing pool."""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(get_hashing_pool().stats())
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.3 on 2026-10-18 06:18
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def seed_recent_actors(apps, schema_editor):
+    Notification = apps.get_model('notifications', 'Notification')
+    batch = []
+    for notification in Notification.objects.only('pk', 'actor_id').iterator(chunk_size=1000):
+        notification.recent_actor_ids = [notification.actor_id]
+        batch.append(notification)
+        if len(batch) == 1000:
+            Notification.objects.bulk_update(batch, ['recent_actor_ids'])
+            batch = []
+    Notification.objects.bulk_update(batch, ['recent_actor_ids'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('notifications', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='actor_count',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='recent_actor_ids',
+            field=models.JSONField(default=list),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['recipient', 'target_content_type', 'target_object_id', 'verb'], name='notification_group_idx'),
+        ),
+        migrations.RunPython(seed_recent_actors, migrations.RunPython.noop),
+    ]
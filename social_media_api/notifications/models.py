@@ -14,11 +14,25 @@ class Notification(models.Model):
     target_object_id = models.PositiveIntegerField()
     target = GenericForeignKey('target_content_type', 'target_object_id')
 
+    # Events of one recipient, verb and target are coalesced into a single row
+    # (see ``notifications.utils``): ``actor`` is the latest of ``actor_count``
+    # actors (approximate, it may count an actor twice), ``recent_actor_ids``
+    # the last few of them, newest first, and ``timestamp`` the time of the
+    # latest event.
+    actor_count = models.PositiveIntegerField(default=1)
+    recent_actor_ids = models.JSONField(default=list)
+
     timestamp = models.DateTimeField(auto_now_add=True)
     read = models.BooleanField(default=False)
 
     class Meta:
         ordering = ['read', '-timestamp']
+        indexes = [
+            models.Index(
+                fields=['recipient', 'target_content_type', 'target_object_id', 'verb'],
+                name='notification_group_idx',
+            ),
+        ]
 
     def __str__(self) -> str:
         return f"{self.actor} {self.verb} -> {self.recipient}"
@@ -1,5 +1,8 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from posts.models import Comment, Post
+from posts.serializers import SimpleCommentSerializer, SimplePostSerializer
+from social_media_api.fieldsets import SparseFieldsetMixin, wants
 from .models import Notification
 
 
@@ -9,9 +12,46 @@ class SimpleUserSerializer(serializers.ModelSerializer):
         fields = ["id", "username"]
 
 
-class NotificationSerializer(serializers.ModelSerializer):
+class NotificationTargetField(serializers.Field):
+    """The notification's target object, summarized by its own serializer (``?expand=target``)."""
+
+    def __init__(self, **kwargs):
+        super().__init__(read_only=True, **kwargs)
+
+    def to_representation(self, target):
+        serializers_by_model = {
+            get_user_model(): SimpleUserSerializer,
+            Post: SimplePostSerializer,
+            Comment: SimpleCommentSerializer,
+        }
+        serializer_class = serializers_by_model.get(type(target))
+        if serializer_class is None:
+            return {"id": target.pk}
+        return serializer_class(target, context=self.context).data
+
+
+def recent_actor_names(user_ids) -> dict:
+    return dict(get_user_model().objects.filter(pk__in=set(user_ids)).values_list("pk", "username"))
+
+
+class NotificationListSerializer(serializers.ListSerializer):
+    """Resolves ``recent_actors`` for a whole page with a single query."""
+
+    def to_representation(self, data):
+        notifications = list(data.all() if hasattr(data, "all") else data)
+        if wants(self.context.get("request"), "recent_actors"):
+            self.context["recent_actor_names"] = recent_actor_names(
+                user_id for n in notifications for user_id in n.recent_actor_ids
+            )
+        return super().to_representation(notifications)
+
+
+class NotificationSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """A coalesced notification, read as "<actor> and <actor_count - 1> others <verb>"."""
     recipient = SimpleUserSerializer(read_only=True)
     actor = SimpleUserSerializer(read_only=True)
+    actor_count = serializers.IntegerField(read_only=True)
+    recent_actors = serializers.SerializerMethodField()
     verb = serializers.CharField()
     target_type = serializers.SerializerMethodField()
     target_id = serializers.IntegerField(source="target_object_id")
@@ -24,12 +64,23 @@ class NotificationSerializer(serializers.ModelSerializer):
             "id",
             "recipient",
             "actor",
+            "actor_count",
+            "recent_actors",
             "verb",
             "target_type",
             "target_id",
             "timestamp",
             "read",
         ]
+        expandable_fields = {"target": (NotificationTargetField, {})}
+        list_serializer_class = NotificationListSerializer
+
+    def get_recent_actors(self, obj):
+        names = self.context.get("recent_actor_names")
+        if names is None:
+            names = recent_actor_names(obj.recent_actor_ids)
+        # Actors deleted since are left out.
+        return [{"id": pk, "username": names[pk]} for pk in obj.recent_actor_ids if pk in names]
 
     def get_target_type(self, obj):
         return obj.target_content_type.model if obj.target_content_type else None
@@ -0,0 +1,148 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient, APITestCase
+
+from posts.models import Post
+from .models import Notification
+from .utils import create_notifications
+
+
+class NotificationListTests(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.alice = User.objects.create_user(username="alice", password="pass12345")
+        self.fans = [User.objects.create_user(username=f"fan{i}", password="pass12345") for i in range(3)]
+        self.post = Post.objects.create(author=self.alice, title="Hello", content="...")
+        for fan in self.fans:
+            client = self.client_for(fan)
+            client.post(reverse('post-like', args=[self.post.pk]))
+            client.post(reverse('follow-user', args=[self.alice.pk]))
+        self.client = self.client_for(self.alice)
+
+    def client_for(self, user):
+        token, _ = Token.objects.get_or_create(user=user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+        return client
+
+    def query_count(self, params):
+        self.client.get(reverse('notifications-list'), params)
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.get(reverse('notifications-list'), params)
+        return resp, len(queries)
+
+    def add_fans(self, count):
+        # Each late fan likes a post of their own choosing, so every like is a new row.
+        User = get_user_model()
+        for i in range(count):
+            fan = User.objects.create_user(username=f"late{i}", password="pass12345")
+            post = Post.objects.create(author=self.alice, title=f"Post {i}", content="...")
+            self.client_for(fan).post(reverse('post-like', args=[post.pk]))
+
+    def test_full_list_does_not_query_per_notification(self):
+        resp, before = self.query_count({})
+        self.assertEqual(len(resp.data['results']), 2)
+        self.assertEqual(resp.data['results'][0]['actor']['username'][:3], 'fan')
+        self.add_fans(3)
+        resp, after = self.query_count({})
+        self.assertEqual(len(resp.data['results']), 5)
+        self.assertEqual(before, after)
+
+    def test_likes_and_follows_are_coalesced(self):
+        resp = self.client.get(reverse('notifications-list'))
+        grouped = {item['verb']: item for item in resp.data['results']}
+        self.assertEqual(set(grouped), {'liked your post', 'started following you'})
+        likes = grouped['liked your post']
+        self.assertEqual(likes['actor']['username'], 'fan2')
+        self.assertEqual(likes['actor_count'], 3)
+        self.assertEqual([a['username'] for a in likes['recent_actors']], ['fan2', 'fan1', 'fan0'])
+        self.assertEqual(likes['target_id'], self.post.pk)
+        follows = grouped['started following you']
+        self.assertEqual(follows['actor_count'], 3)
+        self.assertEqual(follows['target_id'], self.alice.pk)
+
+    def test_sparse_fields(self):
+        resp, _ = self.query_count({'fields': 'verb,target_id'})
+        self.assertEqual(set(resp.data['results'][0]), {'verb', 'target_id'})
+
+    def test_expand_target_is_prefetched(self):
+        resp, before = self.query_count({'fields': 'verb', 'expand': 'target'})
+        targets = {item['verb']: item['target'] for item in resp.data['results']}
+        self.assertEqual(targets['liked your post']['title'], "Hello")
+        self.assertEqual(targets['liked your post']['author']['username'], "alice")
+        self.assertIn('username', targets['started following you'])
+        self.add_fans(3)
+        _, after = self.query_count({'fields': 'verb', 'expand': 'target'})
+        self.assertEqual(before, after)
+
+
+class CoalescingTests(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.alice = User.objects.create_user(username="alice", password="pass12345")
+        self.fans = [User.objects.create_user(username=f"fan{i}", password="pass12345") for i in range(4)]
+        self.post = Post.objects.create(author=self.alice, title="Hello", content="...")
+        self.other_post = Post.objects.create(author=self.alice, title="Again", content="...")
+        self.ct = ContentType.objects.get_for_model(Post)
+
+    def like(self, fan, post=None):
+        return Notification(
+            recipient=self.alice, actor=fan, verb='liked your post',
+            target_content_type=self.ct, target_object_id=(post or self.post).pk,
+        )
+
+    def test_batch_folds_per_target_and_counts_distinct_recent_actors(self):
+        f = self.fans
+        create_notifications([self.like(f[0]), self.like(f[1]), self.like(f[0], self.other_post)])
+        create_notifications([self.like(f[1]), self.like(f[2]), self.like(self.alice)])
+        rows = {n.target_object_id: n for n in Notification.objects.all()}
+        self.assertEqual(len(rows), 2)
+        first = rows[self.post.pk]
+        self.assertEqual(first.actor_id, f[2].pk)
+        self.assertEqual(first.actor_count, 3)
+        self.assertEqual(first.recent_actor_ids, [f[2].pk, f[1].pk, f[0].pk])
+        self.assertEqual(rows[self.other_post.pk].actor_count, 1)
+
+    @override_settings(NOTIFICATIONS_RECENT_ACTORS=2)
+    def test_recent_actors_are_capped(self):
+        create_notifications([self.like(fan) for fan in self.fans])
+        row = Notification.objects.get()
+        self.assertEqual(row.actor_count, 4)
+        self.assertEqual(row.recent_actor_ids, [self.fans[3].pk, self.fans[2].pk])
+
+    def test_read_or_stale_groups_are_not_reused(self):
+        create_notifications([self.like(self.fans[0])])
+        Notification.objects.update(read=True)
+        create_notifications([self.like(self.fans[1])])
+        stale = Notification.objects.get(read=False).timestamp - timedelta(days=2)
+        Notification.objects.filter(read=False).update(timestamp=stale)
+        create_notifications([self.like(self.fans[2])])
+        self.assertEqual(list(Notification.objects.order_by('pk').values_list('actor_count', flat=True)), [1, 1, 1])
+
+    @override_settings(NOTIFICATIONS_COALESCE_WINDOW=0)
+    def test_zero_window_writes_a_row_per_event(self):
+        create_notifications([self.like(fan) for fan in self.fans])
+        self.assertEqual(Notification.objects.count(), 4)
+
+    def test_query_count_does_not_grow_with_events(self):
+        with CaptureQueriesContext(connection) as two:
+            create_notifications([self.like(self.fans[0]), self.like(self.fans[0], self.other_post)])
+        with CaptureQueriesContext(connection) as many:
+            create_notifications([self.like(fan, post) for fan in self.fans for post in (self.post, self.other_post)])
+        self.assertEqual(len(two), len(many))
+        self.assertEqual(Notification.objects.get(target_object_id=self.post.pk).actor_count, 4)
+
+    def test_recipients_are_locked_before_groups_are_read(self):
+        User = get_user_model()
+        with CaptureQueriesContext(connection) as ctx:
+            create_notifications([self.like(self.fans[0])])
+        selects = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('SELECT')]
+        self.assertIn(f'FROM "{User._meta.db_table}"', selects[0])
+        self.assertIn('"target_content_type_id" IN', selects[1])
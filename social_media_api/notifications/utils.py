@@ -1,6 +1,60 @@
+"""Writing notifications.
+
+Events are coalesced per ``(recipient, verb, target)``: a new event folds
+into that group's unread row if the row was last bumped less than
+``settings.NOTIFICATIONS_COALESCE_WINDOW`` seconds ago (``0`` gives every
+event its own row). Folding makes the event's actor the row's ``actor``,
+moves it to the front of ``recent_actor_ids`` (at most
+``settings.NOTIFICATIONS_RECENT_ACTORS`` ids), bumps ``timestamp`` and adds
+one to ``actor_count`` unless the actor is already among the recent ones,
+so a user who likes, unlikes and likes again is counted once.
+
+``actor_count`` is approximate: only the recent ids are remembered, so an
+actor who drops out of them and acts again is counted a second time. It
+never undercounts, and a group would otherwise have to store every actor.
+
+Writers lock the recipients' user rows before reading the open groups. The
+group row may not exist yet, so locking it alone would let two concurrent
+first events each insert one.
+"""
+from datetime import timedelta
+
+from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.counters import lock_users
+
 from .models import Notification
 
+
+def coalesce_window() -> int:
+    return getattr(settings, 'NOTIFICATIONS_COALESCE_WINDOW', 86400)
+
+
+def recent_actors_kept() -> int:
+    return getattr(settings, 'NOTIFICATIONS_RECENT_ACTORS', 3)
+
+
+def _group_key(notification):
+    return (
+        notification.recipient_id,
+        notification.verb,
+        notification.target_content_type_id,
+        notification.target_object_id,
+    )
+
+
+def _fold(group, actor_id, now) -> None:
+    recent = group.recent_actor_ids or [group.actor_id]
+    if actor_id not in recent:
+        group.actor_count += 1
+    group.recent_actor_ids = [actor_id, *(i for i in recent if i != actor_id)][:recent_actors_kept()]
+    group.actor_id = actor_id
+    group.timestamp = now
+
+
 def create_notification(*, recipient, actor, verb: str, target=None):
     if recipient == actor:
         return None  # don't notify self actions
@@ -9,10 +63,70 @@ def create_notification(*, recipient, actor, verb: str, target=None):
     if target is not None:
         target_ct = ContentType.objects.get_for_model(target.__class__)
         target_id = target.pk
-    return Notification.objects.create(
-        recipient=recipient,
-        actor=actor,
-        verb=verb,
-        target_content_type=target_ct,
-        target_object_id=target_id,
-    )
+    rows = create_notifications([
+        Notification(
+            recipient=recipient,
+            actor=actor,
+            verb=verb,
+            target_content_type=target_ct,
+            target_object_id=target_id,
+        )
+    ])
+    return rows[0]
+
+
+def create_notifications(notifications):
+    """Record many unsaved ``Notification`` events, skipping self actions.
+
+    Takes one query to lock the recipients, one to find the open groups, one
+    to update them and one to insert the new ones, however many events there
+    are. Returns the updated
+    and created rows, one per group.
+    """
+    events = [n for n in notifications if n.recipient_id != n.actor_id]
+    if not events:
+        return []
+    for event in events:
+        event.actor_count = 1
+        event.recent_actor_ids = [event.actor_id]
+    window = coalesce_window()
+    if window <= 0:
+        return Notification.objects.bulk_create(events, batch_size=1000)
+
+    now = timezone.now()
+    recipient_ids = sorted({n.recipient_id for n in events})
+    with transaction.atomic():
+        # Serialises writers per recipient, in the same pk order as every other user lock.
+        lock_users(recipient_ids)
+        open_groups = (
+            Notification.objects.select_for_update()
+            .filter(
+                recipient_id__in=recipient_ids,
+                verb__in={n.verb for n in events},
+                target_content_type_id__in={n.target_content_type_id for n in events},
+                target_object_id__in={n.target_object_id for n in events},
+                read=False,
+                timestamp__gte=now - timedelta(seconds=window),
+            )
+            .only('pk', 'recipient_id', 'actor_id', 'verb', 'target_content_type_id', 'target_object_id',
+                  'actor_count', 'recent_actor_ids', 'timestamp')
+            .order_by('timestamp')
+        )
+        # The filter is a cross product of the batch's keys; keep exact matches, newest last.
+        groups = {_group_key(row): row for row in open_groups}
+        updated, created = {}, {}
+        for event in events:
+            key = _group_key(event)
+            group = groups.get(key)
+            if group is None:
+                groups[key] = created[key] = event
+                continue
+            _fold(group, event.actor_id, now)
+            if group.pk is not None:
+                updated[key] = group
+        if updated:
+            Notification.objects.bulk_update(
+                updated.values(), ['actor', 'actor_count', 'recent_actor_ids', 'timestamp']
+            )
+        Notification.objects.bulk_create(created.values(), batch_size=1000)
+    return [*updated.values(), *created.values()]
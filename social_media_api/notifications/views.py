@@ -1,11 +1,44 @@
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.prefetch import GenericPrefetch
 from rest_framework import generics, permissions
+from posts.models import Comment, Post
+from social_media_api.fieldsets import only_fields, requested_expansions
 from .models import Notification
 from .serializers import NotificationSerializer
 
+NOTIFICATION_COLUMNS = {
+    'id': ('id',),
+    'recipient': ('recipient__id', 'recipient__username'),
+    'actor': ('actor__id', 'actor__username'),
+    'actor_count': ('actor_count',),
+    'recent_actors': ('recent_actor_ids',),
+    'verb': ('verb',),
+    'target_type': ('target_content_type__model',),
+    'target_id': ('target_object_id',),
+    'timestamp': ('timestamp',),
+    'read': ('read',),
+}
+
+NOTIFICATION_EXPANSIONS = {
+    'target': ('target_content_type', 'target_object_id'),
+}
+
 
 class NotificationListView(generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = NotificationSerializer
 
     def get_queryset(self):
-        return Notification.objects.filter(recipient=self.request.user).order_by('read', '-timestamp')
+        queryset = (
+            Notification.objects.filter(recipient=self.request.user)
+            .select_related('recipient', 'actor', 'target_content_type')
+            .order_by('read', '-timestamp')
+        )
+        queryset = only_fields(queryset, self.request, NOTIFICATION_COLUMNS, expansions=NOTIFICATION_EXPANSIONS)
+        if 'target' in requested_expansions(self.request):
+            queryset = queryset.prefetch_related(GenericPrefetch('target', [
+                Post.objects.select_related('author'),
+                Comment.objects.all(),
+                get_user_model().objects.all(),
+            ]))
+        return queryset
@@ -0,0 +1,69 @@
+"""Denormalized ``Post.like_count`` / ``Post.comment_count`` bookkeeping.
+
+Every counter write also drops the post's cached detail payload.
+"""
+from django.db.models import Case, Count, F, IntegerField, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce
+
+from . import detail_cache
+from .models import Comment, Like, Post
+
+
+def adjust(post_id, *, likes=0, comments=0) -> None:
+    """Atomically shift a post's counters with a single ``UPDATE``."""
+    changes = {}
+    if likes:
+        changes['like_count'] = F('like_count') + likes
+    if comments:
+        changes['comment_count'] = F('comment_count') + comments
+    if changes:
+        Post.objects.filter(pk=post_id).update(**changes)
+        detail_cache.invalidate(post_id)
+
+
+def adjust_many(field, deltas) -> None:
+    """Apply ``{post_id: delta}`` to ``field`` for many posts in one ``UPDATE``."""
+    deltas = {post_id: delta for post_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    shift = Case(
+        *[When(pk=post_id, then=Value(delta)) for post_id, delta in deltas.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+    Post.objects.filter(pk__in=deltas).update(**{field: F(field) + shift})
+    detail_cache.invalidate(*deltas)
+
+
+def _actual(model):
+    rows = model.objects.filter(post=OuterRef('pk')).order_by().values('post').annotate(n=Count('pk'))
+    return Coalesce(Subquery(rows.values('n')), 0)
+
+
+def actual_like_count():
+    return _actual(Like)
+
+
+def actual_comment_count():
+    return _actual(Comment)
+
+
+def reconcile(post_ids) -> int:
+    """Repair drifted counters for ``post_ids``; returns how many posts changed.
+
+    The real counts are recomputed inside the ``UPDATE`` itself, so likes or
+    comments landing between the drift check and the write are not lost.
+    """
+    drifted = list(
+        Post.objects.filter(pk__in=post_ids)
+        .annotate(actual_likes=actual_like_count(), actual_comments=actual_comment_count())
+        .exclude(like_count=F('actual_likes'), comment_count=F('actual_comments'))
+        .values_list('pk', flat=True)
+    )
+    if drifted:
+        Post.objects.filter(pk__in=drifted).update(
+            like_count=actual_like_count(),
+            comment_count=actual_comment_count(),
+        )
+        detail_cache.invalidate(*drifted)
+    return len(drifted)
@@ -0,0 +1,148 @@
+"""Read-through cache for post detail payloads.
+
+``PostViewSet.retrieve`` serves ``PostSerializer`` output from the cache
+named by ``settings.POSTS_DETAIL_CACHE_ALIAS`` for up to
+``settings.POSTS_DETAIL_CACHE_TTL`` seconds (``0`` disables it). The alias
+must name a cache shared by every process: invalidations only reach the
+cache itself, so a per-process cache would keep serving stale posts in the
+other workers. Without an alias the cache is off. The cached payload is the
+same for everyone; ``liked_by_me`` is added per request.
+
+Entries are dropped whenever the post changes: edits and deletes through the
+``posts.signals`` handlers, likes and comments through ``posts.counters``.
+Concurrent misses for one post in a process are coalesced, so only one of
+them reads the database.
+"""
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+KEY_PREFIX = 'posts:detail:'
+
+
+def ttl() -> int:
+    return getattr(settings, 'POSTS_DETAIL_CACHE_TTL', 0)
+
+
+def alias() -> str:
+    return getattr(settings, 'POSTS_DETAIL_CACHE_ALIAS', '')
+
+
+def enabled() -> bool:
+    return ttl() > 0 and bool(alias())
+
+
+def get_cache():
+    return caches[alias()]
+
+
+def cache_key(post_id) -> str:
+    return f'{KEY_PREFIX}{post_id}'
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    """Run at most one ``fn`` per key at a time; concurrent callers share its result."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        """Return ``(value, shared)``; ``shared`` is true for callers that waited on another."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value, True
+        try:
+            call.value = fn()
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.value, False
+
+
+class DetailCache:
+    def __init__(self):
+        self._flight = SingleFlight()
+        self._stats_lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'coalesced': 0, 'invalidations': 0}
+
+    def _count(self, name, n=1):
+        with self._stats_lock:
+            self._stats[name] += n
+
+    def get_or_load(self, post_id, loader):
+        """Cached payload for ``post_id``, calling ``loader()`` on a miss.
+
+        ``loader`` may raise (e.g. ``Http404``); nothing is cached then.
+        """
+        key = cache_key(post_id)
+        payload = get_cache().get(key)
+        if payload is not None:
+            self._count('hits')
+            return payload
+
+        def load():
+            # Another flight may have filled the key while we queued for it.
+            cached = get_cache().get(key)
+            if cached is not None:
+                return cached, True
+            value = loader()
+            get_cache().set(key, value, ttl())
+            return value, False
+
+        (payload, was_cached), shared = self._flight.do(key, load)
+        if shared:
+            self._count('coalesced')
+        elif was_cached:
+            self._count('hits')
+        else:
+            self._count('misses')
+        return payload
+
+    def invalidate(self, post_ids) -> None:
+        keys = [cache_key(post_id) for post_id in post_ids]
+        if not keys or not enabled():
+            return
+        self._count('invalidations', len(keys))
+        get_cache().delete_many(keys)
+        # Delete again after commit: a reader may have cached the old row meanwhile.
+        transaction.on_commit(lambda: get_cache().delete_many(keys))
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses'] + stats['coalesced']
+        stats['hit_ratio'] = round((stats['hits'] + stats['coalesced']) / lookups, 4) if lookups else None
+        return stats
+
+    def reset_stats(self) -> None:
+        with self._stats_lock:
+            for name in self._stats:
+                self._stats[name] = 0
+
+
+detail_cache = DetailCache()
+
+
+def invalidate(*post_ids) -> None:
+    detail_cache.invalidate(post_ids)
@@ -0,0 +1,158 @@
+"""Optional write-behind buffer for likes.
+
+With ``settings.POSTS_LIKE_WRITE_BEHIND`` on, ``PostViewSet.like``/``unlike``
+only record an intent here. A background thread flushes the buffer every
+``settings.POSTS_LIKE_FLUSH_INTERVAL_MS``: repeated intents for the same
+``(user, post)`` collapse to the last one, and the survivors are written with
+one ``bulk_create``, one delete, one notification insert and one counter
+update. An interval of ``0`` disables the thread; call ``flush()``.
+Counters and notifications follow the rows a flush actually inserted and
+deleted, so likes written at the same time by other processes or by the
+direct like paths are not counted twice.
+
+The buffer is per process. Until a flush, ``like_count`` lags behind, but
+``liked_by_me`` and the like/unlike responses already reflect pending intents.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import IntegrityError, close_old_connections, transaction
+
+from notifications.models import Notification
+from notifications.utils import create_notifications
+
+from . import counters, liker_sets
+from .models import Like, Post
+
+logger = logging.getLogger(__name__)
+
+
+def enabled() -> bool:
+    return getattr(settings, 'POSTS_LIKE_WRITE_BEHIND', False)
+
+
+def insert_likes(pairs) -> set:
+    """Insert ``(user_id, post_id)`` likes; returns the pairs whose row this call created."""
+    try:
+        with transaction.atomic():
+            Like.objects.bulk_create([Like(user_id=user_id, post_id=post_id) for user_id, post_id in pairs],
+                                     batch_size=1000)
+        return set(pairs)
+    except IntegrityError:
+        # Someone else liked one of them first; find out which, row by row.
+        return {
+            (user_id, post_id) for user_id, post_id in pairs
+            if Like.objects.get_or_create(user_id=user_id, post_id=post_id)[1]
+        }
+
+
+class LikeBuffer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = {}  # (user_id, post_id) -> True for like, False for unlike
+        self._worker = None
+
+    def record(self, user_id, post_id, liked: bool) -> None:
+        with self._lock:
+            self._pending[(user_id, post_id)] = liked
+        self._ensure_worker()
+
+    def pending_for(self, user_id, post_ids) -> dict:
+        """Buffered intents of ``user_id`` for ``post_ids``, as ``{post_id: liked}``."""
+        with self._lock:
+            return {
+                post_id: self._pending[(user_id, post_id)]
+                for post_id in post_ids
+                if (user_id, post_id) in self._pending
+            }
+
+    def __len__(self):
+        return len(self._pending)
+
+    def flush(self) -> None:
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return
+            try:
+                self._apply(batch)
+            except Exception:
+                # Put the intents back unless newer ones arrived meanwhile.
+                with self._lock:
+                    for key, liked in batch.items():
+                        self._pending.setdefault(key, liked)
+                raise
+
+    def _apply(self, batch) -> None:
+        liked_posts = {post_id for (_, post_id), liked in batch.items() if liked}
+        with transaction.atomic():
+            # Locked, so a concurrent unlike cannot delete them under us.
+            rows = Like.objects.select_for_update().filter(
+                user_id__in={user_id for user_id, _ in batch},
+                post_id__in={post_id for _, post_id in batch},
+            ).values_list('pk', 'user_id', 'post_id')
+            existing = {(user_id, post_id): pk for pk, user_id, post_id in rows if (user_id, post_id) in batch}
+            authors = dict(Post.objects.filter(pk__in=liked_posts).values_list('pk', 'author_id'))
+            # Posts deleted since the intent was recorded are dropped here.
+            to_like = [key for key, liked in batch.items() if liked and key not in existing and key[1] in authors]
+            to_unlike = [key for key, liked in batch.items() if not liked and key in existing]
+
+            liked = insert_likes(to_like) if to_like else set()
+            deleted = 0
+            if to_unlike:
+                deleted, _ = Like.objects.filter(pk__in=[existing[key] for key in to_unlike]).delete()
+            deltas = Counter(post_id for _, post_id in liked)
+            deltas.subtract(post_id for _, post_id in to_unlike)
+            counters.adjust_many('like_count', deltas)
+            if deleted != len(to_unlike):
+                # Only where SELECT ... FOR UPDATE is a no-op: someone else deleted some first.
+                counters.reconcile({post_id for _, post_id in to_unlike})
+            liker_sets.record(
+                [(post_id, user_id, True) for user_id, post_id in liked]
+                + [(post_id, user_id, False) for user_id, post_id in to_unlike]
+            )
+
+        if liked:
+            ct = ContentType.objects.get_for_model(Post)
+            create_notifications(
+                Notification(
+                    recipient_id=authors[post_id],
+                    actor_id=user_id,
+                    verb='liked your post',
+                    target_content_type=ct,
+                    target_object_id=post_id,
+                )
+                for user_id, post_id in liked
+            )
+
+    def _ensure_worker(self) -> None:
+        interval = getattr(settings, 'POSTS_LIKE_FLUSH_INTERVAL_MS', 250)
+        if not interval or (self._worker and self._worker.is_alive()):
+            return
+        with self._lock:
+            if self._worker and self._worker.is_alive():
+                return
+            self._worker = threading.Thread(
+                target=self._run, args=(interval / 1000,), name='like-buffer', daemon=True
+            )
+            self._worker.start()
+
+    def _run(self, interval) -> None:
+        while True:
+            time.sleep(interval)
+            try:
+                close_old_connections()
+                self.flush()
+            except Exception:
+                logger.exception("Flushing the like buffer failed")
+
+
+like_buffer = LikeBuffer()
+atexit.register(like_buffer.flush)
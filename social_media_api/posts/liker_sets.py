@@ -0,0 +1,200 @@
+"""Compact in-memory sets of the users who liked hot posts.
+
+Each set is a sorted ``array('Q')`` of user ids (8 bytes per like, wide
+enough for ``BigAutoField`` ids), so membership is a binary search, counts
+are ``len()`` and intersections walk the smaller set. Sets are built from ``Like`` on first use and kept in an LRU
+capped at ``settings.POSTS_LIKER_SETS_MAX_BYTES`` (``0`` disables them).
+
+Likes written by this process (``like``/``unlike``, batches, buffer flushes)
+update resident sets once their transaction commits. Sets are per process,
+so each one is rebuilt after ``settings.POSTS_LIKER_SETS_TTL`` seconds to pick
+up likes written elsewhere.
+"""
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+
+from .models import Like
+
+ENTRY_OVERHEAD = 64  # bookkeeping bytes charged per cached set
+
+
+def max_bytes() -> int:
+    return getattr(settings, 'POSTS_LIKER_SETS_MAX_BYTES', 0)
+
+
+def enabled() -> bool:
+    return max_bytes() > 0
+
+
+def ttl() -> float:
+    return getattr(settings, 'POSTS_LIKER_SETS_TTL', 30)
+
+
+class LikerSet:
+    """Sorted, duplicate-free user ids."""
+    __slots__ = ('ids',)
+
+    def __init__(self, ids=()):
+        self.ids = array('Q', ids)
+
+    def __contains__(self, user_id):
+        ids = self.ids
+        index = bisect_left(ids, user_id)
+        return index < len(ids) and ids[index] == user_id
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    @property
+    def nbytes(self) -> int:
+        return sys.getsizeof(self.ids) + ENTRY_OVERHEAD
+
+    def add(self, user_id) -> None:
+        index = bisect_left(self.ids, user_id)
+        if index == len(self.ids) or self.ids[index] != user_id:
+            self.ids.insert(index, user_id)
+
+    def discard(self, user_id) -> None:
+        index = bisect_left(self.ids, user_id)
+        if index < len(self.ids) and self.ids[index] == user_id:
+            del self.ids[index]
+
+    def intersection(self, other) -> 'LikerSet':
+        small, large = sorted((self, other), key=len)
+        return LikerSet(user_id for user_id in small.ids if user_id in large)
+
+
+class LikerSetCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # post_id -> (LikerSet, loaded_at)
+        self._bytes = 0
+        self._loading = {}  # post_id -> True once a write raced the load
+
+    def get(self, post_id) -> LikerSet:
+        """The liker set of ``post_id``, loading it on a miss."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(post_id)
+            if entry is not None and now - entry[1] < ttl():
+                self._entries.move_to_end(post_id)
+                return entry[0]
+            self._loading.setdefault(post_id, False)
+        likers = LikerSet(
+            Like.objects.filter(post_id=post_id).order_by('user_id').values_list('user_id', flat=True)
+        )
+        with self._lock:
+            stale = self._loading.pop(post_id, True)
+            if not stale:
+                self._store(post_id, likers, now)
+        return likers
+
+    def resident(self, post_ids) -> dict:
+        """Fresh cached sets among ``post_ids``, without loading the others."""
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            for post_id in post_ids:
+                entry = self._entries.get(post_id)
+                if entry is not None and now - entry[1] < ttl():
+                    self._entries.move_to_end(post_id)
+                    found[post_id] = entry[0]
+        return found
+
+    def _store(self, post_id, likers, loaded_at) -> None:
+        self._drop(post_id)
+        if likers.nbytes > max_bytes():
+            return
+        self._entries[post_id] = (likers, loaded_at)
+        self._bytes += likers.nbytes
+        while self._bytes > max_bytes():
+            _, (evicted, _) = self._entries.popitem(last=False)
+            self._bytes -= evicted.nbytes
+
+    def _drop(self, post_id) -> None:
+        entry = self._entries.pop(post_id, None)
+        if entry is not None:
+            self._bytes -= entry[0].nbytes
+
+    def apply(self, changes) -> None:
+        """Apply committed ``(post_id, user_id, liked)`` changes to resident sets."""
+        with self._lock:
+            for post_id, user_id, liked in changes:
+                if post_id in self._loading:
+                    self._loading[post_id] = True
+                entry = self._entries.get(post_id)
+                if entry is None:
+                    continue
+                likers = entry[0]
+                self._bytes -= likers.nbytes
+                (likers.add if liked else likers.discard)(user_id)
+                self._bytes += likers.nbytes
+            while self._bytes > max_bytes() and self._entries:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+
+    def invalidate(self, post_ids) -> None:
+        with self._lock:
+            for post_id in post_ids:
+                self._drop(post_id)
+                if post_id in self._loading:
+                    self._loading[post_id] = True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'posts': len(self._entries), 'bytes': self._bytes, 'max_bytes': max_bytes()}
+
+
+liker_sets = LikerSetCache()
+
+
+def record(changes) -> None:
+    """Queue ``(post_id, user_id, liked)`` changes for when the current transaction commits."""
+    changes = list(changes)
+    if changes and enabled():
+        transaction.on_commit(lambda: liker_sets.apply(changes))
+
+
+def has_liked(post_id, user_id) -> bool:
+    if enabled():
+        return user_id in liker_sets.get(post_id)
+    return Like.objects.filter(post_id=post_id, user_id=user_id).exists()
+
+
+def likers_of_all(post_ids) -> LikerSet:
+    """Users who liked every post in ``post_ids``."""
+    post_ids = list(dict.fromkeys(post_ids))
+    if not post_ids:
+        return LikerSet()
+    if not enabled():
+        return LikerSet(
+            Like.objects.filter(post_id__in=post_ids)
+            .values('user_id')
+            .annotate(liked=Count('post_id'))
+            .filter(liked=len(post_ids))
+            .order_by('user_id')
+            .values_list('user_id', flat=True)
+        )
+    sets = sorted((liker_sets.get(post_id) for post_id in post_ids), key=len)
+    common = sets[0]
+    for likers in sets[1:]:
+        if not common:
+            break
+        common = common.intersection(likers)
+    return common
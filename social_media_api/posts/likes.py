@@ -0,0 +1,97 @@
+"""Applying many like/unlike operations for one user at once."""
+from collections import Counter
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+
+from notifications.models import Notification
+from notifications.utils import create_notifications
+
+from . import counters, liker_sets
+from .like_buffer import insert_likes, like_buffer, enabled as like_buffer_enabled
+from .models import Like, Post
+
+RESULTS = {
+    ('like', False): 'liked',
+    ('like', True): 'already_liked',
+    ('unlike', True): 'unliked',
+    ('unlike', False): 'not_liked',
+}
+
+
+def _plan(operations, authors, initial):
+    """Walk the operations from ``initial``; returns ``(results, final liked set)``."""
+    state = set(initial)
+    results = []
+    for op in operations:
+        post_id, action = op['post'], op['action']
+        if post_id not in authors:
+            status = 'not_found'
+        else:
+            status = RESULTS[(action, post_id in state)]
+            (state.add if action == 'like' else state.discard)(post_id)
+        results.append({'post': post_id, 'action': action, 'status': status})
+    return results, state
+
+
+def _insert_likes(user, post_ids) -> set:
+    """Insert likes of ``post_ids``; returns the posts whose row this call created."""
+    return {post_id for _, post_id in insert_likes([(user.pk, post_id) for post_id in post_ids])}
+
+
+def apply_like_batch(user, operations):
+    """Apply ``[{'post': id, 'action': 'like'|'unlike'}, ...]`` in order.
+
+    Returns one ``{'post', 'action', 'status'}`` result per operation. Only
+    the net change per post is written: one ``bulk_create``, one delete, one
+    counter update and one notification insert, all in a single transaction.
+    Counters and notifications follow the rows actually inserted and deleted,
+    so likes written concurrently by other requests are not counted twice.
+    """
+    post_ids = {op['post'] for op in operations}
+    authors = dict(Post.objects.filter(pk__in=post_ids).values_list('pk', 'author_id'))
+    if like_buffer_enabled():
+        initial = set(Like.objects.filter(user=user, post_id__in=authors).values_list('post_id', flat=True))
+        for post_id, pending in like_buffer.pending_for(user.pk, authors).items():
+            (initial.add if pending else initial.discard)(post_id)
+        results, state = _plan(operations, authors, initial)
+        for post_id in state - initial:
+            like_buffer.record(user.pk, post_id, True)
+        for post_id in initial - state:
+            like_buffer.record(user.pk, post_id, False)
+        return results
+
+    with transaction.atomic():
+        # Locked, so a concurrent unlike cannot delete them under us.
+        existing = dict(
+            Like.objects.select_for_update().filter(user=user, post_id__in=authors).values_list('post_id', 'pk')
+        )
+        results, state = _plan(operations, authors, existing)
+        liked = _insert_likes(user, state - existing.keys()) if state - existing.keys() else set()
+        unliked = existing.keys() - state
+        deleted = 0
+        if unliked:
+            deleted, _ = Like.objects.filter(pk__in=[existing[post_id] for post_id in unliked]).delete()
+        deltas = Counter({post_id: 1 for post_id in liked})
+        deltas.subtract({post_id: 1 for post_id in unliked})
+        counters.adjust_many('like_count', deltas)
+        if deleted != len(unliked):
+            # Only where SELECT ... FOR UPDATE is a no-op: someone else deleted some first.
+            counters.reconcile(unliked)
+        liker_sets.record(
+            [(post_id, user.pk, True) for post_id in liked]
+            + [(post_id, user.pk, False) for post_id in unliked]
+        )
+        if liked:
+            ct = ContentType.objects.get_for_model(Post)
+            create_notifications(
+                Notification(
+                    recipient_id=authors[post_id],
+                    actor=user,
+                    verb='liked your post',
+                    target_content_type=ct,
+                    target_object_id=post_id,
+                )
+                for post_id in liked
+            )
+    return results
@@ -0,0 +1,88 @@
+import random
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from accounts import counters
+from posts.models import Post, TimelineEntry
+from posts.timeline import PULL_AUTHORS_CACHE_KEY
+from posts.views import FeedView
+from social_media_api.bench import scratch_database, summarize, timed
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark post-creation and feed latency with pure fan-out versus the "
+        "hybrid push/pull feed. Runs against a throwaway test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=200)
+        parser.add_argument('--authors', type=int, default=50)
+        parser.add_argument('--follows-per-reader', type=int, default=10)
+        parser.add_argument('--celebrity-followers', type=int, default=5000)
+        parser.add_argument('--posts', type=int, default=200, help="Posts written per author kind.")
+        parser.add_argument('--reads', type=int, default=300)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            self.populate(options)
+            threshold = options['celebrity_followers']
+            for label, max_followers in (('push', 0), ('hybrid', threshold)):
+                with override_settings(FEED_FANOUT_MAX_FOLLOWERS=max_followers):
+                    cache.delete(PULL_AUTHORS_CACHE_KEY)
+                    self.run_mode(label, options)
+
+    def populate(self, options):
+        User = get_user_model()
+        rng = random.Random(options['seed'])
+        total = options['readers'] + options['authors'] + options['celebrity_followers'] + 1
+        User.objects.bulk_create(
+            [User(username=f"bench{i}", password='!') for i in range(total)], batch_size=1000
+        )
+        users = list(User.objects.order_by('pk').values_list('pk', flat=True))
+        self.celebrity = users[0]
+        self.authors = users[1:options['authors'] + 1]
+        self.readers = users[options['authors'] + 1:options['authors'] + 1 + options['readers']]
+        fans = users[options['authors'] + 1:]
+
+        Follow = User.followers.through
+        rows = {(self.celebrity, fan) for fan in fans[:options['celebrity_followers']]}
+        for reader in self.readers:
+            for author in rng.sample(self.authors, min(options['follows_per_reader'], len(self.authors))):
+                rows.add((author, reader))
+        Follow.objects.bulk_create(
+            [Follow(from_user_id=author, to_user_id=follower) for author, follower in rows], batch_size=5000
+        )
+        # bulk_create skips m2m_changed; hybrid mode picks pulled authors by followers_count.
+        counters.reconcile(users)
+        self.reader_users = list(User.objects.filter(pk__in=self.readers))
+        self.rng = rng
+
+    def run_mode(self, label, options):
+        Post.objects.all().delete()
+        TimelineEntry.objects.all().delete()
+
+        writes = {'regular': [], 'celebrity': []}
+        for i in range(options['posts']):
+            for kind, author_id in (('regular', self.rng.choice(self.authors)), ('celebrity', self.celebrity)):
+                with timed(writes[kind]):
+                    Post.objects.create(author_id=author_id, title=f"{kind} {i}", content="bench")
+
+        factory = APIRequestFactory()
+        view = FeedView.as_view()
+        reads = []
+        for _ in range(options['reads']):
+            request = factory.get('/api/feed/')
+            force_authenticate(request, user=self.rng.choice(self.reader_users))
+            with timed(reads):
+                view(request).render()
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f"{label} mode"))
+        self.stdout.write(f"  create post, regular author    {summarize(writes['regular'])}")
+        self.stdout.write(f"  create post, celebrity author  {summarize(writes['celebrity'])}")
+        self.stdout.write(f"  GET /api/feed/                 {summarize(reads)}")
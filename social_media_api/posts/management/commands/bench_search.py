@@ -0,0 +1,70 @@
+import random
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.search import SEARCH_ORDERING, SubstringBackend, get_backend
+from social_media_api.bench import scratch_database, summarize, timed
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the full-text search backend against the icontains scan "
+        "on synthetic posts. Runs against a throwaway test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1_000_000)
+        parser.add_argument('--vocabulary', type=int, default=20_000)
+        parser.add_argument('--queries', type=int, default=50)
+        parser.add_argument('--page-size', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        words = [f"w{i:05d}x" for i in range(options['vocabulary'])]
+        # Zipf-like weights so some terms are common and most are rare.
+        weights = [1 / (rank + 1) for rank in range(len(words))]
+
+        with scratch_database():
+            self.populate(rng, words, weights, options['posts'])
+            backend = get_backend()
+            self.stdout.write(f"Indexing {options['posts']} posts with {type(backend).__name__}...")
+            backend.rebuild()
+
+            bands = {
+                'common term': words[:10],
+                'rare term': words[-1000:],
+                'two terms': [f"{a} {b}" for a, b in zip(words[:50], words[50:100])],
+            }
+            posts = Post.objects.select_related('author')
+            page = options['page_size']
+            for label, candidates in bands.items():
+                substring, fulltext = [], []
+                for _ in range(options['queries']):
+                    query = rng.choice(candidates)
+                    with timed(substring):
+                        list(SubstringBackend().search(posts, query).order_by('-created_at', '-id')[:page])
+                    with timed(fulltext):
+                        list(backend.search(posts, query).order_by(*SEARCH_ORDERING)[:page])
+                self.stdout.write(self.style.MIGRATE_HEADING(label))
+                self.stdout.write(f"  icontains  {summarize(substring)}")
+                self.stdout.write(f"  full-text  {summarize(fulltext)}")
+
+    def populate(self, rng, words, weights, total):
+        User = get_user_model()
+        User.objects.bulk_create([User(username=f"bench{i}", password='!') for i in range(100)])
+        authors = list(User.objects.values_list('pk', flat=True))
+        self.stdout.write(f"Creating {total} posts...")
+        batch = []
+        for i in range(total):
+            batch.append(Post(
+                author_id=rng.choice(authors),
+                title=' '.join(rng.choices(words, weights, k=4)),
+                content=' '.join(rng.choices(words, weights, k=30)),
+            ))
+            if len(batch) == 5000:
+                Post.objects.bulk_create(batch)
+                batch = []
+        Post.objects.bulk_create(batch)
@@ -0,0 +1,76 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from posts.models import Post
+from posts.serializers import PostRowSerializer, PostSerializer
+from posts.views import FeedView, PostViewSet
+from social_media_api.bench import scratch_database, summarize, timed
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark PostSerializer against the PostRowSerializer fast path, for bare "
+        "serialization and for the list endpoints. Runs against a throwaway test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=2000)
+        parser.add_argument('--page-sizes', type=int, nargs='+', default=[10, 50, 100])
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            User = get_user_model()
+            author = User.objects.create(username='author', password='!')
+            reader = User.objects.create(username='reader', password='!')
+            reader.following.add(author)
+            for i in range(options['posts']):
+                Post.objects.create(author=author, title=f"Post {i}", content="lorem ipsum " * 20)
+
+            factory = APIRequestFactory()
+            request = factory.get('/')
+            force_authenticate(request, user=reader)
+            renderer = JSONRenderer()
+            for size in options['page_sizes']:
+                self.stdout.write(self.style.MIGRATE_HEADING(f"page size {size}"))
+                self.bench_serializers(request, reader, size, options['repeat'], renderer)
+                self.bench_views(factory, reader, size, options['repeat'])
+
+    def bench_serializers(self, request, reader, size, repeat, renderer):
+        posts = list(Post.objects.select_related('author').order_by('-created_at', '-id')[:size])
+        rows = list(
+            Post.objects.order_by('-created_at', '-id').values(*PostRowSerializer.fields)[:size]
+        )
+        context = {'request': Request(request)}
+        slow, fast = [], []
+        for _ in range(repeat):
+            with timed(slow):
+                slow_json = renderer.render(PostSerializer(posts, many=True, context=context).data)
+            with timed(fast):
+                fast_json = renderer.render(PostRowSerializer(rows, context=context).data)
+        if slow_json != fast_json:
+            raise CommandError("PostRowSerializer output differs from PostSerializer")
+        self.stdout.write(f"  serialize+render  PostSerializer     {summarize(slow)}")
+        self.stdout.write(f"  serialize+render  PostRowSerializer  {summarize(fast)}")
+
+    def bench_views(self, factory, reader, size, repeat):
+        views = {
+            'GET /api/posts/': PostViewSet.as_view({'get': 'list'}),
+            'GET /api/feed/': FeedView.as_view(),
+        }
+        for label, view in views.items():
+            samples = {}
+            for mode in (False, True):
+                samples[mode] = []
+                with override_settings(POSTS_FAST_LIST_SERIALIZATION=mode):
+                    for _ in range(repeat):
+                        request = factory.get('/', {'page_size': size})
+                        force_authenticate(request, user=reader)
+                        with timed(samples[mode]):
+                            view(request).render()
+            self.stdout.write(f"  {label:<16}  full serializer    {summarize(samples[False])}")
+            self.stdout.write(f"  {label:<16}  fast path          {summarize(samples[True])}")
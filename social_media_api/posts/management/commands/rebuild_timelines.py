@@ -0,0 +1,21 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from posts.timeline import rebuild_timeline
+
+
+class Command(BaseCommand):
+    help = "Rebuild materialized feed timelines from the follow graph."
+
+    def add_arguments(self, parser):
+        parser.add_argument('user_ids', nargs='*', type=int, help="Only rebuild these users (default: everyone).")
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.order_by('pk')
+        if options['user_ids']:
+            users = users.filter(pk__in=options['user_ids'])
+        count = 0
+        for user in users.iterator(chunk_size=500):
+            rebuild_timeline(user)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} timeline(s)."))
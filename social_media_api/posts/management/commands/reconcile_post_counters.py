@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import reconcile
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute Post.like_count and Post.comment_count in primary-key batches. "
+        "Each batch is its own short statement, so the table is never locked as a whole."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_pk, checked, repaired = 0, 0, 0
+        while True:
+            ids = list(
+                Post.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            last_pk = ids[-1]
+            checked += len(ids)
+            repaired += reconcile(ids)
+        self.stdout.write(self.style.SUCCESS(f"Checked {checked} post(s), repaired {repaired}."))
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.3 on 2026-10-18 05:10
+
+import django.db.models.deletion
+import posts.models
+from django.db import migrations, models
+
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE posts_post_fts USING fts5(title, content, author, tokenize='unicode61 remove_diacritics 2')",
+    "INSERT INTO posts_post_fts(rowid, title, content, author) "
+    "SELECT p.id, p.title, p.content, u.username FROM posts_post p JOIN accounts_user u ON u.id = p.author_id",
+]
+SQLITE_BACKWARD = ["DROP TABLE IF EXISTS posts_post_fts"]
+
+POSTGRES_FORWARD = [
+    "ALTER TABLE posts_post ADD COLUMN search_vector tsvector",
+    "UPDATE posts_post p SET search_vector = "
+    "setweight(to_tsvector('english', coalesce(p.title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(p.content, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(u.username, '')), 'C') "
+    "FROM accounts_user u WHERE u.id = p.author_id",
+    "CREATE INDEX posts_post_search_gin ON posts_post USING GIN (search_vector)",
+]
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS posts_post_search_gin",
+    "ALTER TABLE posts_post DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def run_for_vendor(sqlite, postgres):
+    def run(apps, schema_editor):
+        statements = {'sqlite': sqlite, 'postgresql': postgres}.get(schema_editor.connection.vendor, [])
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0006_post_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostSearchEntry',
+            fields=[
+                ('post', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_entry', serialize=False, to='posts.post')),
+                ('document', posts.models.FullTextColumn(db_column='posts_post_fts')),
+            ],
+            options={
+                'db_table': 'posts_post_fts',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(
+            run_for_vendor(SQLITE_FORWARD, POSTGRES_FORWARD),
+            run_for_vendor(SQLITE_BACKWARD, POSTGRES_BACKWARD),
+        ),
+    ]
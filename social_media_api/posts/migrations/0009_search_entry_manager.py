@@ -0,0 +1,17 @@
+# Generated by Django 5.2.3 on 2026-10-18 07:16
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0008_comment_post_recent_idx'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='postsearchentry',
+            options={'base_manager_name': 'objects', 'managed': False},
+        ),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import connections, models
 from django.conf import settings
 
 # Create your models here.
@@ -9,9 +9,16 @@ class Post(models.Model):
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Denormalized counters, updated with F() expressions; see reconcile_post_counters
+    like_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='post_recent_idx'),
+            models.Index(fields=['author', '-created_at', '-id'], name='post_author_recent_idx'),
+        ]
 
     def __str__(self) -> str:
         return f"{self.title} by {self.author.username}"
@@ -26,6 +33,10 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='comment_recent_idx'),
+            models.Index(fields=['post', 'created_at', 'id'], name='comment_post_recent_idx'),
+        ]
 
     def __str__(self) -> str:
         return f"Comment by {self.author.username} on {self.post_id}"
@@ -42,3 +53,72 @@ class Like(models.Model):
 
     def __str__(self) -> str:
         return f"{self.user.username} likes Post {self.post_id}"
+
+
+class TimelineEntry(models.Model):
+    """Materialized feed row: ``post`` shows up in ``owner``'s feed.
+
+    ``created_at`` is copied from the post so a feed page is a single range
+    scan over ``(owner, created_at, post)`` without touching the post table.
+    """
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='timeline_entries')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='timeline_entries')
+    created_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('owner', 'post')
+        ordering = ['-created_at', '-post_id']
+        indexes = [
+            models.Index(fields=['owner', '-created_at', '-post'], name='timeline_owner_recent_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return f"Post {self.post_id} in timeline of {self.owner_id}"
+
+
+class FullTextMatch(models.Lookup):
+    """``<column> MATCH <query>`` for SQLite FTS5 columns."""
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} MATCH {rhs}", [*lhs_params, *rhs_params]
+
+
+class FullTextColumn(models.TextField):
+    pass
+
+
+FullTextColumn.register_lookup(FullTextMatch)
+
+
+class PostSearchEntryManager(models.Manager):
+    """Empty except on SQLite, the only database the FTS5 table is created on."""
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if connections[self.db].vendor != 'sqlite':
+            return queryset.none()
+        return queryset
+
+
+class PostSearchEntry(models.Model):
+    """A post's row in the SQLite FTS5 index ``posts_post_fts``.
+
+    The virtual table is created by a migration and kept in sync by
+    ``posts.search``; Django only uses this model to join matches onto posts.
+    Elsewhere there is no table, and the manager returns no rows.
+    """
+    post = models.OneToOneField(
+        Post, primary_key=True, db_column='rowid', on_delete=models.DO_NOTHING, related_name='search_entry'
+    )
+    # FTS5 exposes a hidden column named after the table for whole-row MATCH queries
+    document = FullTextColumn(db_column='posts_post_fts')
+
+    objects = PostSearchEntryManager()
+
+    class Meta:
+        managed = False
+        db_table = 'posts_post_fts'
+        base_manager_name = 'objects'
@@ -0,0 +1,174 @@
+"""Keyset (seek) pagination on ``(created_at, id)``.
+
+Pages are selected with a ``WHERE (created_at, id) < (...)`` range condition
+instead of an offset, so page 10,000 costs the same as page 1 as long as the
+ordering is backed by a composite index. Cursors are opaque and signed.
+"""
+from datetime import datetime
+
+from django.core import signing
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def keyset_filter(ordering, position, forward=True) -> Q:
+    """Rows strictly after ``position`` when walking ``ordering`` (or before it if not ``forward``)."""
+    condition = Q()
+    for index, field in enumerate(ordering):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') == forward else 'gt'
+        term = Q(**{f'{name}__{lookup}': position[index]})
+        for previous, value in zip(ordering[:index], position[:index]):
+            term &= Q(**{previous.lstrip('-'): value})
+        condition |= term
+    return condition
+
+
+def keyset_order(ordering, forward=True):
+    if forward:
+        return list(ordering)
+    return [field[1:] if field.startswith('-') else f'-{field}' for field in ordering]
+
+
+class KeysetPagination(BasePagination):
+    """Cursor pagination over ``ordering`` with ``since``/``until`` polling.
+
+    ``?cursor=`` follows the ``next``/``previous`` links. ``?since=`` and
+    ``?until=`` take any cursor and return the page just newer or just older
+    than its position, so polling clients can keep asking for what is new.
+
+    Querysets are paginated directly. Other sources (e.g. the merged feed)
+    provide ``keyset_page(position, forward, limit)`` returning up to
+    ``limit`` rows nearest to ``position`` in walking order.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    since_query_param = 'since'
+    until_query_param = 'until'
+    signing_salt = 'posts.pagination.cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        for param in (self.since_query_param, self.until_query_param):
+            self.base_url = remove_query_param(self.base_url, param)
+        page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(view)
+        self.position, self.forward = self.decode_request(request)
+
+        if hasattr(queryset, 'keyset_page'):
+            rows = list(queryset.keyset_page(self.position, self.forward, page_size + 1))
+        else:
+            if self.position is not None:
+                queryset = queryset.filter(keyset_filter(self.ordering, self.position, self.forward))
+            rows = list(queryset.order_by(*keyset_order(self.ordering, self.forward))[:page_size + 1])
+
+        self.has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if not self.forward:
+            rows.reverse()
+        self.page = rows
+        return rows
+
+    def get_ordering(self, view):
+        """Views may change the walk order per request with ``get_keyset_ordering(default)``."""
+        if view is not None and hasattr(view, 'get_keyset_ordering'):
+            return tuple(view.get_keyset_ordering(self.ordering))
+        return self.ordering
+
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                return _positive_int(
+                    request.query_params[self.page_size_query_param],
+                    strict=True,
+                    cutoff=self.max_page_size,
+                )
+            except (KeyError, ValueError):
+                pass
+        return self.page_size
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_next_link(self):
+        if self.page:
+            if self.forward and not self.has_more:
+                return None
+            return self.link_for(self.position_of(self.page[-1]), forward=True)
+        if not self.forward and self.position is not None:
+            return self.link_for(self.position, forward=True)
+        return None
+
+    def get_previous_link(self):
+        # Always offered when there is an anchor, so clients can poll for newer rows.
+        if self.page:
+            return self.link_for(self.position_of(self.page[0]), forward=False)
+        if self.position is not None:
+            return self.link_for(self.position, forward=False)
+        return None
+
+    def link_for(self, position, forward):
+        return replace_query_param(self.base_url, self.cursor_query_param, self.encode_cursor(position, forward))
+
+    def position_of(self, row):
+        values = []
+        for field in self.ordering:
+            name = field.lstrip('-')
+            value = row[name] if isinstance(row, dict) else getattr(row, name)
+            values.append(value.isoformat() if isinstance(value, datetime) else value)
+        return values
+
+    def encode_cursor(self, position, forward):
+        return signing.dumps({'p': list(position), 'f': forward}, salt=self.signing_salt, compress=True)
+
+    def decode_cursor(self, token):
+        try:
+            payload = signing.loads(token, salt=self.signing_salt)
+            position, forward = payload['p'], bool(payload['f'])
+        except (signing.BadSignature, KeyError, TypeError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return position, forward
+
+    def decode_request(self, request):
+        """Return ``(position, forward)`` for the request; ``(None, True)`` means the first page."""
+        newest_first = self.ordering[0].startswith('-')
+        params = request.query_params
+        if self.since_query_param in params:
+            position, _ = self.decode_cursor(params[self.since_query_param])
+            return position, not newest_first
+        if self.until_query_param in params:
+            position, _ = self.decode_cursor(params[self.until_query_param])
+            return position, newest_first
+        if self.cursor_query_param in params:
+            return self.decode_cursor(params[self.cursor_query_param])
+        return None, True
+
+
+class OldestFirstPagination(KeysetPagination):
+    ordering = ('created_at', 'id')
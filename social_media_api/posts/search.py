@@ -0,0 +1,156 @@
+"""Pluggable full-text search over posts.
+
+``settings.POSTS_SEARCH_BACKEND`` names a backend class; by default one is
+picked from the database vendor: an FTS5 virtual table on SQLite, a weighted
+``tsvector`` column with a GIN index on Postgres, and the plain
+``icontains`` scan everywhere else. Every backend indexes title, content and
+author username, and annotates matches with ``search_rank`` (higher is better).
+
+Indexes are kept in sync by the ``post_save``/``post_delete`` handlers in
+``posts.signals``, which also reindex an author's posts when their username
+changes; bulk writers send ``posts_bulk_created`` and
+``rebuild_search_index`` rebuilds everything.
+"""
+from django.conf import settings
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+from rest_framework import filters
+from rest_framework.settings import api_settings
+
+CHUNK_SIZE = 500
+SEARCH_ORDERING = ('-search_rank', '-id')
+
+
+def _chunks(ids):
+    ids = list(ids)
+    for start in range(0, len(ids), CHUNK_SIZE):
+        yield ids[start:start + CHUNK_SIZE]
+
+
+def search_query(request) -> str:
+    return request.query_params.get(api_settings.SEARCH_PARAM, '').strip()
+
+
+class SubstringBackend:
+    """The original ``SearchFilter`` behaviour: unranked ``icontains`` scans."""
+    fields = ('title', 'content', 'author__username')
+
+    def search(self, queryset, query):
+        for term in query.split():
+            condition = Q()
+            for field in self.fields:
+                condition |= Q(**{f'{field}__icontains': term})
+            queryset = queryset.filter(condition)
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+    def index_posts(self, post_ids):
+        pass
+
+    def unindex_posts(self, post_ids):
+        pass
+
+    def rebuild(self):
+        pass
+
+
+class SQLiteFTS5Backend(SubstringBackend):
+    table = 'posts_post_fts'
+
+    @staticmethod
+    def fts_query(query):
+        # Quote every term so user input cannot inject FTS5 query syntax.
+        return ' '.join('"{}"'.format(term.replace('"', '""')) for term in query.split())
+
+    def search(self, queryset, query):
+        return queryset.filter(search_entry__document__match=self.fts_query(query)).annotate(
+            search_rank=RawSQL(f'-bm25("{self.table}")', (), output_field=FloatField())
+        )
+
+    def index_posts(self, post_ids):
+        with connection.cursor() as cursor:
+            for chunk in _chunks(post_ids):
+                marks = ', '.join(['%s'] * len(chunk))
+                cursor.execute(f"DELETE FROM {self.table} WHERE rowid IN ({marks})", chunk)
+                cursor.execute(
+                    f"INSERT INTO {self.table}(rowid, title, content, author) "
+                    f"SELECT p.id, p.title, p.content, u.username FROM posts_post p "
+                    f"JOIN accounts_user u ON u.id = p.author_id WHERE p.id IN ({marks})",
+                    chunk,
+                )
+
+    def unindex_posts(self, post_ids):
+        with connection.cursor() as cursor:
+            for chunk in _chunks(post_ids):
+                marks = ', '.join(['%s'] * len(chunk))
+                cursor.execute(f"DELETE FROM {self.table} WHERE rowid IN ({marks})", chunk)
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table}")
+            cursor.execute(
+                f"INSERT INTO {self.table}(rowid, title, content, author) "
+                f"SELECT p.id, p.title, p.content, u.username FROM posts_post p "
+                f"JOIN accounts_user u ON u.id = p.author_id"
+            )
+
+
+class PostgresBackend(SubstringBackend):
+    tsquery = "websearch_to_tsquery('english', %s)"
+    update_sql = (
+        "UPDATE posts_post p SET search_vector = "
+        "setweight(to_tsvector('english', coalesce(p.title, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(p.content, '')), 'B') || "
+        "setweight(to_tsvector('simple', coalesce(u.username, '')), 'C') "
+        "FROM accounts_user u WHERE u.id = p.author_id"
+    )
+
+    def search(self, queryset, query):
+        return queryset.filter(
+            RawSQL(f'"posts_post"."search_vector" @@ {self.tsquery}', (query,), output_field=BooleanField())
+        ).annotate(
+            search_rank=RawSQL(
+                f'ts_rank("posts_post"."search_vector", {self.tsquery})', (query,), output_field=FloatField()
+            )
+        )
+
+    def index_posts(self, post_ids):
+        with connection.cursor() as cursor:
+            for chunk in _chunks(post_ids):
+                cursor.execute(f"{self.update_sql} AND p.id = ANY(%s)", [chunk])
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(self.update_sql)
+
+
+VENDOR_BACKENDS = {
+    'sqlite': SQLiteFTS5Backend,
+    'postgresql': PostgresBackend,
+}
+
+
+def get_backend():
+    path = getattr(settings, 'POSTS_SEARCH_BACKEND', None)
+    if path:
+        return import_string(path)()
+    return VENDOR_BACKENDS.get(connection.vendor, SubstringBackend)()
+
+
+def index_posts(post_ids):
+    get_backend().index_posts(post_ids)
+
+
+def unindex_posts(post_ids):
+    get_backend().unindex_posts(post_ids)
+
+
+class FullTextSearchFilter(filters.SearchFilter):
+    """``?search=`` through the configured backend; page results by ``SEARCH_ORDERING``."""
+
+    def filter_queryset(self, request, queryset, view):
+        query = search_query(request)
+        if not query:
+            return queryset
+        return get_backend().search(queryset, query)
@@ -1,6 +1,11 @@
+from django.conf import settings
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
-from .models import Post, Comment
+from .models import Post, Comment, Like
+from .like_buffer import like_buffer, enabled as like_buffer_enabled
+from .liker_sets import liker_sets, enabled as liker_sets_enabled
+from .signals import posts_bulk_created
+from social_media_api.fieldsets import SparseFieldsetMixin, requested_fields, wants
 
 User = get_user_model()
 
@@ -12,16 +17,156 @@ class SimpleUserSerializer(serializers.ModelSerializer):
         read_only_fields = fields
 
 
-class PostSerializer(serializers.ModelSerializer):
+def liked_post_ids(request, post_ids) -> set:
+    """Which of ``post_ids`` the requesting user has liked, in at most one query.
+
+    Posts with a resident liker set are answered from memory.
+    """
+    user = getattr(request, "user", None)
+    if not post_ids or user is None or not user.is_authenticated:
+        return set()
+    liked, remaining = set(), post_ids
+    if liker_sets_enabled():
+        resident = liker_sets.resident(post_ids)
+        liked = {post_id for post_id, likers in resident.items() if user.pk in likers}
+        remaining = [post_id for post_id in post_ids if post_id not in resident]
+    if remaining:
+        liked.update(Like.objects.filter(user=user, post_id__in=remaining).values_list("post_id", flat=True))
+    if like_buffer_enabled():
+        for post_id, pending in like_buffer.pending_for(user.pk, post_ids).items():
+            if pending:
+                liked.add(post_id)
+            else:
+                liked.discard(post_id)
+    return liked
+
+
+class PostListSerializer(serializers.ListSerializer):
+    """Resolves ``liked_by_me`` for a whole page with a single query.
+
+    Creating many posts inserts them with ``bulk_create``, then sends
+    ``posts.signals.posts_bulk_created`` in place of the skipped ``post_save``.
+    """
+
+    def create(self, validated_data):
+        posts = [Post(**attrs) for attrs in validated_data]
+        posts = Post.objects.bulk_create(posts, batch_size=getattr(settings, "POSTS_BULK_CREATE_BATCH_SIZE", 500))
+        posts_bulk_created.send(sender=Post, posts=posts)
+        return posts
+
+    def to_representation(self, data):
+        posts = list(data.all() if hasattr(data, "all") else data)
+        request = self.context.get("request")
+        if wants(request, "liked_by_me"):
+            self.context["liked_post_ids"] = liked_post_ids(request, [post.pk for post in posts])
+        return super().to_representation(posts)
+
+
+class SimplePostSerializer(serializers.ModelSerializer):
     author = SimpleUserSerializer(read_only=True)
 
     class Meta:
         model = Post
-        fields = ["id", "author", "title", "content", "created_at", "updated_at"]
-        read_only_fields = ["id", "author", "created_at", "updated_at"]
+        fields = ["id", "author", "title", "created_at"]
+        read_only_fields = fields
+
+
+class SimpleCommentSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Comment
+        fields = ["id", "post", "content", "created_at"]
+        read_only_fields = fields
+
+
+class PostSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    author = SimpleUserSerializer(read_only=True)
+    liked_by_me = serializers.SerializerMethodField()
 
+    class Meta:
+        model = Post
+        fields = [
+            "id", "author", "title", "content", "created_at", "updated_at",
+            "like_count", "comment_count", "liked_by_me",
+        ]
+        read_only_fields = ["id", "author", "created_at", "updated_at", "like_count", "comment_count"]
+        list_serializer_class = PostListSerializer
+
+    def get_liked_by_me(self, obj):
+        liked = self.context.get("liked_post_ids")
+        if liked is None:
+            liked = liked_post_ids(self.context.get("request"), [obj.pk])
+        return obj.pk in liked
+
+    def update(self, instance, validated_data):
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        # Only write edited columns so concurrent F() counter updates are not overwritten.
+        instance.save(update_fields=[*validated_data, "updated_at"])
+        return instance
+
+
+class PostRowSerializer:
+    """Read-only fast path for post lists.
+
+    Takes ``.values(*PostRowSerializer.fields)`` rows and builds the exact
+    output of ``PostSerializer(many=True)`` as plain dicts, skipping model
+    instances and per-field serializer dispatch. Keep in step with
+    ``PostSerializer.Meta.fields``; the tests compare the rendered JSON.
+    With ``?fields=``, ``fields_for`` names the columns the remaining fields need.
+    """
+    fields = (
+        "id", "author_id", "author__username", "title", "content",
+        "created_at", "updated_at", "like_count", "comment_count",
+    )
+    columns = {
+        "id": ("id",),
+        "author": ("author_id", "author__username"),
+        "title": ("title",),
+        "content": ("content",),
+        "created_at": ("created_at",),
+        "updated_at": ("updated_at",),
+        "like_count": ("like_count",),
+        "comment_count": ("comment_count",),
+        "liked_by_me": ("id",),
+    }
+    datetime_field = serializers.DateTimeField()
+
+    def __init__(self, rows, context=None):
+        self.rows = rows
+        self.context = context or {}
+
+    @classmethod
+    def fields_for(cls, names=None):
+        """``.values()`` columns needed to render ``names`` (every field when ``None``)."""
+        if names is None:
+            return cls.fields
+        return tuple(dict.fromkeys(column for name in cls.columns if name in names for column in cls.columns[name]))
 
-class CommentSerializer(serializers.ModelSerializer):
+    @property
+    def data(self):
+        rows = list(self.rows)
+        request = self.context.get("request")
+        wanted = requested_fields(request)
+        liked = set()
+        if wanted is None or "liked_by_me" in wanted:
+            liked = liked_post_ids(request, [row["id"] for row in rows])
+        timestamp = self.datetime_field.to_representation
+        render = {
+            "id": lambda row: row["id"],
+            "author": lambda row: {"id": row["author_id"], "username": row["author__username"]},
+            "title": lambda row: row["title"],
+            "content": lambda row: row["content"],
+            "created_at": lambda row: timestamp(row["created_at"]),
+            "updated_at": lambda row: timestamp(row["updated_at"]),
+            "like_count": lambda row: row["like_count"],
+            "comment_count": lambda row: row["comment_count"],
+            "liked_by_me": lambda row: row["id"] in liked,
+        }
+        names = [name for name in self.columns if wanted is None or name in wanted]
+        return [{name: render[name](row) for name in names} for row in rows]
+
+
+class CommentSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     author = SimpleUserSerializer(read_only=True)
     post = serializers.PrimaryKeyRelatedField(queryset=Post.objects.all())
 
@@ -29,3 +174,29 @@ class CommentSerializer(serializers.ModelSerializer):
         model = Comment
         fields = ["id", "post", "author", "content", "created_at", "updated_at"]
         read_only_fields = ["id", "author", "created_at", "updated_at"]
+        expandable_fields = {"post": (SimplePostSerializer, {"read_only": True})}
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if self.instance is not None and "post" in fields and not fields["post"].read_only:
+            # Moving a comment would leave comment_count wrong on both posts.
+            fields["post"] = serializers.PrimaryKeyRelatedField(read_only=True)
+        return fields
+
+
+class PostCommentSerializer(CommentSerializer):
+    """Comments under ``/api/posts/<id>/comments/``, where the post comes from the URL."""
+    post = serializers.PrimaryKeyRelatedField(read_only=True)
+
+
+class LikeOperationSerializer(serializers.Serializer):
+    post = serializers.IntegerField(min_value=1)
+    action = serializers.ChoiceField(choices=["like", "unlike"])
+
+
+class LikeBatchSerializer(serializers.Serializer):
+    operations = LikeOperationSerializer(
+        many=True,
+        allow_empty=False,
+        max_length=getattr(settings, "POSTS_LIKE_BATCH_MAX", 100),
+    )
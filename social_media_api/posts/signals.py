@@ -0,0 +1,123 @@
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from . import detail_cache, search, timeline
+from .liker_sets import liker_sets
+from .models import Post, TimelineEntry
+
+User = get_user_model()
+Follow = User.followers.through  # from_user is followed by to_user
+
+
+# Sent with ``posts=[...]`` after ``bulk_create``, which skips ``post_save``;
+# receivers run the same side effects batched for all of the posts.
+posts_bulk_created = Signal()
+
+
+@receiver(post_save, sender=Post)
+def fan_out_new_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.fan_out_post(instance)
+
+
+@receiver(posts_bulk_created, sender=Post)
+def fan_out_new_posts(sender, posts, **kwargs):
+    timeline.fan_out_posts(posts)
+
+
+@receiver(post_save, sender=Post)
+def index_saved_post(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_posts([instance.pk])
+
+
+@receiver(posts_bulk_created, sender=Post)
+def index_created_posts(sender, posts, **kwargs):
+    search.index_posts([post.pk for post in posts])
+
+
+@receiver(post_save, sender=User)
+def reindex_renamed_author(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    # Post search entries and cached detail payloads include the author's username.
+    if created or raw or (update_fields is not None and 'username' not in update_fields):
+        return
+    post_ids = list(Post.objects.filter(author=instance).values_list('pk', flat=True))
+    search.index_posts(post_ids)
+    detail_cache.invalidate(*post_ids)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_deleted_post(sender, instance, **kwargs):
+    search.unindex_posts([instance.pk])
+
+
+@receiver(post_delete, sender=Post)
+def drop_liker_set(sender, instance, **kwargs):
+    liker_sets.invalidate([instance.pk])
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_cached_post(sender, instance, raw=False, **kwargs):
+    if not raw:
+        detail_cache.invalidate(instance.pk)
+
+
+@receiver(posts_bulk_created, sender=Post)
+def invalidate_cached_posts(sender, posts, **kwargs):
+    detail_cache.invalidate(*(post.pk for post in posts))
+
+
+def _followee_deltas(instance, action, reverse, pk_set) -> dict:
+    """How a follow change shifts follower counts, as ``{followee_id: delta}``.
+
+    Like ``accounts.signals``, removals and clears are read from the follow
+    rows that exist before the delete, not from ``pk_set`` as given.
+    """
+    if action == 'post_add' and pk_set:
+        followees = list(pk_set) if reverse else [instance.pk] * len(pk_set)
+        return dict(Counter(followees))
+    if action not in ('pre_remove', 'pre_clear') or (action == 'pre_remove' and not pk_set):
+        return {}
+    own, other = ('to_user_id', 'from_user_id') if reverse else ('from_user_id', 'to_user_id')
+    rows = Follow.objects.filter(**{own: instance.pk})
+    if action == 'pre_remove':
+        rows = rows.filter(**{f'{other}__in': pk_set})
+    return {followee_id: -count for followee_id, count in Counter(rows.values_list('from_user_id', flat=True)).items()}
+
+
+@receiver(m2m_changed, sender=Follow)
+def retier_followed_authors(sender, instance, action, reverse, pk_set, **kwargs):
+    if not timeline.fanout_max_followers():
+        return
+    deltas = _followee_deltas(instance, action, reverse, pk_set)
+    if deltas:
+        # After commit, once accounts.signals has applied the counts.
+        transaction.on_commit(lambda: timeline.followers_changed(deltas))
+
+
+@receiver(m2m_changed, sender=Follow)
+def sync_timelines_on_follow(sender, instance, action, reverse, pk_set, **kwargs):
+    # reverse=True: instance.following changed, pk_set are followees.
+    # reverse=False: instance.followers changed, pk_set are followers.
+    if action == 'post_add':
+        if reverse:
+            timeline.backfill(instance.pk, pk_set)
+        else:
+            for follower_id in pk_set:
+                timeline.backfill(follower_id, [instance.pk])
+    elif action == 'post_remove':
+        if reverse:
+            timeline.remove_authors(instance.pk, pk_set)
+        else:
+            for follower_id in pk_set:
+                timeline.remove_authors(follower_id, [instance.pk])
+    elif action == 'post_clear':
+        if reverse:
+            TimelineEntry.objects.filter(owner=instance).delete()
+        else:
+            TimelineEntry.objects.filter(post__author=instance).delete()
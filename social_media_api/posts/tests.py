@@ -1,8 +1,26 @@
+import threading
+import time
+from io import StringIO
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+
 from django.contrib.auth import get_user_model
+from django.core import signing
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework.test import APITestCase, APIClient
 from rest_framework.authtoken.models import Token
-from .models import Post
+from . import counters, likes
+from . import like_buffer as like_buffer_module
+from .detail_cache import detail_cache
+from .like_buffer import like_buffer
+from .liker_sets import LikerSet, liker_sets
+from .models import Comment, Like, Post, PostSearchEntry, TimelineEntry
+from .timeline import PULL_AUTHORS_CACHE_KEY
 from notifications.models import Notification
 
 
@@ -71,3 +89,753 @@ class LikeTests(APITestCase):
         self.client.post(like_url)
         r = self.client.post(unlike_url)
         self.assertEqual(r.status_code, 200)
+
+
+class TimelineTests(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.alice = User.objects.create_user(username="alice", password="pass12345")
+        self.bob = User.objects.create_user(username="bob", password="pass12345")
+        token, _ = Token.objects.get_or_create(user=self.alice)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+
+    def feed_titles(self):
+        resp = self.client.get(reverse('feed'))
+        self.assertEqual(resp.status_code, 200)
+        return [item['title'] for item in resp.data['results']]
+
+    def test_new_post_is_fanned_out_to_followers(self):
+        self.alice.following.add(self.bob)
+        post = Post.objects.create(author=self.bob, title="Fresh", content="...")
+        self.assertTrue(TimelineEntry.objects.filter(owner=self.alice, post=post).exists())
+        self.assertEqual(self.feed_titles(), ["Fresh"])
+
+    def test_follow_backfills_and_unfollow_trims(self):
+        Post.objects.create(author=self.bob, title="Old", content="...")
+        self.assertEqual(self.feed_titles(), [])
+        self.client.post(reverse('follow-user', args=[self.bob.id]))
+        self.assertEqual(self.feed_titles(), ["Old"])
+        self.client.post(reverse('unfollow-user', args=[self.bob.id]))
+        self.assertEqual(self.feed_titles(), [])
+
+    @override_settings(FEED_TIMELINE_LENGTH=2, FEED_TIMELINE_SLACK=1)
+    def test_timeline_is_capped(self):
+        self.alice.following.add(self.bob)
+        for i in range(4):
+            Post.objects.create(author=self.bob, title=f"Bob {i}", content="...")
+        self.assertEqual(TimelineEntry.objects.filter(owner=self.alice).count(), 2)
+        self.assertEqual(self.feed_titles(), ["Bob 3", "Bob 2"])
+        Post.objects.create(author=self.bob, title="Bob 4", content="...")
+        self.assertEqual(TimelineEntry.objects.filter(owner=self.alice).count(), 3)
+
+    def test_rebuild_command_restores_timelines(self):
+        self.alice.following.add(self.bob)
+        Post.objects.create(author=self.bob, title="Bob 1", content="...")
+        TimelineEntry.objects.all().delete()
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertEqual(self.feed_titles(), ["Bob 1"])
+
+
+@override_settings(FEED_FANOUT_MAX_FOLLOWERS=2)
+class HybridFeedTests(APITestCase):
+    def setUp(self):
+        cache.delete(PULL_AUTHORS_CACHE_KEY)
+        self.addCleanup(cache.delete, PULL_AUTHORS_CACHE_KEY)
+        User = get_user_model()
+        self.alice = User.objects.create_user(username="alice", password="pass12345")
+        self.carla = User.objects.create_user(username="carla", password="pass12345")
+        self.star = User.objects.create_user(username="star", password="pass12345")
+        self.bob = User.objects.create_user(username="bob", password="pass12345")
+        self.star.followers.add(self.alice, self.carla)
+        self.alice.following.add(self.bob)
+        token, _ = Token.objects.get_or_create(user=self.alice)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+
+    def test_popular_author_is_pulled_and_merged_in_order(self):
+        Post.objects.create(author=self.bob, title="Bob 1", content="...")
+        star_post = Post.objects.create(author=self.star, title="Star 1", content="...")
+        Post.objects.create(author=self.bob, title="Bob 2", content="...")
+        self.assertFalse(TimelineEntry.objects.filter(post=star_post).exists())
+
+        resp = self.client.get(reverse('feed'), {'page_size': 2})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual([item['title'] for item in resp.data['results']], ["Bob 2", "Star 1"])
+        resp = self.client.get(resp.data['next'])
+        self.assertEqual([item['title'] for item in resp.data['results']], ["Bob 1"])
+        self.assertIsNone(resp.data['next'])
+
+    def test_author_dropping_below_threshold_is_pushed(self):
+        Post.objects.create(author=self.star, title="Star 1", content="...")
+        self.assertEqual(self.feed_titles(), ["Star 1"])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.carla.following.remove(self.star)
+        self.assertTrue(TimelineEntry.objects.filter(owner=self.alice, post__author=self.star).exists())
+        Post.objects.create(author=self.star, title="Star 2", content="...")
+        self.assertEqual(self.feed_titles(), ["Star 2", "Star 1"])
+
+    def test_clearing_followers_pushes_the_author(self):
+        with mock.patch('posts.timeline.push_author') as push, self.captureOnCommitCallbacks(execute=True):
+            self.star.followers.clear()
+        push.assert_called_once_with(self.star.pk)
+
+    def test_removing_a_non_follower_keeps_the_tier(self):
+        self.star.followers.remove(self.carla)
+        with mock.patch('posts.timeline.push_author') as push, self.captureOnCommitCallbacks(execute=True):
+            self.bob.following.remove(self.star)
+        push.assert_not_called()
+
+    def feed_titles(self):
+        return [item['title'] for item in self.client.get(reverse('feed')).data['results']]
+
+
+class KeysetPaginationTests(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username="alice", password="pass12345")
+        self.posts = [Post.objects.create(author=self.user, title=f"Post {i}", content="...") for i in range(5)]
+        token, _ = Token.objects.get_or_create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+
+    def test_walks_all_pages_newest_first(self):
+        titles = []
+        url = reverse('post-list') + '?page_size=2'
+        while url:
+            resp = self.client.get(url)
+            self.assertEqual(resp.status_code, 200)
+            titles += [item['title'] for item in resp.data['results']]
+            url = resp.data['next']
+        self.assertEqual(titles, [f"Post {i}" for i in reversed(range(5))])
+
+    def test_previous_link_returns_to_earlier_page(self):
+        first = self.client.get(reverse('post-list'), {'page_size': 2})
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+        self.assertEqual(back.data['results'], first.data['results'])
+
+    def test_since_polls_for_newer_posts(self):
+        first = self.client.get(reverse('post-list'), {'page_size': 2})
+        newest = first.data['previous']
+        self.assertEqual(self.client.get(newest).data['results'], [])
+        Post.objects.create(author=self.user, title="Newer", content="...")
+        cursor = parse_qs(urlparse(newest).query)['cursor'][0]
+        resp = self.client.get(reverse('post-list'), {'since': cursor})
+        self.assertEqual([item['title'] for item in resp.data['results']], ["Newer"])
+
+    def test_tampered_cursor_is_rejected(self):
+        resp = self.client.get(reverse('post-list'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(resp.status_code, 404)
+
+    def test_comments_are_oldest_first(self):
+        for i in range(3):
+            Comment.objects.create(post=self.posts[0], author=self.user, content=f"Comment {i}")
+        resp = self.client.get(reverse('comment-list'), {'page_size': 2})
+        self.assertEqual([item['content'] for item in resp.data['results']], ["Comment 0", "Comment 1"])
+        resp = self.client.get(resp.data['next'])
+        self.assertEqual([item['content'] for item in resp.data['results']], ["Comment 2"])
+
+
+class PostCommentsTests(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.alice = User.objects.create_user(username="alice", password="pass12345")
+        self.bob = User.objects.create_user(username="bob", password="pass12345")
+        self.post = Post.objects.create(author=self.alice, title="Post", content="...")
+        self.other = Post.objects.create(author=self.alice, title="Other", content="...")
+        for i in range(3):
+            Comment.objects.create(post=self.post, author=self.bob, content=f"Comment {i}")
+        Comment.objects.create(post=self.other, author=self.bob, content="Elsewhere")
+        token, _ = Token.objects.get_or_create(user=self.bob)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+        self.url = reverse('post-comments', args=[self.post.pk])
+
+    def test_lists_only_that_posts_comments_in_pages(self):
+        resp = self.client.get(self.url, {'page_size': 2})
+        self.assertEqual([item['content'] for item in resp.data['results']], ["Comment 0", "Comment 1"])
+        self.assertEqual(resp.data['results'][0]['author'], {'id': self.bob.pk, 'username': 'bob'})
+        resp = self.client.get(resp.data['next'])
+        self.assertEqual([item['content'] for item in resp.data['results']], ["Comment 2"])
+        self.assertIsNone(resp.data['next'])
+
+    def test_page_is_a_single_query_with_author_joined(self):
+        self.client.get(self.url)  # warm up auth/token lookups
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url)
+        comment_queries = [q['sql'] for q in queries.captured_queries if 'posts_comment' in q['sql']]
+        self.assertEqual(len(comment_queries), 1)
+        self.assertIn('accounts_user', comment_queries[0])
+
+    def test_create_takes_post_from_url(self):
+        resp = self.client.post(self.url, {'content': 'Nested'}, format='json')
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(resp.data['post'], self.post.pk)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+        self.assertTrue(Notification.objects.filter(recipient=self.alice, verb='commented on your post').exists())
+
+    def test_unknown_post_is_404(self):
+        resp = self.client.get(reverse('post-comments', args=[self.other.pk + 100]))
+        self.assertEqual(resp.status_code, 404)
+
+
+class BulkCreateTests(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.author = User.objects.create_user(username="author", password="pass12345")
+        self.reader = User.objects.create_user(username="reader", password="pass12345")
+        self.reader.following.add(self.author)
+        token, _ = Token.objects.get_or_create(user=self.author)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+        self.url = reverse('post-bulk-create')
+
+    def test_creates_posts_in_order_with_side_effects(self):
+        payload = [{'title': f"Imported {i}", 'content': f"body {i} zucchini"} for i in range(3)]
+        resp = self.client.post(self.url, payload, format='json')
+        self.assertEqual(resp.status_code, 201)
+        ids = resp.data['ids']
+        self.assertEqual(list(Post.objects.filter(pk__in=ids).order_by('id').values_list('title', flat=True)),
+                         ["Imported 0", "Imported 1", "Imported 2"])
+        self.assertEqual(sorted(ids), ids)
+        self.assertTrue(all(Post.objects.get(pk=pk).author_id == self.author.pk for pk in ids))
+        self.assertEqual(TimelineEntry.objects.filter(owner=self.reader, post_id__in=ids).count(), 3)
+        found = self.client.get(reverse('post-list'), {'search': 'zucchini'})
+        self.assertEqual(sorted(item['id'] for item in found.data['results']), ids)
+
+    def test_invalid_item_rejects_the_whole_batch(self):
+        payload = [{'title': "Fine", 'content': "..."}, {'title': "", 'content': "..."}]
+        resp = self.client.post(self.url, payload, format='json')
+        self.assertEqual(resp.status_code, 400)
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(POSTS_BULK_CREATE_MAX=2)
+    def test_rejects_oversized_batches(self):
+        payload = [{'title': f"P{i}", 'content': "..."} for i in range(3)]
+        self.assertEqual(self.client.post(self.url, payload, format='json').status_code, 400)
+
+
+class SparseFieldsetTests(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.alice = User.objects.create_user(username="alice", password="pass12345")
+        self.posts = [Post.objects.create(author=self.alice, title=f"Post {i}", content="...") for i in range(3)]
+        Comment.objects.create(post=self.posts[0], author=self.alice, content="First")
+        token, _ = Token.objects.get_or_create(user=self.alice)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+
+    def post_queries(self, url, params):
+        self.client.get(url, params)  # warm up auth/token lookups
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.get(url, params)
+        return resp, [q['sql'] for q in queries.captured_queries if 'posts_' in q['sql']]
+
+    def test_list_returns_and_loads_only_requested_fields(self):
+        for fast in (True, False):
+            with override_settings(POSTS_FAST_LIST_SERIALIZATION=fast):
+                resp, queries = self.post_queries(reverse('post-list'), {'fields': 'id,title', 'page_size': 2})
+            self.assertEqual(resp.data['results'][0], {'id': self.posts[2].pk, 'title': "Post 2"})
+            self.assertEqual(len(queries), 1)  # no liked_by_me lookup
+            self.assertNotIn('accounts_user', queries[0])
+            self.assertNotIn('"content"', queries[0])
+        self.assertIsNotNone(resp.data['next'])
+
+    def test_detail_fields(self):
+        resp = self.client.get(reverse('post-detail', args=[self.posts[0].pk]), {'fields': 'id,like_count'})
+        self.assertEqual(resp.data, {'id': self.posts[0].pk, 'like_count': 0})
+
+    def test_comment_expand_post_in_one_query(self):
+        url = reverse('post-comments', args=[self.posts[0].pk])
+        resp, queries = self.post_queries(url, {'fields': 'id,content', 'expand': 'post'})
+        self.assertEqual(resp.data['results'][0]['content'], "First")
+        self.assertEqual(resp.data['results'][0]['post']['title'], "Post 0")
+        self.assertEqual(resp.data['results'][0]['post']['author'], {'id': self.alice.pk, 'username': 'alice'})
+        self.assertEqual(set(resp.data['results'][0]), {'id', 'content', 'post'})
+        self.assertEqual(len([q for q in queries if 'posts_comment' in q]), 1)
+
+    def test_writes_ignore_fields(self):
+        resp = self.client.post(reverse('post-list') + '?fields=id', {'title': 'New', 'content': '...'}, format='json')
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(resp.data['title'], 'New')
+
+
+class CounterTests(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.author = User.objects.create_user(username="author", password="pass12345")
+        self.reader = User.objects.create_user(username="reader", password="pass12345")
+        self.post = Post.objects.create(author=self.author, title="A", content="B")
+        token, _ = Token.objects.get_or_create(user=self.reader)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+
+    def counts(self):
+        resp = self.client.get(reverse('post-detail', args=[self.post.id]))
+        return resp.data['like_count'], resp.data['comment_count']
+
+    def test_like_and_unlike_adjust_like_count(self):
+        self.client.post(reverse('post-like', args=[self.post.id]))
+        self.client.post(reverse('post-like', args=[self.post.id]))
+        self.assertEqual(self.counts(), (1, 0))
+        self.client.post(reverse('post-unlike', args=[self.post.id]))
+        self.client.post(reverse('post-unlike', args=[self.post.id]))
+        self.assertEqual(self.counts(), (0, 0))
+
+    def test_comment_create_and_destroy_adjust_comment_count(self):
+        resp = self.client.post(reverse('comment-list'), {'post': self.post.id, 'content': 'Hi'})
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(self.counts(), (0, 1))
+        self.client.delete(reverse('comment-detail', args=[resp.data['id']]))
+        self.assertEqual(self.counts(), (0, 0))
+
+    def test_comment_cannot_be_moved_to_another_post(self):
+        other = Post.objects.create(author=self.author, title="C", content="D")
+        resp = self.client.post(reverse('comment-list'), {'post': self.post.id, 'content': 'Hi'})
+        resp = self.client.patch(reverse('comment-detail', args=[resp.data['id']]), {'post': other.id, 'content': 'Hey'})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual((resp.data['post'], resp.data['content']), (self.post.id, 'Hey'))
+        self.assertEqual(self.counts(), (0, 1))
+        other.refresh_from_db()
+        self.assertEqual(other.comment_count, 0)
+
+    def test_reconcile_repairs_drift(self):
+        Like.objects.create(post=self.post, user=self.reader)
+        Comment.objects.create(post=self.post, author=self.reader, content="Hi")
+        Post.objects.filter(pk=self.post.pk).update(like_count=7)
+        out = StringIO()
+        call_command('reconcile_post_counters', '--batch-size', '1', stdout=out)
+        self.assertIn("repaired 1", out.getvalue())
+        self.assertEqual(self.counts(), (1, 1))
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'post-detail-tests'}},
+    POSTS_DETAIL_CACHE_ALIAS='default',
+    POSTS_DETAIL_CACHE_TTL=60,
+)
+class PostDetailCacheTests(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.alice = User.objects.create_user(username="alice", password="pass12345")
+        self.bob = User.objects.create_user(username="bob", password="pass12345")
+        self.post = Post.objects.create(author=self.alice, title="Viral", content="...")
+        self.url = reverse('post-detail', args=[self.post.pk])
+        self.client = self.client_for(self.alice)
+        cache.clear()
+        detail_cache.reset_stats()
+
+    def client_for(self, user):
+        token, _ = Token.objects.get_or_create(user=user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+        return client
+
+    def test_second_read_is_served_from_cache(self):
+        first = self.client.get(self.url)
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get(self.url)
+        self.assertEqual(first.data, second.data)
+        self.assertFalse([q for q in queries.captured_queries if 'posts_post"' in q['sql']])
+        stats = detail_cache.stats()
+        self.assertEqual((stats['misses'], stats['hits']), (1, 1))
+
+    def test_writes_invalidate_the_cached_payload(self):
+        self.client.get(self.url)
+        self.client.patch(self.url, {'title': 'Edited'}, format='json')
+        self.assertEqual(self.client.get(self.url).data['title'], 'Edited')
+
+        self.client_for(self.bob).post(reverse('post-like', args=[self.post.pk]))
+        self.assertEqual(self.client.get(self.url).data['like_count'], 1)
+
+        self.client.post(reverse('post-comments', args=[self.post.pk]), {'content': 'Hi'}, format='json')
+        self.assertEqual(self.client.get(self.url).data['comment_count'], 1)
+
+        self.client_for(self.bob).post(reverse('post-unlike', args=[self.post.pk]))
+        self.assertEqual(self.client.get(self.url).data['like_count'], 0)
+
+        self.client.delete(self.url)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_author_rename_invalidates_the_cached_payload(self):
+        self.assertEqual(self.client.get(self.url).data['author']['username'], 'alice')
+        self.alice.username = 'alicia'
+        self.alice.save()
+        self.assertEqual(self.client.get(self.url).data['author']['username'], 'alicia')
+
+    @override_settings(POSTS_DETAIL_CACHE_ALIAS='')
+    def test_no_alias_means_no_cache(self):
+        self.client.get(self.url)
+        self.client.get(self.url)
+        self.assertFalse(cache.get(f"posts:detail:{self.post.pk}"))
+        self.assertEqual(detail_cache.stats()['misses'], 0)
+
+    def test_liked_by_me_is_per_user(self):
+        Like.objects.create(post=self.post, user=self.alice)
+        self.assertTrue(self.client.get(self.url).data['liked_by_me'])
+        self.assertFalse(self.client_for(self.bob).get(self.url).data['liked_by_me'])
+
+    def test_concurrent_misses_load_once(self):
+        release = threading.Event()
+        calls = []
+
+        def loader():
+            calls.append(1)
+            release.wait(5)
+            return {'id': 0}
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(detail_cache.get_or_load(0, loader)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.1)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'id': 0}] * 5)
+        self.assertEqual(detail_cache.stats()['coalesced'], 4)
+
+    def test_stats_endpoint_is_admin_only(self):
+        self.assertEqual(self.client.get(reverse('post-cache-stats')).status_code, 403)
+        self.alice.is_staff = True
+        self.alice.save()
+        resp = self.client.get(reverse('post-cache-stats'))
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn('hit_ratio', resp.data)
+
+
+class LikedByMeTests(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.author = User.objects.create_user(username="author", password="pass12345")
+        self.reader = User.objects.create_user(username="reader", password="pass12345")
+        self.reader.following.add(self.author)
+        self.posts = [Post.objects.create(author=self.author, title=f"Post {i}", content="...") for i in range(6)]
+        Like.objects.create(post=self.posts[-1], user=self.reader)
+        token, _ = Token.objects.get_or_create(user=self.reader)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+
+    def test_list_and_feed_flag_liked_posts(self):
+        for url in (reverse('post-list'), reverse('feed')):
+            resp = self.client.get(url)
+            flags = {item['id']: item['liked_by_me'] for item in resp.data['results']}
+            self.assertTrue(flags.pop(self.posts[-1].id))
+            self.assertFalse(any(flags.values()))
+
+    def test_query_count_does_not_grow_with_page_size(self):
+        self.client.get(reverse('post-list'))  # warm up the token cache
+        for url in (reverse('post-list'), reverse('feed')):
+            with CaptureQueriesContext(connection) as small:
+                self.client.get(url, {'page_size': 2})
+            with CaptureQueriesContext(connection) as large:
+                self.client.get(url, {'page_size': 6})
+            self.assertEqual(len(small), len(large))
+
+    def test_detail_reports_liked_by_me(self):
+        resp = self.client.get(reverse('post-detail', args=[self.posts[0].id]))
+        self.assertFalse(resp.data['liked_by_me'])
+        resp = self.client.get(reverse('post-detail', args=[self.posts[-1].id]))
+        self.assertTrue(resp.data['liked_by_me'])
+
+
+@override_settings(POSTS_LIKE_WRITE_BEHIND=True, POSTS_LIKE_FLUSH_INTERVAL_MS=0)
+class WriteBehindLikeTests(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.author = User.objects.create_user(username="author", password="pass12345")
+        self.liker = User.objects.create_user(username="liker", password="pass12345")
+        self.post = Post.objects.create(author=self.author, title="A", content="B")
+        token, _ = Token.objects.get_or_create(user=self.liker)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+        self.addCleanup(like_buffer.flush)
+
+    def test_like_is_visible_before_flush_and_written_once(self):
+        r1 = self.client.post(reverse('post-like', args=[self.post.id]))
+        r2 = self.client.post(reverse('post-like', args=[self.post.id]))
+        self.assertEqual(r1.data['detail'], "Post liked.")
+        self.assertEqual(r2.data['detail'], "Already liked.")
+        self.assertFalse(Like.objects.exists())
+        detail = self.client.get(reverse('post-detail', args=[self.post.id]))
+        self.assertTrue(detail.data['liked_by_me'])
+
+        like_buffer.flush()
+        self.assertEqual(Like.objects.filter(post=self.post, user=self.liker).count(), 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+        self.assertEqual(Notification.objects.filter(recipient=self.author, verb='liked your post').count(), 1)
+
+    def test_like_then_unlike_collapses_to_nothing(self):
+        self.client.post(reverse('post-like', args=[self.post.id]))
+        r = self.client.post(reverse('post-unlike', args=[self.post.id]))
+        self.assertEqual(r.data['detail'], "Like removed.")
+        like_buffer.flush()
+        self.assertFalse(Like.objects.exists())
+        self.assertFalse(Notification.objects.exists())
+
+    def test_unlike_of_stored_like_is_flushed_as_delete(self):
+        Like.objects.create(post=self.post, user=self.liker)
+        Post.objects.filter(pk=self.post.pk).update(like_count=1)
+        self.client.post(reverse('post-unlike', args=[self.post.id]))
+        like_buffer.flush()
+        self.assertFalse(Like.objects.exists())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 0)
+
+    def test_like_written_concurrently_is_not_counted_twice(self):
+        self.client.post(reverse('post-like', args=[self.post.id]))
+        insert = like_buffer_module.insert_likes
+
+        def race_then_insert(pairs):
+            # Another worker likes the post directly between the flush's read and its insert.
+            Like.objects.create(post=self.post, user=self.liker)
+            counters.adjust(self.post.pk, likes=1)
+            return insert(pairs)
+
+        with mock.patch.object(like_buffer_module, 'insert_likes', race_then_insert):
+            like_buffer.flush()
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.like_count, Like.objects.count()), (1, 1))
+        self.assertFalse(Notification.objects.exists())
+
+    def test_unknown_or_malformed_post_is_404(self):
+        for pk in (self.post.id + 100, 'abc'):
+            self.assertEqual(self.client.post(reverse('post-like', args=[pk])).status_code, 404)
+            self.assertEqual(self.client.post(reverse('post-unlike', args=[pk])).status_code, 404)
+
+
+@override_settings(POSTS_LIKER_SETS_MAX_BYTES=1 << 20)
+class LikerSetTests(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.users = [User.objects.create_user(username=f"user{i}", password="pass12345") for i in range(4)]
+        self.posts = [Post.objects.create(author=self.users[0], title=f"Post {i}", content="...") for i in range(3)]
+        for user in self.users[:3]:
+            Like.objects.create(post=self.posts[0], user=user)
+        for user in self.users[1:]:
+            Like.objects.create(post=self.posts[1], user=user)
+        liker_sets.clear()
+        self.addCleanup(liker_sets.clear)
+        self.client = self.client_for(self.users[3])
+
+    def client_for(self, user):
+        token, _ = Token.objects.get_or_create(user=user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+        return client
+
+    def test_sorted_array_operations(self):
+        likers = LikerSet([2, 5, 9])
+        likers.add(7)
+        likers.add(5)
+        likers.discard(2)
+        self.assertEqual(list(likers), [5, 7, 9])
+        self.assertIn(7, likers)
+        self.assertNotIn(2, likers)
+        self.assertEqual(list(likers.intersection(LikerSet([1, 7, 9, 11]))), [7, 9])
+        likers.add(2 ** 40)
+        self.assertIn(2 ** 40, likers)
+
+    def test_resident_sets_follow_likes_and_answer_liked_by_me(self):
+        post = self.posts[0]
+        self.assertNotIn(self.users[3].pk, liker_sets.get(post.pk))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('post-like', args=[post.pk]))
+        self.assertIn(self.users[3].pk, liker_sets.get(post.pk))
+
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.get(reverse('post-detail', args=[post.pk]))
+        self.assertTrue(resp.data['liked_by_me'])
+        self.assertFalse([q for q in queries.captured_queries if 'posts_like' in q['sql']])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('post-unlike', args=[post.pk]))
+        self.assertNotIn(self.users[3].pk, liker_sets.get(post.pk))
+
+    def test_batch_and_buffer_flush_update_resident_sets(self):
+        post = self.posts[2]
+        liker_sets.get(post.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('post-like-batch'), {'operations': [{'post': post.pk, 'action': 'like'}]},
+                             format='json')
+        self.assertIn(self.users[3].pk, liker_sets.get(post.pk))
+        with override_settings(POSTS_LIKE_WRITE_BEHIND=True, POSTS_LIKE_FLUSH_INTERVAL_MS=0):
+            self.client_for(self.users[1]).post(reverse('post-like', args=[post.pk]))
+            with self.captureOnCommitCallbacks(execute=True):
+                like_buffer.flush()
+        self.assertIn(self.users[1].pk, liker_sets.get(post.pk))
+
+    def test_lru_stays_within_budget(self):
+        sizes = [liker_sets.get(post.pk).nbytes for post in self.posts]
+        liker_sets.clear()
+        budget = sizes[1] + sizes[2]
+        with override_settings(POSTS_LIKER_SETS_MAX_BYTES=budget):
+            for post in self.posts:
+                liker_sets.get(post.pk)
+            self.assertLessEqual(liker_sets.stats()['bytes'], budget)
+            resident = liker_sets.resident([post.pk for post in self.posts])
+        self.assertEqual(sorted(resident), [self.posts[1].pk, self.posts[2].pk])
+
+    def test_common_likers(self):
+        url = reverse('post-common-likers')
+        posts = f"{self.posts[0].pk},{self.posts[1].pk}"
+        expected = sorted(user.pk for user in self.users[1:3])
+        resp = self.client.get(url, {'posts': posts})
+        self.assertEqual((resp.data['count'], resp.data['users']), (2, expected))
+        with override_settings(POSTS_LIKER_SETS_MAX_BYTES=0):
+            resp = self.client.get(url, {'posts': posts})
+        self.assertEqual((resp.data['count'], resp.data['users']), (2, expected))
+        self.assertEqual(self.client.get(url, {'posts': 'x'}).status_code, 400)
+        with override_settings(POSTS_COMMON_LIKERS_MAX_POSTS=1, POSTS_COMMON_LIKERS_MAX_USERS=1):
+            self.assertEqual(self.client.get(url, {'posts': posts}).status_code, 400)
+            resp = self.client.get(url, {'posts': self.posts[1].pk})
+        self.assertEqual((resp.data['count'], len(resp.data['users'])), (3, 1))
+
+
+class LikeBatchTests(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.author = User.objects.create_user(username="author", password="pass12345")
+        self.liker = User.objects.create_user(username="liker", password="pass12345")
+        self.p1 = Post.objects.create(author=self.author, title="1", content="...")
+        self.p2 = Post.objects.create(author=self.author, title="2", content="...")
+        Like.objects.create(post=self.p2, user=self.liker)
+        Post.objects.filter(pk=self.p2.pk).update(like_count=1)
+        token, _ = Token.objects.get_or_create(user=self.liker)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+
+    def test_batch_applies_operations_and_reports_each(self):
+        resp = self.client.post(reverse('post-like-batch'), {'operations': [
+            {'post': self.p1.id, 'action': 'like'},
+            {'post': self.p1.id, 'action': 'like'},
+            {'post': self.p2.id, 'action': 'unlike'},
+            {'post': 999999, 'action': 'like'},
+        ]}, format='json')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(
+            [item['status'] for item in resp.data['results']],
+            ['liked', 'already_liked', 'unliked', 'not_found'],
+        )
+        self.assertEqual(list(Like.objects.filter(user=self.liker).values_list('post_id', flat=True)), [self.p1.id])
+        self.assertEqual(
+            dict(Post.objects.values_list('pk', 'like_count')), {self.p1.id: 1, self.p2.id: 0}
+        )
+        self.assertEqual(Notification.objects.filter(recipient=self.author, verb='liked your post').count(), 1)
+
+    def test_concurrent_like_is_not_counted_twice(self):
+        plan = likes._plan
+
+        def plan_then_race(*args):
+            # Another request likes p1 between the batch's read and its insert.
+            self.client.post(reverse('post-like', args=[self.p1.id]))
+            return plan(*args)
+
+        with mock.patch.object(likes, '_plan', plan_then_race):
+            resp = self.client.post(reverse('post-like-batch'), {'operations': [
+                {'post': self.p1.id, 'action': 'like'},
+            ]}, format='json')
+        self.assertEqual(resp.status_code, 200)
+        self.p1.refresh_from_db()
+        self.assertEqual((self.p1.like_count, Like.objects.filter(post=self.p1).count()), (1, 1))
+        self.assertEqual(Notification.objects.get(recipient=self.author).actor_count, 1)
+
+    def test_batch_rejects_too_many_operations(self):
+        operations = [{'post': self.p1.id, 'action': 'like'}] * 101
+        resp = self.client.post(reverse('post-like-batch'), {'operations': operations}, format='json')
+        self.assertEqual(resp.status_code, 400)
+
+
+class SearchTests(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username="alice", password="pass12345")
+        self.other = User.objects.create_user(username="gardener", password="pass12345")
+        token, _ = Token.objects.get_or_create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+
+    def search(self, term, **params):
+        resp = self.client.get(reverse('post-list'), {'search': term, **params})
+        self.assertEqual(resp.status_code, 200)
+        return resp
+
+    def titles(self, term):
+        return [item['title'] for item in self.search(term).data['results']]
+
+    def test_results_are_ranked_by_relevance(self):
+        Post.objects.create(author=self.user, title="Tomatoes", content="tomato tomato tomato soup")
+        Post.objects.create(author=self.user, title="Weekend", content="made some tomato sauce")
+        Post.objects.create(author=self.user, title="Unrelated", content="nothing to see")
+        self.assertEqual(self.titles("tomato"), ["Tomatoes", "Weekend"])
+
+    def test_index_follows_updates_and_deletes(self):
+        post = Post.objects.create(author=self.user, title="Draft", content="first version")
+        post.content = "second version"
+        post.save()
+        self.assertEqual(self.titles("first"), [])
+        self.assertEqual(self.titles("second"), ["Draft"])
+        post.delete()
+        self.assertEqual(self.titles("second"), [])
+
+    def test_matches_author_username_and_tolerates_query_syntax(self):
+        Post.objects.create(author=self.other, title="Roses", content="...")
+        self.assertEqual(self.titles("gardener"), ["Roses"])
+        self.assertEqual(self.titles('roses" OR "*'), [])
+
+    def test_renaming_the_author_reindexes_their_posts(self):
+        Post.objects.create(author=self.other, title="Roses", content="...")
+        self.other.username = "florist"
+        self.other.save(update_fields=['username'])
+        self.assertEqual(self.titles("gardener"), [])
+        self.assertEqual(self.titles("florist"), ["Roses"])
+
+    def test_search_entries_are_empty_without_the_fts_table(self):
+        Post.objects.create(author=self.other, title="Roses", content="...")
+        self.assertTrue(PostSearchEntry.objects.exists())
+        with mock.patch.object(connection, 'vendor', 'postgresql'):
+            with self.assertNumQueries(0):
+                self.assertFalse(PostSearchEntry.objects.exists())
+
+    def test_ranked_results_paginate(self):
+        for i in range(3):
+            Post.objects.create(author=self.user, title=f"Soup {i}", content="soup " * (i + 1))
+        first = self.search("soup", page_size=2)
+        second = self.client.get(first.data['next'])
+        titles = [item['title'] for item in first.data['results'] + second.data['results']]
+        self.assertEqual(sorted(titles), ["Soup 0", "Soup 1", "Soup 2"])
+
+
+class FastListSerializationTests(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.author = User.objects.create_user(username="author", password="pass12345")
+        self.reader = User.objects.create_user(username="reader", password="pass12345")
+        self.reader.following.add(self.author)
+        posts = [Post.objects.create(author=self.author, title=f"Post {i}", content="soup " * i) for i in range(4)]
+        Like.objects.create(post=posts[1], user=self.reader)
+        Post.objects.filter(pk=posts[1].pk).update(like_count=1)
+        token, _ = Token.objects.get_or_create(user=self.reader)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+
+    # Cursors embed a signing timestamp; pin it so both responses sign the same way.
+    @mock.patch.object(signing.TimestampSigner, 'timestamp', return_value='0')
+    def test_json_is_byte_identical_to_post_serializer(self, _timestamp):
+        for url, params in (
+            (reverse('post-list'), {}),
+            (reverse('post-list'), {'search': 'soup'}),
+            (reverse('feed'), {'page_size': 3}),
+        ):
+            fast = self.client.get(url, params)
+            with override_settings(POSTS_FAST_LIST_SERIALIZATION=False):
+                slow = self.client.get(url, params)
+            self.assertEqual(fast.status_code, 200)
+            self.assertEqual(fast.content, slow.content)
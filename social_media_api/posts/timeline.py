@@ -0,0 +1,287 @@
+"""Hybrid push/pull timelines backing the feed.
+
+Every new post is pushed into the ``TimelineEntry`` rows of the author's
+followers, and follow/unfollow backfills or removes the affected author's
+posts. Each timeline is capped at ``settings.FEED_TIMELINE_LENGTH`` entries;
+a push trims it once it is ``settings.FEED_TIMELINE_SLACK`` entries over.
+
+Authors with at least ``settings.FEED_FANOUT_MAX_FOLLOWERS`` followers are
+not fanned out; their recent posts are pulled and merged in at read time.
+When a follow moves an author back below the threshold, their recent posts
+are pushed to all their followers.
+"""
+import heapq
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q
+
+from .models import Post, TimelineEntry
+from .pagination import keyset_filter, keyset_order
+
+BATCH_SIZE = 1000
+PULL_AUTHORS_CACHE_KEY = 'posts:feed:pull-authors'
+
+
+def timeline_length() -> int:
+    return getattr(settings, 'FEED_TIMELINE_LENGTH', 800)
+
+
+def timeline_slack() -> int:
+    return getattr(settings, 'FEED_TIMELINE_SLACK', 16)
+
+
+def fanout_max_followers() -> int:
+    return getattr(settings, 'FEED_FANOUT_MAX_FOLLOWERS', 0)
+
+
+def pull_author_ids() -> frozenset:
+    """IDs of authors whose posts are pulled at read time instead of fanned out.
+
+    Cached for ``settings.FEED_PULL_AUTHORS_TTL`` seconds; run
+    ``rebuild_timelines`` after changing the threshold.
+    """
+    threshold = fanout_max_followers()
+    if not threshold:
+        return frozenset()
+    ids = cache.get(PULL_AUTHORS_CACHE_KEY)
+    if ids is None:
+        ids = frozenset(
+            get_user_model().objects.filter(followers_count__gte=threshold).values_list('pk', flat=True)
+        )
+        cache.set(PULL_AUTHORS_CACHE_KEY, ids, getattr(settings, 'FEED_PULL_AUTHORS_TTL', 300))
+    return ids
+
+
+def pulled_among(author_ids) -> set:
+    """The authors in ``author_ids`` that are at or over the threshold right now.
+
+    Writes use this instead of the cached ``pull_author_ids()``, so a post is
+    never left out of timelines because its author changed tier within the TTL.
+    """
+    threshold = fanout_max_followers()
+    if not threshold:
+        return set()
+    return set(
+        get_user_model().objects.filter(pk__in=author_ids, followers_count__gte=threshold)
+        .values_list('pk', flat=True)
+    )
+
+
+def _recent(queryset):
+    return queryset.order_by('-created_at', '-post_id')
+
+
+def trim_timeline(owner_id) -> None:
+    """Drop everything past the newest ``timeline_length()`` entries."""
+    entries = TimelineEntry.objects.filter(owner_id=owner_id)
+    keep = _recent(entries).values('pk')[:timeline_length()]
+    entries.exclude(pk__in=keep).delete()
+
+
+def trim_timelines(owner_ids) -> None:
+    """Trim the timelines of ``owner_ids`` that are more than ``timeline_slack()`` over the cap."""
+    overfull = list(
+        TimelineEntry.objects.filter(owner_id__in=owner_ids)
+        .order_by()
+        .values('owner_id')
+        .annotate(entries=Count('pk'))
+        .filter(entries__gt=timeline_length() + timeline_slack())
+        .values_list('owner_id', flat=True)
+    )
+    for owner_id in overfull:
+        trim_timeline(owner_id)
+
+
+def _follower_ids(author_id) -> list:
+    follows = get_user_model().followers.through.objects
+    return list(follows.filter(from_user_id=author_id).values_list('to_user_id', flat=True))
+
+
+def _recent_posts(author_ids):
+    return (
+        Post.objects.filter(author_id__in=author_ids)
+        .order_by('-created_at', '-id')
+        .values_list('id', 'created_at')[:timeline_length()]
+    )
+
+
+def _push(posts, owner_ids) -> None:
+    """Insert ``(post_id, created_at)`` pairs into every timeline of ``owner_ids``."""
+    step = max(1, BATCH_SIZE // len(posts))
+    for start in range(0, len(owner_ids), step):
+        owners = owner_ids[start:start + step]
+        entries = [
+            TimelineEntry(owner_id=owner_id, post_id=post_id, created_at=created_at)
+            for owner_id in owners
+            for post_id, created_at in posts
+        ]
+        TimelineEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE, ignore_conflicts=True)
+        trim_timelines(owners)
+
+
+def fan_out_post(post) -> None:
+    """Push ``post`` into the timeline of every follower of its author."""
+    fan_out_posts([post])
+
+
+def fan_out_posts(posts) -> None:
+    """Push many new posts at once: per author, one follower lookup, then one insert
+    and one length check per ``BATCH_SIZE`` timeline rows.
+    """
+    by_author = {}
+    for post in posts:
+        by_author.setdefault(post.author_id, []).append(post)
+    pulled = pulled_among(by_author)
+    with transaction.atomic():
+        for author_id, authored in by_author.items():
+            if author_id in pulled:
+                continue
+            follower_ids = _follower_ids(author_id)
+            if follower_ids:
+                _push([(post.pk, post.created_at) for post in authored], follower_ids)
+
+
+def push_author(author_id) -> None:
+    """Copy ``author_id``'s recent posts into the timeline of each of their followers."""
+    recent = list(_recent_posts([author_id]))
+    follower_ids = _follower_ids(author_id)
+    if recent and follower_ids:
+        with transaction.atomic():
+            _push(recent, follower_ids)
+
+
+def followers_changed(deltas) -> None:
+    """Move authors whose follower counts shifted by ``{author_id: delta}`` between tiers.
+
+    An author who fell below the threshold is pushed again, which fills in the
+    posts they made while pulled. One who rose to it keeps the entries already
+    pushed; the feed skips the duplicates and trimming ages them out.
+    """
+    threshold = fanout_max_followers()
+    if not threshold or not deltas:
+        return
+    counts = get_user_model().objects.filter(pk__in=deltas).values_list('pk', 'followers_count')
+    crossed = [
+        (author_id, count) for author_id, count in counts
+        if (count >= threshold) != (count - deltas[author_id] >= threshold)
+    ]
+    if not crossed:
+        return
+    cache.delete(PULL_AUTHORS_CACHE_KEY)
+    for author_id, count in crossed:
+        if count < threshold:
+            push_author(author_id)
+
+
+def backfill(owner_id, author_ids) -> None:
+    """Copy the recent posts of ``author_ids`` into ``owner_id``'s timeline."""
+    author_ids = set(author_ids)
+    author_ids -= pulled_among(author_ids)
+    if not author_ids:
+        return
+    recent = _recent_posts(author_ids)
+    entries = [
+        TimelineEntry(owner_id=owner_id, post_id=post_id, created_at=created_at)
+        for post_id, created_at in recent
+    ]
+    with transaction.atomic():
+        TimelineEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE, ignore_conflicts=True)
+        trim_timeline(owner_id)
+
+
+def remove_authors(owner_id, author_ids) -> None:
+    """Remove the posts of ``author_ids`` from ``owner_id``'s timeline."""
+    TimelineEntry.objects.filter(owner_id=owner_id, post__author_id__in=author_ids).delete()
+
+
+def rebuild_timeline(owner) -> None:
+    """Recompute ``owner``'s timeline from the follow graph."""
+    following_ids = list(owner.following.values_list('id', flat=True))
+    with transaction.atomic():
+        TimelineEntry.objects.filter(owner=owner).delete()
+        backfill(owner.pk, following_ids)
+
+
+TIMELINE_ORDERING = ('-timeline_entries__created_at', '-timeline_entries__post_id')
+AUTHOR_ORDERING = ('-created_at', '-id')
+
+
+def feed_queryset(user, position=None, forward=True):
+    """Posts in ``user``'s timeline, newest first, read off the timeline index.
+
+    ``position`` is a ``(created_at, id)`` keyset; the condition goes into the
+    same ``filter()`` as the owner so it applies to the same timeline join.
+    """
+    condition = Q(timeline_entries__owner=user)
+    if position is not None:
+        condition &= keyset_filter(TIMELINE_ORDERING, position, forward)
+    return (
+        Post.objects.filter(condition)
+        .select_related('author')
+        .order_by(*keyset_order(TIMELINE_ORDERING, forward))
+    )
+
+
+def author_queryset(author_id, position=None, forward=True):
+    """Posts by one author, newest first, read off the author index."""
+    queryset = Post.objects.filter(author_id=author_id)
+    if position is not None:
+        queryset = queryset.filter(keyset_filter(AUTHOR_ORDERING, position, forward))
+    return queryset.select_related('author').order_by(*keyset_order(AUTHOR_ORDERING, forward))
+
+
+def _feed_key(row):
+    if isinstance(row, dict):
+        return row['created_at'], row['id']
+    return row.created_at, row.pk
+
+
+class HybridFeed:
+    """A user's feed: the pushed timeline merged with pulled author streams.
+
+    Every stream is sorted on ``(created_at, id)`` and range-scanned from the
+    same keyset position, so a page needs at most ``limit`` rows from each,
+    combined with a k-way merge.
+    """
+
+    def __init__(self, user, pull_ids=(), fields=None):
+        self.user = user
+        self.pull_ids = list(pull_ids)
+        self.fields = fields
+
+    def values(self, *fields):
+        """Like ``QuerySet.values()``: pages come back as dicts of ``fields``."""
+        return HybridFeed(self.user, self.pull_ids, fields)
+
+    def streams(self, position, forward, limit):
+        querysets = [feed_queryset(self.user, position, forward)]
+        querysets += [author_queryset(author_id, position, forward) for author_id in self.pull_ids]
+        for queryset in querysets:
+            if self.fields:
+                queryset = queryset.values(*self.fields)
+            yield queryset[:limit]
+
+    def keyset_page(self, position, forward, limit):
+        merged = heapq.merge(*self.streams(position, forward, limit), key=_feed_key, reverse=forward)
+        return list(islice(_unique(merged), limit))
+
+
+def _unique(rows):
+    # A post pushed before its author crossed the threshold is in both streams.
+    seen = set()
+    for row in rows:
+        key = _feed_key(row)
+        if key not in seen:
+            seen.add(key)
+            yield row
+
+
+def feed_for(user):
+    """The feed for ``user``, pulling from any followed high-follower authors."""
+    pull = pull_author_ids()
+    pull_ids = user.following.filter(id__in=pull).values_list('id', flat=True) if pull else []
+    return HybridFeed(user, pull_ids)
@@ -11,6 +11,8 @@ urlpatterns = [
     # Explicit like/unlike paths (router also provides these)
     path('posts/<int:pk>/like/', PostViewSet.as_view({'post': 'like'}), name='post-like'),
     path('posts/<int:pk>/unlike/', PostViewSet.as_view({'post': 'unlike'}), name='post-unlike'),
+    path('posts/<int:post_pk>/comments/', CommentViewSet.as_view({'get': 'list', 'post': 'create'}),
+         name='post-comments'),
 ]
 
 urlpatterns += router.urls
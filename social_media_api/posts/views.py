@@ -1,13 +1,25 @@
 from django.shortcuts import render
-from rest_framework import viewsets, permissions, filters, generics
+from rest_framework import viewsets, permissions, generics
 from .models import Post, Comment, Like
-from .serializers import PostSerializer, CommentSerializer
-from rest_framework.pagination import PageNumberPagination
+from .serializers import (
+    PostSerializer, PostRowSerializer, CommentSerializer, PostCommentSerializer, LikeBatchSerializer,
+    liked_post_ids,
+)
+from .likes import apply_like_batch
+from .search import FullTextSearchFilter, SEARCH_ORDERING, search_query
+from .timeline import feed_for
+from social_media_api.fieldsets import only_fields, requested_fields, wants
+from .pagination import KeysetPagination, OldestFirstPagination
+from . import counters, liker_sets
+from .detail_cache import detail_cache, enabled as detail_cache_enabled
+from .like_buffer import like_buffer, enabled as like_buffer_enabled
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework import status
-from notifications.models import Notification
-from django.contrib.contenttypes.models import ContentType
+from notifications.utils import create_notification
+from django.conf import settings
+from django.db import transaction
+from django.http import Http404
 
 class IsOwnerOrReadOnly(permissions.BasePermission):
     """Allow edits/deletes only to owners; read-only for others."""
@@ -17,70 +29,246 @@ class IsOwnerOrReadOnly(permissions.BasePermission):
         owner = getattr(obj, 'author', None)
         return owner == request.user
 
-class PostViewSet(viewsets.ModelViewSet):
-    queryset = Post.objects.select_related('author').all()
+class FastPostListMixin:
+    """List pages built from ``.values()`` rows by ``PostRowSerializer``.
+
+    Produces the same JSON as ``PostSerializer`` without instantiating models;
+    turn off with ``settings.POSTS_FAST_LIST_SERIALIZATION = False``.
+    """
+
+    def get_row_fields(self):
+        fields = PostRowSerializer.fields_for(requested_fields(self.request))
+        # Pagination reads the position of every row.
+        return tuple(dict.fromkeys((*fields, 'id', 'created_at')))
+
+    def list(self, request, *args, **kwargs):
+        if not getattr(settings, 'POSTS_FAST_LIST_SERIALIZATION', True):
+            return super().list(request, *args, **kwargs)
+        rows = self.filter_queryset(self.get_queryset()).values(*self.get_row_fields())
+        page = self.paginate_queryset(rows)
+        serializer = PostRowSerializer(page, context=self.get_serializer_context())
+        return self.get_paginated_response(serializer.data)
+
+
+POST_COLUMNS = {
+    'id': ('id',),
+    'author': ('author__id', 'author__username'),
+    'title': ('title',),
+    'content': ('content',),
+    'created_at': ('created_at',),
+    'updated_at': ('updated_at',),
+    'like_count': ('like_count',),
+    'comment_count': ('comment_count',),
+}
+
+COMMENT_COLUMNS = {
+    'id': ('id',),
+    'post': ('post',),
+    'author': ('author__id', 'author__username'),
+    'content': ('content',),
+    'created_at': ('created_at',),
+    'updated_at': ('updated_at',),
+}
+
+COMMENT_EXPANSIONS = {
+    'post': ('post__id', 'post__title', 'post__created_at', 'post__author__id', 'post__author__username'),
+}
+
+
+class PostViewSet(FastPostListMixin, viewsets.ModelViewSet):
+    queryset = Post.objects.select_related('author').order_by('-created_at', '-id')
     serializer_class = PostSerializer
     permission_classes = [permissions.IsAuthenticated & IsOwnerOrReadOnly]
-    filter_backends = [filters.SearchFilter]
-    search_fields = ['title', 'content', 'author__username']
+    pagination_class = KeysetPagination
+    filter_backends = [FullTextSearchFilter]
+
+    def get_queryset(self):
+        return only_fields(super().get_queryset(), self.request, POST_COLUMNS, always=('id', 'created_at'))
+
+    def get_keyset_ordering(self, default):
+        # Search results are walked best match first instead of newest first.
+        return SEARCH_ORDERING if search_query(self.request) else default
+
+    def get_row_fields(self):
+        fields = super().get_row_fields()
+        return (*fields, 'search_rank') if search_query(self.request) else fields
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    @action(detail=False, methods=['post'], url_path='bulk', url_name='bulk-create',
+            permission_classes=[permissions.IsAuthenticated])
+    def bulk_create(self, request):
+        """Create up to POSTS_BULK_CREATE_MAX posts from a JSON list; returns their ids in order."""
+        serializer = PostSerializer(
+            data=request.data,
+            many=True,
+            allow_empty=False,
+            max_length=getattr(settings, 'POSTS_BULK_CREATE_MAX', 1000),
+            context=self.get_serializer_context(),
+        )
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            posts = serializer.save(author=request.user)
+        return Response({"ids": [post.pk for post in posts]}, status=status.HTTP_201_CREATED)
+
+    def retrieve(self, request, *args, **kwargs):
+        if not detail_cache_enabled():
+            return super().retrieve(request, *args, **kwargs)
+        try:
+            post_id = int(kwargs['pk'])
+        except ValueError:
+            raise Http404
+        # Reads are allowed to anyone authenticated, so the cached path skips object permissions.
+        payload = detail_cache.get_or_load(post_id, lambda: self.load_detail(post_id))
+        wanted = requested_fields(request)
+        data = {name: value for name, value in payload.items() if wanted is None or name in wanted}
+        if wants(request, 'liked_by_me'):
+            if liker_sets.enabled():
+                liker_sets.liker_sets.get(post_id)  # keep viewed posts resident
+            data['liked_by_me'] = post_id in liked_post_ids(request, [post_id])
+        return Response(data)
+
+    def load_detail(self, post_id):
+        """Shared part of the full detail payload: everything but ``liked_by_me``."""
+        post = generics.get_object_or_404(Post.objects.select_related('author'), pk=post_id)
+        data = dict(PostSerializer(post, context={'liked_post_ids': set()}).data)
+        del data['liked_by_me']
+        return data
+
+    @action(detail=False, methods=['get'], url_path='likers/common', url_name='common-likers')
+    def common_likers(self, request):
+        """Users who liked every post in ``?posts=1,2,...`` (up to POSTS_COMMON_LIKERS_MAX_POSTS).
+
+        Returns their count and the first POSTS_COMMON_LIKERS_MAX_USERS of their ids.
+        """
+        max_posts = getattr(settings, 'POSTS_COMMON_LIKERS_MAX_POSTS', 10)
+        try:
+            post_ids = [int(part) for part in request.query_params.get('posts', '').split(',') if part.strip()]
+        except ValueError:
+            post_ids = []
+        if not post_ids or len(post_ids) > max_posts:
+            return Response(
+                {"detail": f"Pass 1 to {max_posts} post ids in ?posts=."}, status=status.HTTP_400_BAD_REQUEST
+            )
+        common = liker_sets.likers_of_all(post_ids)
+        users = list(common.ids[:getattr(settings, 'POSTS_COMMON_LIKERS_MAX_USERS', 100)])
+        return Response({"posts": post_ids, "count": len(common), "users": users})
+
+    @action(detail=False, methods=['get'], url_path='cache-stats', url_name='cache-stats',
+            permission_classes=[permissions.IsAdminUser])
+    def cache_stats(self, request):
+        """Hit/miss counters of this process's post detail cache, and liker set memory use."""
+        return Response({**detail_cache.stats(), 'liker_sets': liker_sets.liker_sets.stats()})
+
+    def buffered_like(self, request, pk, liked):
+        """Write-behind path: answer from pending intents or the DB and queue the change."""
+        post_id = generics.get_object_or_404(Post.objects.only('pk'), pk=pk).pk
+        was_liked = like_buffer.pending_for(request.user.pk, [post_id]).get(post_id)
+        if was_liked is None:
+            was_liked = Like.objects.filter(post_id=post_id, user=request.user).exists()
+        like_buffer.record(request.user.pk, post_id, liked)
+        return was_liked
+
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def like(self, request, pk=None):
+        if like_buffer_enabled():
+            if self.buffered_like(request, pk, liked=True):
+                return Response({"detail": "Already liked."}, status=status.HTTP_200_OK)
+            return Response({"detail": "Post liked."}, status=status.HTTP_200_OK)
         post = generics.get_object_or_404(Post, pk=pk)
-        obj, created = Like.objects.get_or_create(user=request.user, post=post)
+        with transaction.atomic():
+            obj, created = Like.objects.get_or_create(user=request.user, post=post)
+            if created:
+                counters.adjust(post.pk, likes=1)
+                liker_sets.record([(post.pk, request.user.pk, True)])
         if created:
             # notify post author
-            ct = ContentType.objects.get_for_model(Post)
-            Notification.objects.create(
-                recipient=post.author,
-                actor=request.user,
-                verb='liked your post',
-                target_content_type=ct,
-                target_object_id=post.pk,
-            )
+            create_notification(recipient=post.author, actor=request.user, verb='liked your post', target=post)
             return Response({"detail": "Post liked."}, status=status.HTTP_200_OK)
         return Response({"detail": "Already liked."}, status=status.HTTP_200_OK)
 
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def unlike(self, request, pk=None):
+        if like_buffer_enabled():
+            if self.buffered_like(request, pk, liked=False):
+                return Response({"detail": "Like removed."}, status=status.HTTP_200_OK)
+            return Response({"detail": "You had not liked this post."}, status=status.HTTP_200_OK)
         post = generics.get_object_or_404(Post, pk=pk)
-        deleted, _ = Like.objects.filter(post=post, user=request.user).delete()
+        with transaction.atomic():
+            deleted, _ = Like.objects.filter(post=post, user=request.user).delete()
+            if deleted:
+                counters.adjust(post.pk, likes=-1)
+                liker_sets.record([(post.pk, request.user.pk, False)])
         if deleted:
             return Response({"detail": "Like removed."}, status=status.HTTP_200_OK)
         return Response({"detail": "You had not liked this post."}, status=status.HTTP_200_OK)
 
+    @action(detail=False, methods=['post'], url_path='likes/batch', url_name='like-batch',
+            permission_classes=[permissions.IsAuthenticated])
+    def like_batch(self, request):
+        """Apply up to POSTS_LIKE_BATCH_MAX like/unlike operations in one transaction."""
+        serializer = LikeBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = apply_like_batch(request.user, serializer.validated_data['operations'])
+        return Response({"results": results}, status=status.HTTP_200_OK)
+
 class CommentViewSet(viewsets.ModelViewSet):
-    queryset = Comment.objects.select_related('post', 'author').all()
+    """All comments at ``/api/comments/``; one post's at ``/api/posts/<post_pk>/comments/``.
+
+    The nested route pages through ``comment_post_recent_idx`` on
+    ``(post, created_at, id)``, so any page is one index range scan.
+    """
+    queryset = Comment.objects.select_related('author').order_by('created_at', 'id')
     serializer_class = CommentSerializer
     permission_classes = [permissions.IsAuthenticated & IsOwnerOrReadOnly]
+    pagination_class = OldestFirstPagination
+
+    def get_post(self):
+        if not hasattr(self, '_post'):
+            self._post = generics.get_object_or_404(Post.objects.select_related('author'), pk=self.kwargs['post_pk'])
+        return self._post
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if 'post_pk' in self.kwargs:
+            queryset = queryset.filter(post=self.get_post())
+        return only_fields(
+            queryset, self.request, COMMENT_COLUMNS, always=('id', 'created_at'), expansions=COMMENT_EXPANSIONS
+        )
+
+    def get_serializer_class(self):
+        if 'post_pk' in self.kwargs:
+            return PostCommentSerializer
+        return super().get_serializer_class()
 
     def perform_create(self, serializer):
-        comment = serializer.save(author=self.request.user)
+        extra = {'post': self.get_post()} if 'post_pk' in self.kwargs else {}
+        with transaction.atomic():
+            comment = serializer.save(author=self.request.user, **extra)
+            counters.adjust(comment.post_id, comments=1)
         # notify post author on comment
-        ct = ContentType.objects.get_for_model(Post)
-        Notification.objects.create(
+        create_notification(
             recipient=comment.post.author,
             actor=self.request.user,
             verb='commented on your post',
-            target_content_type=ct,
-            target_object_id=comment.post.pk,
+            target=comment.post,
         )
 
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            instance.delete()
+            counters.adjust(instance.post_id, comments=-1)
+
 # Create your views here.
 
 
-class FeedView(generics.ListAPIView):
-    """Aggregated feed of posts from users the request.user follows."""
+class FeedView(FastPostListMixin, generics.ListAPIView):
+    """Feed of posts from users the request.user follows, read from their materialized timeline."""
     serializer_class = PostSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+    filter_backends = []
 
     def get_queryset(self):
-        try:
-            following = self.request.user.following
-            following_users = following.all()
-        except AttributeError:
-            return Post.objects.none()
-        return Post.objects.filter(author__in=following_users).order_by('-created_at', '-id')
+        return feed_for(self.request.user)
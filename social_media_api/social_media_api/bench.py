@@ -0,0 +1,47 @@
+"""Helpers shared by the ``bench_*`` management commands."""
+import time
+from contextlib import contextmanager
+
+from django.test.utils import (
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+
+
+@contextmanager
+def scratch_database(verbosity=0):
+    """Run the body against a throwaway test database, never the real one."""
+    setup_test_environment(debug=False)
+    config = setup_databases(verbosity=verbosity, interactive=False)
+    try:
+        yield
+    finally:
+        teardown_databases(config, verbosity=verbosity)
+        teardown_test_environment()
+
+
+@contextmanager
+def timed(samples):
+    """Append the body's wall time in milliseconds to ``samples``."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        samples.append((time.perf_counter() - start) * 1000)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(samples) -> str:
+    return (
+        f"n={len(samples):<6} p50={percentile(samples, 50):8.2f} ms  "
+        f"p99={percentile(samples, 99):8.2f} ms"
+    )
@@ -0,0 +1,93 @@
+"""Sparse fieldsets (``?fields=``) and expansions (``?expand=``) for read requests.
+
+``?fields=id,title`` limits a response to those top-level fields, and views
+use the same list to load only the matching columns and joins. ``?expand=``
+names optional relations (``Meta.expandable_fields``) to inline in full;
+expanded fields are returned even when ``?fields=`` does not list them.
+Both are comma separated, unknown names are ignored, and both apply to safe
+(read) methods only, so input fields are never dropped.
+"""
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+FIELDS_PARAM = 'fields'
+EXPAND_PARAM = 'expand'
+
+
+def _names(request, param):
+    if request is None or request.method not in SAFE_METHODS:
+        return None
+    raw = request.query_params.get(param)
+    if raw is None:
+        return None
+    return {name.strip() for name in raw.split(',') if name.strip()} or None
+
+
+def requested_fields(request):
+    """Top-level fields asked for with ``?fields=``, or ``None`` for all of them."""
+    return _names(request, FIELDS_PARAM)
+
+
+def requested_expansions(request) -> set:
+    return _names(request, EXPAND_PARAM) or set()
+
+
+def wants(request, name) -> bool:
+    fields = requested_fields(request)
+    return fields is None or name in fields
+
+
+def only_fields(queryset, request, columns, always=('id',), expansions=None):
+    """Load just the columns behind the requested fields.
+
+    ``columns`` maps serializer field names to model field paths, and
+    ``expansions`` does the same for ``?expand=`` names. A path through a
+    relation (``author__username``) keeps that join; all other
+    ``select_related`` joins are dropped. ``always`` lists paths the view
+    itself needs, e.g. the pagination ordering.
+    """
+    fields = requested_fields(request)
+    expanded = requested_expansions(request) & set(expansions or {})
+    if fields is None and not expanded:
+        return queryset
+    if fields is None:
+        fields = set(columns)
+    paths = set(always)
+    for name in fields:
+        paths.update(columns.get(name, ()))
+    for name in expanded:
+        paths.update(expansions[name])
+    joins = {path.rsplit('__', 1)[0] for path in paths if '__' in path}
+    queryset = queryset.select_related(None)
+    if joins:
+        queryset = queryset.select_related(*joins)
+    return queryset.only(*paths)
+
+
+class SparseFieldsetMixin:
+    """``ModelSerializer`` mixin applying ``?fields=`` and ``?expand=`` to the top-level resource.
+
+    ``Meta.expandable_fields`` maps a field name to ``(field_class, kwargs)``,
+    which replaces the declared field (or is added) when that name is expanded.
+    """
+
+    def _is_resource(self):
+        parent = self.parent
+        return parent is None or (isinstance(parent, serializers.ListSerializer) and parent.parent is None)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if not self._is_resource():
+            return fields
+        request = self.context.get('request')
+        expandable = getattr(self.Meta, 'expandable_fields', {})
+        expanded = requested_expansions(request) & set(expandable)
+        for name in expanded:
+            field_class, kwargs = expandable[name]
+            fields[name] = field_class(**kwargs)
+        wanted = requested_fields(request)
+        if wanted is not None:
+            for name in list(fields):
+                if name not in wanted and name not in expanded:
+                    del fields[name]
+        return fields
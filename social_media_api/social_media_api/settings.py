@@ -147,7 +147,7 @@ AUTH_USER_MODEL = 'accounts.User'
 # DRF configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'accounts.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -158,3 +158,73 @@ REST_FRAMEWORK = {
         'rest_framework.filters.SearchFilter',
     ],
 }
+
+# Feed: number of entries kept per user in the materialized timeline
+FEED_TIMELINE_LENGTH = int(os.getenv('FEED_TIMELINE_LENGTH', '800'))
+# A push trims a timeline back to FEED_TIMELINE_LENGTH once it is this many entries over
+FEED_TIMELINE_SLACK = int(os.getenv('FEED_TIMELINE_SLACK', '16'))
+# Authors with at least this many followers are pulled at read time instead of
+# fanned out on write (0 disables the hybrid mode)
+FEED_FANOUT_MAX_FOLLOWERS = int(os.getenv('FEED_FANOUT_MAX_FOLLOWERS', '0'))
+FEED_PULL_AUTHORS_TTL = int(os.getenv('FEED_PULL_AUTHORS_TTL', '300'))
+
+# Likes: record like/unlike intents in a per-process buffer and write them in
+# batches every POSTS_LIKE_FLUSH_INTERVAL_MS (0 = only on explicit flush)
+POSTS_LIKE_WRITE_BEHIND = os.getenv('POSTS_LIKE_WRITE_BEHIND', 'false').lower() == 'true'
+POSTS_LIKE_FLUSH_INTERVAL_MS = int(os.getenv('POSTS_LIKE_FLUSH_INTERVAL_MS', '250'))
+# Serve post list pages from .values() rows instead of full serializer instances
+POSTS_FAST_LIST_SERIALIZATION = os.getenv('POSTS_FAST_LIST_SERIALIZATION', 'true').lower() == 'true'
+# Maximum operations accepted by POST /api/posts/likes/batch/
+POSTS_LIKE_BATCH_MAX = int(os.getenv('POSTS_LIKE_BATCH_MAX', '100'))
+# Post detail: CACHES alias shared by all processes for the read-through cache (empty
+# disables it), and seconds a serialized post stays there (0 disables)
+POSTS_DETAIL_CACHE_ALIAS = os.getenv('POSTS_DETAIL_CACHE_ALIAS', '')
+POSTS_DETAIL_CACHE_TTL = int(os.getenv('POSTS_DETAIL_CACHE_TTL', '60' if POSTS_DETAIL_CACHE_ALIAS else '0'))
+# Accounts: rows fetched per database round trip by GET /api/accounts/export/
+ACCOUNTS_EXPORT_CHUNK_SIZE = int(os.getenv('ACCOUNTS_EXPORT_CHUNK_SIZE', '2000'))
+# Maximum posts accepted by POST /api/posts/bulk/, and rows per INSERT statement
+POSTS_BULK_CREATE_MAX = int(os.getenv('POSTS_BULK_CREATE_MAX', '1000'))
+POSTS_BULK_CREATE_BATCH_SIZE = int(os.getenv('POSTS_BULK_CREATE_BATCH_SIZE', '500'))
+# Memory budget for per-post liker sets used for liked_by_me and common likers (0 disables),
+# and seconds before a set is rebuilt to pick up likes written by other processes
+POSTS_LIKER_SETS_MAX_BYTES = int(os.getenv('POSTS_LIKER_SETS_MAX_BYTES', '0'))
+POSTS_LIKER_SETS_TTL = int(os.getenv('POSTS_LIKER_SETS_TTL', '30'))
+# GET /api/posts/likers/common/: most post ids accepted, and most liker ids returned
+POSTS_COMMON_LIKERS_MAX_POSTS = int(os.getenv('POSTS_COMMON_LIKERS_MAX_POSTS', '10'))
+POSTS_COMMON_LIKERS_MAX_USERS = int(os.getenv('POSTS_COMMON_LIKERS_MAX_USERS', '100'))
+# Auth: seconds a token -> user snapshot is trusted (0 = query on every request) and
+# local LRU size. Snapshots are only cached when AUTH_TOKEN_CACHE_ALIAS names a CACHES
+# entry shared by all processes, which carries the invalidations between them
+AUTH_TOKEN_CACHE_TTL = int(os.getenv('AUTH_TOKEN_CACHE_TTL', '60'))
+AUTH_TOKEN_CACHE_MAX_ENTRIES = int(os.getenv('AUTH_TOKEN_CACHE_MAX_ENTRIES', '10000'))
+AUTH_TOKEN_CACHE_ALIAS = os.getenv('AUTH_TOKEN_CACHE_ALIAS', '')
+# Accounts: API login/register hash passwords on a pool of this many threads (0 = inline);
+# past ACCOUNTS_HASHING_MAX_PENDING running or queued hashes per process, they answer
+# 503 with Retry-After: ACCOUNTS_HASHING_RETRY_AFTER seconds. The limit is per process,
+# so it needs threaded workers (gunicorn --threads, see Procfile) and must stay below
+# the thread count to keep threads free for other requests
+ACCOUNTS_HASHING_WORKERS = int(os.getenv('ACCOUNTS_HASHING_WORKERS', '2'))
+ACCOUNTS_HASHING_MAX_PENDING = int(os.getenv('ACCOUNTS_HASHING_MAX_PENDING', '4'))
+ACCOUNTS_HASHING_RETRY_AFTER = int(os.getenv('ACCOUNTS_HASHING_RETRY_AFTER', '1'))
+# Accounts: uploaded profile pictures wait in ACCOUNTS_AVATAR_PENDING_ROOT (never served)
+# until a pool of ACCOUNTS_AVATAR_WORKERS threads (0 = inline) strips their metadata and
+# renders square JPEG/WebP variants of these sizes
+ACCOUNTS_AVATAR_WORKERS = int(os.getenv('ACCOUNTS_AVATAR_WORKERS', '2'))
+ACCOUNTS_AVATAR_SIZES = tuple(int(size) for size in os.getenv('ACCOUNTS_AVATAR_SIZES', '64,256').split(','))
+ACCOUNTS_AVATAR_PENDING_ROOT = os.getenv('ACCOUNTS_AVATAR_PENDING_ROOT', str(BASE_DIR / 'pending_uploads'))
+# Accounts: profile picture uploads are streamed to a temp file and cut off past this size
+ACCOUNTS_UPLOAD_MAX_BYTES = int(os.getenv('ACCOUNTS_UPLOAD_MAX_BYTES', str(5 * 1024 * 1024)))
+# Accounts: seconds between rebuilds of the in-memory follow graph behind
+# /api/accounts/suggestions/ (0 disables it), and the most suggestions per request
+ACCOUNTS_FOLLOW_GRAPH_TTL = int(os.getenv('ACCOUNTS_FOLLOW_GRAPH_TTL', '300'))
+ACCOUNTS_SUGGESTIONS_MAX = int(os.getenv('ACCOUNTS_SUGGESTIONS_MAX', '50'))
+# Accounts: most targets accepted by POST /api/accounts/follows/bulk/
+ACCOUNTS_BULK_FOLLOW_MAX = int(os.getenv('ACCOUNTS_BULK_FOLLOW_MAX', '100'))
+# Accounts: seconds between rebuilds of the in-memory username index behind
+# /api/accounts/autocomplete/ (0 = query the database instead)
+ACCOUNTS_AUTOCOMPLETE_TTL = int(os.getenv('ACCOUNTS_AUTOCOMPLETE_TTL', '600'))
+# Notifications: events with the same recipient, verb and target fold into one unread
+# row while they arrive within this many seconds of the last (0 = one row per event),
+# which keeps the ids of the last NOTIFICATIONS_RECENT_ACTORS actors
+NOTIFICATIONS_COALESCE_WINDOW = int(os.getenv('NOTIFICATIONS_COALESCE_WINDOW', '86400'))
+NOTIFICATIONS_RECENT_ACTORS = int(os.getenv('NOTIFICATIONS_RECENT_ACTORS', '3'))